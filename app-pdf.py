@@ -1,17 +1,18 @@
+import logging
 import streamlit as st
-from fpdf import FPDF
-from PIL import Image, ImageDraw, ImageFont
-import os
-from datetime import datetime
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email import encoders
 import uuid
-import mercadopago
-import base64
-import io
+from datetime import datetime
+from sellos.motor import (ANCHO_REAL_MM, SIZE_MIN, SIZE_MAX, ajustar_tamano,
+                          altura_total_mm, entra_en_alto, renderizar_imagen)
+from sellos.vista_previa import obtener_preview, escala_preview
+from sellos.editor_vivo import editor_vivo, validar_lineas, a_datos, metricas, fuente_web
+from sellos.activos import RUTA_LOGO, existe, texto
+from sellos.arranque import iniciar_precalentado
+from sellos.datos import ruta_datos
+from sellos.telemetria import (medido_fragmento, config_telemetria, configurar_log, iniciar_exportador, iniciar_rerun, terminar_rerun,
+                              perfil_pedido, PerfilMuestreo)
+
+_log = logging.getLogger("sellos.cliente")
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(
@@ -21,13 +22,48 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# --- TELEMETRÍA ---
+# Tiempos por etapa y por rerun (histogramas en /metrics y/o log JSON) y perfil por
+# muestreo de un rerun con ?perfil=<clave_perfil>. Todo opcional, en st.secrets["telemetria"].
+try: TELEMETRIA = config_telemetria(dict(st.secrets["telemetria"]))
+except Exception: TELEMETRIA = config_telemetria({})
+
+@st.cache_resource
+def servicio_telemetria():
+    if TELEMETRIA["log"]: configurar_log(TELEMETRIA["log"])
+    if TELEMETRIA["puerto_metricas"]:
+        try: iniciar_exportador(TELEMETRIA["puerto_metricas"])
+        except OSError: pass
+    return True
+
+servicio_telemetria()
+inicio_rerun = iniciar_rerun("cliente")
+perfil = ruta_perfil = None
+if perfil_pedido(st.query_params.get("perfil"), TELEMETRIA["clave_perfil"]):
+    del st.query_params["perfil"]; perfil = PerfilMuestreo().iniciar()
+    ruta_perfil = ruta_datos('perfiles', f'{datetime.now():%Y%m%d_%H%M%S}_cliente.txt')
+
+
+def recargar(**kwargs):
+    # st.rerun corta el script en el acto: sin esto el rerun no se registraba y el perfil seguía
+    # muestreando. Desde un rerun de fragmento terminar_rerun no hace nada.
+    if terminar_rerun(inicio_rerun) is not None and perfil: perfil.guardar(ruta_perfil)
+    st.rerun(**kwargs)
+
 # --- CONFIGURACIÓN COMERCIAL ---
+# Pago, email y PDF se importan recién cuando una sesión llega a esos pasos (la mayoría
+# sólo diseña): mercadopago y su stack HTTP, smtplib/email y fpdf2 no pesan en el arranque.
 PRECIO_SELLO = 20500
 try:
     MP_ACCESS_TOKEN = st.secrets["mercadopago"]["access_token"]
-    mp_sdk = mercadopago.SDK(MP_ACCESS_TOKEN)
+    MP_CONFIG = dict(st.secrets["mercadopago"])
 except:
-    MP_ACCESS_TOKEN = None
+    MP_ACCESS_TOKEN = None; MP_CONFIG = {}
+
+@st.cache_resource
+def sdk_mp():
+    from sellos.mp import crear_sdk
+    return crear_sdk(MP_ACCESS_TOKEN, MP_CONFIG.get("api_url"))
 
 # --- 1. CONFIGURACIÓN ---
 FUENTES_DISPONIBLES = {
@@ -43,13 +79,6 @@ FUENTES_DISPONIBLES = {
     "Arial (Sistema)": "Arial"
 }
 
-# --- CONSTANTES ---
-FACTOR_PT_A_MM = 0.3527
-ANCHO_REAL_MM = 36
-ALTO_REAL_MM = 15
-SCALE_PREVIEW = 20
-SCALE_HD = 80
-
 # --- DATOS DE EJEMPLO ---
 EJEMPLO_INICIAL = [
     {"texto": "Juan Pérez Pardo", "font_idx": 1, "size": 13, "offset": -1.0},
@@ -57,6 +86,25 @@ EJEMPLO_INICIAL = [
     {"texto": "Matrícula N° 20408978", "font_idx": 8, "size": 9, "offset": -0.9}
 ]
 
+def linea_ejemplo(i):
+    ej = EJEMPLO_INICIAL[i] if i < len(EJEMPLO_INICIAL) else {}
+    return {"texto": ej.get("texto", ""), "fuente": list(FUENTES_DISPONIBLES)[ej.get("font_idx", 0)],
+            "size": max(SIZE_MIN, ej.get("size", 9)), "offset": float(ej.get("offset", 0.0))}
+
+# --- PRECALENTADO ---
+# Una vez por proceso y en segundo plano: fuentes y logo mapeados en memoria, medidas y
+# FreeTypeFont de 8 a 26 pt a las escalas de vista previa por defecto (escritorio y
+# móvil), fuentes reducidas para PDF y navegador, y el EJEMPLO_INICIAL ya renderizado.
+@st.cache_resource
+def servicio_arranque():
+    ejemplo, _ = a_datos([linea_ejemplo(i) for i in range(len(EJEMPLO_INICIAL))], FUENTES_DISPONIBLES)
+    escalas = sorted({escala_preview({}, ANCHO_REAL_MM), escala_preview({"Sec-CH-UA-Mobile": "?1"}, ANCHO_REAL_MM)})
+    rutas = list(FUENTES_DISPONIBLES.values())
+    extras = [lambda: metricas(FUENTES_DISPONIBLES), lambda: [fuente_web(r) for r in rutas if existe(r)]]
+    return iniciar_precalentado(rutas, [ejemplo], escalas, extras=extras)
+
+servicio_arranque()
+
 # --- 🎨 ESTILOS CSS (DARK MODE FIX + MOBILE ROW FIX) ---
 st.markdown("""
 <style>
@@ -164,340 +212,403 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- UTILS IMAGEN HTML ---
-def pil_to_base64(img):
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
-
 # --- HEADER ---
 mobile_preview_placeholder = st.empty()
 
 c_logo, c_title = st.columns([0.15, 0.85])
 with c_logo:
-    if os.path.exists("assets/logo.svg"): st.image("assets/logo.svg", width=90)
-    elif os.path.exists("assets/logo.png"): st.image("assets/logo.png", width=90)
+    # El SVG sale del almacén de activos (mapeado al arrancar), sin tocar el disco por rerun.
+    logo = texto(RUTA_LOGO)
+    if logo: st.image(logo, width=90)
+    elif existe("assets/logo.png"): st.image("assets/logo.png", width=90)
 with c_title:
     st.title("Editor de Sellos Automáticos")
     if PRECIO_SELLO > 0:
         st.markdown(f"Diseña tu **Queselló!**. Precio: **${PRECIO_SELLO}**")
 st.write("---")
 
-# --- HELPERS ---
-def calcular_ancho_texto_mm(texto, ruta_fuente, size_pt):
-    if not texto: return 0
-    scale_measure = 10
-    size_px = int(size_pt * FACTOR_PT_A_MM * scale_measure)
-    try:
-        if ruta_fuente == "Arial": raise Exception
-        font = ImageFont.truetype(ruta_fuente, size_px)
-    except: font = ImageFont.load_default()
-    width_px = font.getlength(texto)
-    return width_px / scale_measure
-
-def get_font_metrics_mm(ruta_fuente, size_pt):
-    try:
-        scale = 100
-        size_px = int(size_pt * FACTOR_PT_A_MM * scale)
-        if ruta_fuente == "Arial" or not os.path.exists(ruta_fuente):
-            ascent = size_px * 0.8
-        else:
-            font = ImageFont.truetype(ruta_fuente, size_px)
-            ascent, descent = font.getmetrics()
-        return ascent / scale
-    except:
-        return (size_pt * FACTOR_PT_A_MM) * 0.78
-
 # --- CALLBACKS ---
-def mover_arriba(key):
-    st.session_state[key] = max(-10.0, st.session_state[key] - 0.5)
-def mover_abajo(key):
-    st.session_state[key] = min(10.0, st.session_state[key] + 0.5)
-
-# --- MOTOR GRÁFICO ---
-# --- MOTOR GRÁFICO ---
-def renderizar_imagen(datos_lineas, scale, dibujar_borde=True, color_borde="black", mostrar_guias=False):
-    w_px = int(ANCHO_REAL_MM * scale)
-    h_px = int(ALTO_REAL_MM * scale)
-    img = Image.new('RGB', (w_px, h_px), "white")
-    draw = ImageDraw.Draw(img)
-
-    if dibujar_borde:
-        grosor = 4 if color_borde == "red" else max(2, int(scale/5))
-        draw.rectangle([(0,0), (w_px-1, h_px-1)], outline=color_borde, width=grosor)
-
-    total_h_px = 0
-    for linea in datos_lineas:
-        size_pt = linea['size']
-        size_px = size_pt * FACTOR_PT_A_MM * scale
-        total_h_px += size_px
-
-    y_cursor_base = (h_px - total_h_px) / 2
-
-    for i, linea in enumerate(datos_lineas):
-        txt = linea['texto']
-        f_path = linea['fuente']
-        sz_pt = linea['size']
-        offset_mm = linea['offset_y']
-        sz_px = int(sz_pt * FACTOR_PT_A_MM * scale)
-        offset_px = int(offset_mm * scale)
-
-        try:
-            if f_path == "Arial": raise Exception
-            font = ImageFont.truetype(f_path, sz_px)
-        except: font = ImageFont.load_default()
-
-        bbox = draw.textbbox((0, 0), txt, font=font)
-        text_w = bbox[2] - bbox[0]
-        x_pos = (w_px - text_w) / 2
-        y_visual_px = y_cursor_base + offset_px
-
-        draw.text((x_pos, y_visual_px), txt, font=font, fill="black")
-
-        # Guías (para HD)
-        if mostrar_guias:
-            color_guia = (0, 150, 255)
-            grosor_guia = max(1, int(scale / 20))
-            tamano_fuente_cota = int(8 * scale / 6)
-            try: ascent, descent = font.getmetrics()
-            except: ascent = sz_px * 0.8
-            y_base_guia = y_visual_px + ascent
-            draw.line([(0, y_base_guia), (w_px, y_base_guia)], fill=color_guia, width=grosor_guia)
-
-            try: font_small = ImageFont.truetype("assets/fonts/Roboto-Regular.ttf", tamano_fuente_cota)
-            except: font_small = font
-            pos_mm_real = y_base_guia / scale
-            label = f"{pos_mm_real:.1f}"
-
-            draw.text((scale * 0.5, y_base_guia - tamano_fuente_cota), label, font=font_small, fill=color_guia)
-            draw.rectangle([x_pos, y_visual_px, x_pos + text_w, y_visual_px + sz_px], outline=(200,200,200), width=0)
-
-        y_cursor_base += sz_px
-    return img
-
-# --- GENERADOR PDF ---
-def generar_pdf_hibrido(datos_lineas, cliente, incluir_guias_hd=False):
-    pdf = FPDF(orientation='P', unit='mm', format=(ANCHO_REAL_MM, ALTO_REAL_MM))
-    # PÁG 1: Vectorial
-    pdf.add_page(); pdf.set_margins(0,0,0); pdf.set_auto_page_break(False, margin=0)
-    font_map = {}; font_counter = 1
-    for ruta in FUENTES_DISPONIBLES.values():
-        if ruta != "Arial" and os.path.exists(ruta):
-            family_name = f"F{font_counter}"
-            try: pdf.add_font(family_name, "", ruta); font_map[ruta] = family_name; font_counter += 1
-            except: pass
-
-    h_total_mm = sum([l['size'] * FACTOR_PT_A_MM for l in datos_lineas])
-    y_base = (ALTO_REAL_MM - h_total_mm) / 2
-
-    for l in datos_lineas:
-        ruta = l['fuente']
-        fam = font_map.get(ruta, "Arial")
-        pdf.set_font(fam, size=l['size'])
-        try: txt = l['texto'].encode('latin-1', 'replace').decode('latin-1')
-        except: txt = l['texto']
-        txt_width = pdf.get_string_width(txt)
-        x_centered = (ANCHO_REAL_MM - txt_width) / 2
-        ascent_mm = get_font_metrics_mm(ruta, l['size'])
-        y_final_baseline = y_base + l['offset_y'] + ascent_mm
-        pdf.text(x_centered, y_final_baseline, txt)
-        y_base += (l['size'] * FACTOR_PT_A_MM)
-
-    # PÁG 2: Imagen HD
-    pdf.add_page()
-    img_hd = renderizar_imagen(datos_lineas, scale=SCALE_HD, dibujar_borde=False, mostrar_guias=incluir_guias_hd)
-    temp_path = f"temp_{datetime.now().strftime('%f')}.jpg"
-    img_hd.save(temp_path, quality=100, subsampling=0)
-    pdf.image(temp_path, x=0, y=0, w=ANCHO_REAL_MM, h=ALTO_REAL_MM)
-    if os.path.exists(temp_path): os.remove(temp_path)
-
-    fname = f"{cliente.replace(' ', '_')}_{datetime.now().strftime('%H%M%S')}.pdf"
-    return bytes(pdf.output()), fname
-
-# --- EMAIL ---
-def enviar_email(pdf_bytes, nombre_pdf, cliente, wpp_cliente, id_pago):
+def valores_linea(i):
+    # Última edición de la línea i (en cualquiera de los dos editores) o el ejemplo.
+    previas = st.session_state.get("lineas_editor") or []
+    if i < len(previas): return dict(previas[i])
+    return linea_ejemplo(i)
+
+def refrescar(*fragmentos):
+    # Rerun sólo de los fragmentos nombrados (la card tocada + la vista previa), no de la app.
+    st.rerun(list(fragmentos))
+
+def mover_arriba(key, *fragmentos):
+    st.session_state[key] = max(-10.0, st.session_state[key] - 0.5); refrescar(*fragmentos)
+def mover_abajo(key, *fragmentos):
+    st.session_state[key] = min(10.0, st.session_state[key] + 0.5); refrescar(*fragmentos)
+
+# --- CUMPLIMIENTO DE PEDIDOS (en segundo plano) ---
+# Render HD + PDF + email corren en trabajadores con reintentos; la sesión sólo encola
+# y consulta el estado. Un único pool por proceso (st.cache_resource).
+# El PDF sale del almacén de pedidos (por hash de diseño): un reintento o un reenvío
+# no vuelve a renderizar.
+def procesar_pedido(payload, enviador, digesto):
+    from sellos.correo import enviar_email
+    from sellos.motor import nombre_pdf
+    if enviador is None: raise RuntimeError("Email no configurado en st.secrets")
+    if "datos" in payload:   # trabajo encolado antes del almacén: trae el diseño adentro
+        from sellos.motor import generar_pdf_hibrido
+        pdf, fname = generar_pdf_hibrido(payload["datos"], payload["cliente"], incluir_guias_hd=payload["guias"])
+    else:
+        pedido = servicio_almacen().obtener(payload["pedido_id"])
+        if pedido is None: raise RuntimeError(f"Pedido {payload['pedido_id']} no está en el almacén")
+        pdf, fname = servicio_almacen().pdf(pedido), nombre_pdf(payload["cliente"])
+    if digesto is None: enviar_email(enviador, pdf, fname, payload["cliente"], payload["wpp"], payload["id_pago"]); return None
+    # Queda en el spool hasta que sale el digesto, que lo pasa a ENVIADO (sin pedido_id no hay cómo avisarle).
+    from sellos.cola import EN_DIGESTO
+    digesto.agregar(pdf, fname, payload["cliente"], payload["wpp"], payload["id_pago"], payload.get("pedido_id"))
+    return EN_DIGESTO if payload.get("pedido_id") else None
+
+@st.cache_resource
+def servicio_almacen():
+    from sellos.pedidos import AlmacenPedidos
+    return AlmacenPedidos(ruta_datos("pedidos.db"), ruta_datos("artefactos", ""))
+
+@st.cache_resource
+def servicio_pedidos():
+    # Conexiones SMTP persistentes compartidas por los trabajadores; digesto opcional.
+    from sellos.cola import ColaPedidos, PoolTrabajadores
+    from sellos.correo import config_email, EnviadorSMTP, DigestoPedidos
+    cola = ColaPedidos(ruta_datos("pedidos.db"))
+    enviador = digesto = None
     try:
-        remitente = st.secrets["email"]["usuario"]
-        password = st.secrets["email"]["password"]
-        destinatario = st.secrets["email"]["destinatario"]
-        msg = MIMEMultipart()
-        msg['From'] = remitente; msg['To'] = destinatario; msg['Subject'] = f"Pedido PAGADO: {cliente}"
-        cuerpo = f"""
-        NUEVO PEDIDO CONFIRMADO
-        -----------------------
-        Cliente: {cliente}
-        WhatsApp: {wpp_cliente}
-        ID Pago MP: {id_pago}
-        Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M')}
-        """
-        msg.attach(MIMEText(cuerpo, 'plain'))
-        part = MIMEBase('application', "octet-stream")
-        part.set_payload(pdf_bytes)
-        encoders.encode_base64(part)
-        part.add_header('Content-Disposition', f'attachment; filename="{nombre_pdf}"')
-        msg.attach(part)
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls(); server.login(remitente, password)
-        server.sendmail(remitente, destinatario, msg.as_string())
-        server.quit()
-        return True
-    except Exception as e: st.error(f"Error Email: {e}"); return False
+        enviador = EnviadorSMTP(config_email(st.secrets["email"]))
+        if enviador.config["digesto_minutos"] > 0:
+            digesto = DigestoPedidos(enviador, ruta_datos("digesto", ""), enviador.config["digesto_minutos"] * 60,
+                                     al_enviar=cola.digesto_enviado).iniciar()
+    except Exception: pass
+    pool = PoolTrabajadores(cola, lambda payload: procesar_pedido(payload, enviador, digesto), n_hilos=2).iniciar()
+    return cola, pool
 
 # --- MP UTILS ---
-def crear_preferencia_pago(nombre_cliente, ref_id):
-    if not MP_ACCESS_TOKEN: return "https://www.mercadopago.com.ar"
+def item_sello(precio, nombre_cliente=None):
+    return {"title": f"Sello - {nombre_cliente}" if nombre_cliente else "Sello personalizado", "quantity": 1, "unit_price": precio, "currency_id": "ARS"}
+
+def crear_preferencia_pago(ref_id, precio):
+    if not MP_ACCESS_TOKEN: return None, "https://www.mercadopago.com.ar"
+    from sellos.mp import opciones_mp
     preference_data = {
-        "items": [{"title": f"Sello - {nombre_cliente}", "quantity": 1, "unit_price": PRECIO_SELLO, "currency_id": "ARS"}],
+        "items": [item_sello(precio)],
         "external_reference": ref_id,
         "back_urls": {"success": "https://www.google.com", "failure": "https://www.google.com", "pending": "https://www.google.com"},
         "auto_return": "approved"
     }
-    try:
-        res = mp_sdk.preference().create(preference_data)
-        return res["response"]["init_point"]
+    if MP_CONFIG.get("notification_url"): preference_data["notification_url"] = MP_CONFIG["notification_url"]
+    res = sdk_mp().preference().create(preference_data, opciones_mp(MP_ACCESS_TOKEN, (ref_id, precio)))
+    if res["status"] not in (200, 201): raise RuntimeError(f"MP respondió {res['status']}: {res['response']}")
+    return res["response"]["id"], res["response"]["init_point"]
+
+def titular_preferencia(id_pref, precio, nombre_cliente):
+    if not id_pref: return
+    from sellos.mp import opciones_mp
+    res = sdk_mp().preference().update(id_pref, {"items": [item_sello(precio, nombre_cliente)]}, opciones_mp(MP_ACCESS_TOKEN))
+    if res["status"] not in (200, 201): raise RuntimeError(f"MP respondió {res['status']}: {res['response']}")
+
+# Preferencias cacheadas por (pedido, precio) y creadas en segundo plano apenas el
+# diseño está confirmado; el nombre se pone en el título al ir a pagar.
+@st.cache_resource
+def servicio_preferencias():
+    from sellos.mp import PreferenciasMP
+    return PreferenciasMP(crear_preferencia_pago, titular_preferencia)
+
+def link_de_pago(nombre_cliente):
+    try: return servicio_preferencias().obtener(st.session_state.pedido_id, PRECIO_SELLO, nombre_cliente, timeout=30)
     except Exception as e: st.error(f"Error MP: {e}"); return None
 
-def verificar_pago_mp(ref_id):
-    if not MP_ACCESS_TOKEN: return "SIMULADO_123"
-    filters = {"external_reference": ref_id, "status": "approved"}
+# Estado de pagos local: lo escriben las notificaciones de MP (receptor en
+# mercadopago.webhook_puerto, o `python -m sellos.pagos` aparte). La API sólo se
+# consulta como respaldo, con límite por pedido y global.
+@st.cache_resource
+def servicio_pagos():
+    from sellos.pagos import AlmacenPagos, VerificadorPagos, iniciar_receptor, buscar_aprobado_sdk, obtener_pago_sdk
+    almacen = AlmacenPagos(ruta_datos("pagos.db"))
+    verificador = VerificadorPagos(almacen, buscar_aprobado_sdk(sdk_mp()))
+    if MP_CONFIG.get("webhook_puerto"):
+        # Puerto ocupado (otro proceso de la app, `python -m sellos.pagos`): se sigue sin receptor propio.
+        try: iniciar_receptor(int(MP_CONFIG["webhook_puerto"]), almacen, obtener_pago_sdk(sdk_mp()), MP_CONFIG.get("webhook_secret"))
+        except OSError: _log.exception("no se pudo abrir el receptor de MP en el puerto %s", MP_CONFIG["webhook_puerto"])
+    return verificador
+
+def verificar_pago_mp(ref_id, solo_local=False):
+    if not MP_ACCESS_TOKEN: return None if solo_local else "SIMULADO_123"
     try:
-        res = mp_sdk.payment().search(filters)
-        if res["response"]["results"]: return res["response"]["results"][0]["id"]
-        return None
-    except: return None
+        verificador = servicio_pagos()
+        return verificador.local(ref_id) if solo_local else verificador.verificar(ref_id)
+    except Exception: _log.exception("no se pudo verificar el pago de %s", ref_id); return None
+
+def confirmar_pago(pid):
+    # Se envía la foto guardada al confirmar el diseño, no lo que haya en los widgets.
+    pedido = servicio_almacen().registrar_pago(st.session_state.pedido_id, pid)
+    if pedido is None:
+        # El pedido ya no está en el almacén: no hay foto que enviar. Se vuelve a confirmar el
+        # diseño con el mismo pedido_id (la referencia del pago) y el pago se toma de nuevo.
+        st.session_state.pago_sin_pedido = pid; st.session_state.pedido_guardado = False
+        st.session_state.step = 'diseño'
+        return
+    cola, pool = servicio_pedidos()
+    cola.encolar(st.session_state.pedido_id, {
+        "pedido_id": pedido["pedido_id"], "cliente": pedido["cliente"], "wpp": pedido["wpp"], "id_pago": pedido["id_pago"]})
+    pool.avisar()
+    st.session_state.step = 'envio'
+
+# --- ESPERA DEL PAGO: si llega la notificación de MP se avanza solo ---
+@st.fragment(run_every=3)
+@medido_fragmento("cliente", "fragmento.espera_pago")
+def esperar_pago():
+    pid = verificar_pago_mp(st.session_state.pedido_id, solo_local=True)
+    if pid: confirmar_pago(pid); recargar(scope="app")
+
+# --- ESTADO DEL ENVÍO (se consulta cada 2 s sin rerun completo) ---
+@st.fragment(run_every=2)
+@medido_fragmento("cliente", "fragmento.estado_envio")
+def estado_envio():
+    from sellos.cola import EN_DIGESTO, ENVIADO, FALLIDO
+    cola, pool = servicio_pedidos()
+    trabajo = cola.estado(st.session_state.pedido_id)
+    if trabajo is None:
+        st.error("No encontramos el pedido en la cola de envíos.")
+    elif trabajo["estado"] in (ENVIADO, EN_DIGESTO):
+        ir_a('enviado'); st.session_state.festejar = True; recargar(scope="app")
+    elif trabajo["estado"] == FALLIDO:
+        st.error(f"No pudimos enviar el pedido: {trabajo['error']}")
+        if st.button("🔁 Reintentar envío"): cola.reencolar(st.session_state.pedido_id); pool.avisar(); st.rerun(scope="fragment")
+    else:
+        st.info("⏳ Preparando y enviando tu sello...")
+        if trabajo["intentos"]: st.caption(f"Reintento {trabajo['intentos']}: {trabajo['error']}")
 
 # --- ESTADO DE SESIÓN ---
-if 'pedido_id' not in st.session_state: st.session_state.pedido_id = str(uuid.uuid4())
-if 'step' not in st.session_state: st.session_state.step = 'diseño'
-
-# --- INTERFAZ PRINCIPAL ---
-col_izq, col_espacio, col_der = st.columns([1, 0.1, 1])
-inputs_disabled = st.session_state.step != 'diseño'
-
-# --- COLUMNA IZQUIERDA: CONFIGURACIÓN ---
-with col_izq:
-    st.subheader("🛠️ Configuración")
-
-    cant = st.selectbox("Cantidad de líneas", [1,2,3,4], index=2, disabled=inputs_disabled)
-    st.write("")
+# Desde que se confirma el diseño el pedido vive en el almacén y en la URL
+# (?pedido=<pedido_id>): una recarga retoma el mismo pedido en el mismo paso.
+def ir_a(paso):
+    st.session_state.step = paso
+    if st.session_state.get("pedido_guardado"): servicio_almacen().pasar(st.session_state.pedido_id, paso)
+
+def restaurar_pedido(pedido_id):
+    try: pedido = servicio_almacen().obtener(pedido_id)
+    except Exception: pedido = None
+    if pedido is None: return False
+    st.session_state.pedido_id = pedido_id; st.session_state.pedido_guardado = True
+    st.session_state.step = pedido["paso"]
+    st.session_state.lineas_editor = pedido["lineas"]; st.session_state.cant_inicial = len(pedido["lineas"])
+    st.session_state.mostrar_guias = pedido["guias"]; st.session_state.autoajuste = pedido["autoajuste"]
+    if pedido["cliente"]: st.session_state.cliente_nombre = pedido["cliente"]; st.session_state.cliente_wpp = pedido["wpp"]
+    return True
+
+def nuevo_pedido():
+    st.session_state.pedido_id = str(uuid.uuid4()); st.session_state.pedido_guardado = False
+    st.session_state.step = 'diseño'
+    if "pedido" in st.query_params: del st.query_params["pedido"]
+
+if 'pedido_id' not in st.session_state:
+    if not restaurar_pedido(st.query_params.get("pedido")): nuevo_pedido()
+
+# --- FRAGMENTOS DEL EDITOR ---
+# Cada card y la vista previa son fragmentos: tocar la línea 2 re-ejecuta la card 2
+# (su medición) y la vista previa, no el CSS, el header, las otras cards ni el pago.
+# Lo que comparten pasa por session_state: cada card deja su línea medida en
+# datos_linea_{i} y la vista previa arma el diseño con esas. El rerun completo queda
+# para los cambios de estructura (cantidad de líneas, modo de editor, pasos del pedido).
+VISTA = "vista_previa"
+
+def datos_diseno(cant):
+    # Con el ajuste automático el diseño sale de los tamaños pedidos en el editor.
+    if st.session_state.get("autoajuste"): return a_datos(st.session_state.lineas_editor[:cant], FUENTES_DISPONIBLES, autoajuste=True)[0]
+    return [st.session_state[f"datos_linea_{i}"] for i in range(cant) if f"datos_linea_{i}" in st.session_state]
+
+@medido_fragmento("cliente", "fragmento.linea")
+def tarjeta_linea(i, inputs_disabled):
+    fragmentos = (f"linea_{i}", VISTA)
+    # 1. Defaults
+    key_offset = f"offset_state_{i}"
+    v = valores_linea(i)
+    if key_offset not in st.session_state: st.session_state[key_offset] = v["offset"]
+    def_txt, def_sz = v["texto"], v["size"]
+    def_idx = list(FUENTES_DISPONIBLES).index(v["fuente"]) if v["fuente"] in FUENTES_DISPONIBLES else 0
+
+    # INICIO CARD
+    with st.container(border=True):
 
-    datos = []
-
-    for i in range(cant):
-        # 1. Defaults
-        key_offset = f"offset_state_{i}"
-        if key_offset not in st.session_state:
-            val_default = 0.0
-            if i < len(EJEMPLO_INICIAL): val_default = float(EJEMPLO_INICIAL[i].get("offset", 0.0))
-            st.session_state[key_offset] = val_default
-
-        def_txt = ""; def_idx = 0; def_sz = 9
-        if i < len(EJEMPLO_INICIAL):
-            def_txt = EJEMPLO_INICIAL[i]["texto"]
-            def_idx = EJEMPLO_INICIAL[i]["font_idx"]
-            def_sz = max(8, EJEMPLO_INICIAL[i]["size"])
-
-        # INICIO CARD
-        with st.container(border=True):
-
-            # FILA 1: Texto | Fuente
-            c_top1, c_top2 = st.columns([0.65, 0.35])
-            with c_top1:
-                t = st.text_input(f"t{i}", value=def_txt, key=f"ti{i}", placeholder=f"Línea {i+1}", label_visibility="collapsed", disabled=inputs_disabled)
-            with c_top2:
-                f_key = st.selectbox(f"f{i}", list(FUENTES_DISPONIBLES.keys()), index=def_idx, key=f"fi{i}", label_visibility="collapsed", disabled=inputs_disabled)
-
-            # FILA 2: Icono Sz | Stepper Sz | Icono Pos | BtnUp | BtnDown
-            c_icon1, c_slid1, c_icon2, c_btn1, c_btn2 = st.columns([0.15, 0.35, 0.15, 0.17, 0.18], gap="small")
-
-            with c_icon1: st.markdown('<div class="icon-label"><strong> Aᴀ </strong>  <span>TAMAÑO</span></div>', unsafe_allow_html=True)
-            with c_slid1:
-                slider_val = st.number_input(f"s{i}", min_value=8, max_value=26, value=def_sz, key=f"si{i}", label_visibility="collapsed", disabled=inputs_disabled)
-
-            with c_icon2: st.markdown('<div class="icon-label"><strong> ↕ </strong><span>AJUSTE LINEA</span> </div>', unsafe_allow_html=True)
-            with c_btn1:
-                st.button("▲", key=f"up_{i}", on_click=mover_arriba, args=(key_offset,), disabled=inputs_disabled, use_container_width=True)
-            with c_btn2:
-                st.button("▼", key=f"down_{i}", on_click=mover_abajo, args=(key_offset,), disabled=inputs_disabled, use_container_width=True)
-
-            offset_actual = st.session_state[key_offset]
-            ruta_fuente = FUENTES_DISPONIBLES[f_key]
-            ancho_mm = calcular_ancho_texto_mm(t, ruta_fuente, slider_val)
-            size_final = slider_val
-            if ancho_mm > ANCHO_REAL_MM:
-                size_final = int((slider_val * (ANCHO_REAL_MM / ancho_mm)) - 0.5)
-                if size_final < 8: size_final = 8
-                st.caption(f"⚠️ Ajustado a {size_final}pt")
-
-            datos.append({"texto": t, "fuente": ruta_fuente, "size": size_final, "offset_y": offset_actual})
-
-# CALCULO Y RENDER
-altura_total_usada_mm = sum([d['size'] * FACTOR_PT_A_MM for d in datos])
-es_valido_vertical = (ALTO_REAL_MM - altura_total_usada_mm) >= -1.0
-color_borde = "red" if not es_valido_vertical else "black"
-
-img_pil = renderizar_imagen(datos, scale=SCALE_PREVIEW, color_borde=color_borde, mostrar_guias=False)
-img_b64 = pil_to_base64(img_pil)
-
-# STICKY HEADER MOBILE
-st.markdown(f"""
+        # FILA 1: Texto | Fuente
+        c_top1, c_top2 = st.columns([0.65, 0.35])
+        with c_top1:
+            t = st.text_input(f"t{i}", value=def_txt, key=f"ti{i}", placeholder=f"Línea {i+1}", label_visibility="collapsed", disabled=inputs_disabled,
+                              on_change=refrescar, args=fragmentos)
+        with c_top2:
+            f_key = st.selectbox(f"f{i}", list(FUENTES_DISPONIBLES.keys()), index=def_idx, key=f"fi{i}", label_visibility="collapsed", disabled=inputs_disabled,
+                                 on_change=refrescar, args=fragmentos)
+
+        # FILA 2: Icono Sz | Stepper Sz | Icono Pos | BtnUp | BtnDown
+        c_icon1, c_slid1, c_icon2, c_btn1, c_btn2 = st.columns([0.15, 0.35, 0.15, 0.17, 0.18], gap="small")
+
+        with c_icon1: st.markdown('<div class="icon-label"><strong> Aᴀ </strong>  <span>TAMAÑO</span></div>', unsafe_allow_html=True)
+        with c_slid1:
+            slider_val = st.number_input(f"s{i}", min_value=SIZE_MIN, max_value=SIZE_MAX, value=def_sz, key=f"si{i}", label_visibility="collapsed", disabled=inputs_disabled,
+                                         on_change=refrescar, args=fragmentos)
+
+        with c_icon2: st.markdown('<div class="icon-label"><strong> ↕ </strong><span>AJUSTE LINEA</span> </div>', unsafe_allow_html=True)
+        with c_btn1:
+            st.button("▲", key=f"up_{i}", on_click=mover_arriba, args=(key_offset, *fragmentos), disabled=inputs_disabled, use_container_width=True)
+        with c_btn2:
+            st.button("▼", key=f"down_{i}", on_click=mover_abajo, args=(key_offset, *fragmentos), disabled=inputs_disabled, use_container_width=True)
+
+        offset_actual = st.session_state[key_offset]
+        ruta_fuente = FUENTES_DISPONIBLES[f_key]
+        size_final, ajustado = ajustar_tamano(t, ruta_fuente, slider_val)
+        if ajustado and not st.session_state.get("autoajuste"): st.caption(f"⚠️ Ajustado a {size_final}pt")
+
+    st.session_state[f"datos_linea_{i}"] = {"texto": t, "fuente": ruta_fuente, "size": size_final, "offset_y": offset_actual}
+    st.session_state.lineas_editor[i] = {"texto": t, "fuente": f_key, "size": slider_val, "offset": offset_actual}
+
+@st.fragment(key="editor")
+@medido_fragmento("cliente", "fragmento.editor_vivo")
+def editor_en_vivo(cant, inputs_disabled):
+    # Editor en el navegador: acá sólo se valida lo último que mandó (con debounce).
+    clave_vivo = f"editor_vivo_{cant}"
+    lineas = validar_lineas(st.session_state.get(clave_vivo), FUENTES_DISPONIBLES, cant) or [valores_linea(i) for i in range(cant)]
+    st.session_state.lineas_editor = lineas
+    for i, l in enumerate(lineas): st.session_state[f"offset_state_{i}"] = l["offset"]
+    datos, validado = a_datos(lineas, FUENTES_DISPONIBLES, st.session_state.get("autoajuste", False))
+    for i, d in enumerate(datos): st.session_state[f"datos_linea_{i}"] = d
+    editor_vivo(lineas, FUENTES_DISPONIBLES, clave_vivo, validado, st.session_state.get("mostrar_guias"), inputs_disabled,
+                on_change=refrescar, args=("editor", VISTA))
+
+@st.fragment(key=VISTA)
+@medido_fragmento("cliente", "fragmento.vista_previa")
+def vista_previa(cant, vivo, inputs_disabled):
+    datos = datos_diseno(cant)
+    altura_total_usada_mm = altura_total_mm(datos)
+    es_valido_vertical = entra_en_alto(datos)
+    color_borde = "red" if not es_valido_vertical else "black"
+
+    # Con el editor en vivo la vista previa la dibuja el navegador: el servidor renderiza
+    # recién cuando el diseño está confirmado.
+    preview_servidor = not (vivo and st.session_state.step == 'diseño')
+
+    # Un solo render por diseño (cache compartida entre sesiones): sirve al header móvil y a st.image
+    # STICKY HEADER MOBILE
+    if not preview_servidor: mobile_preview_placeholder.empty()
+    else:
+        vp_header = obtener_preview(renderizar_imagen, datos, st.session_state.escala_preview, color_borde=color_borde, mostrar_guias=False)
+        mobile_preview_placeholder.markdown(f"""
 <div class="mobile-sticky-header">
     <div style="font-size:0.9rem; font-weight:bold; margin-bottom:5px;">Vista Previa</div>
-    <img src="data:image/png;base64,{img_b64}" />
+    <img src="data:{vp_header.mime};base64,{vp_header.b64}" />
     <div style="font-size: 0.8rem; margin-top: 5px; color: {'red' if not es_valido_vertical else 'green'}">
         {altura_total_usada_mm:.1f}mm / 36mm
     </div>
 </div>
 """, unsafe_allow_html=True)
 
-with col_der:
     st.markdown('<div class="desktop-only-col">', unsafe_allow_html=True)
     st.subheader("👁️ Vista Previa")
     with st.container(border=True):
         m1, m2 = st.columns(2)
         m1.metric("Altura Texto", f"{altura_total_usada_mm:.1f} mm")
         m2.metric("Sello", f"{ANCHO_REAL_MM} mm")
-        mostrar_guias = st.checkbox("📏 Guías Técnicas", value=False, disabled=inputs_disabled)
+        # Con el editor en vivo las guías también se dibujan en el navegador.
+        mostrar_guias = st.checkbox("📏 Guías Técnicas", value=False, key="mostrar_guias", disabled=inputs_disabled,
+                                    on_change=refrescar, args=(VISTA, "editor") if vivo else (VISTA,))
 
     if not es_valido_vertical: st.error("⛔ EXCESO DE ALTURA")
-    st.image(renderizar_imagen(datos, SCALE_PREVIEW, color_borde, mostrar_guias), use_container_width=True)
+    if st.session_state.get("autoajuste"): st.caption("🪄 Ajuste automático: " + " · ".join(f"{d['size']}pt" for d in datos))
+    if not preview_servidor: st.caption("La vista previa se actualiza en el editor mientras escribís.")
+    else: st.image(obtener_preview(renderizar_imagen, datos, st.session_state.escala_preview, color_borde=color_borde, mostrar_guias=mostrar_guias).datos, use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
     st.write("---")
 
-    if es_valido_vertical:
-        if st.session_state.step == 'diseño':
-            if st.button("✅ CONFIRMAR DISEÑO", use_container_width=True, type="primary"):
-                st.session_state.step = 'datos'; st.rerun()
+    if es_valido_vertical and st.session_state.step == 'diseño':
+        if st.button("✅ CONFIRMAR DISEÑO", use_container_width=True, type="primary"):
+            servicio_almacen().confirmar(st.session_state.pedido_id, datos, st.session_state.lineas_editor, mostrar_guias,
+                                         autoajuste=st.session_state.get("autoajuste", False))
+            st.session_state.pedido_guardado = True; st.query_params["pedido"] = st.session_state.pedido_id
+            st.session_state.pop("pago_sin_pedido", None)
+            st.session_state.step = 'datos'; recargar()
+
+# --- INTERFAZ PRINCIPAL ---
+col_izq, col_espacio, col_der = st.columns([1, 0.1, 1])
+inputs_disabled = st.session_state.step != 'diseño'
 
-        elif st.session_state.step == 'datos':
+# Resolución según el dispositivo (client hints / User-Agent), fija por sesión
+if "escala_preview" not in st.session_state: st.session_state.escala_preview = escala_preview(st.context.headers, ANCHO_REAL_MM)
+
+# --- COLUMNA IZQUIERDA: CONFIGURACIÓN ---
+with col_izq:
+    st.subheader("🛠️ Configuración")
+
+    cant = st.selectbox("Cantidad de líneas", [1,2,3,4], index=st.session_state.get("cant_inicial", 3) - 1, disabled=inputs_disabled)
+    vivo = st.toggle("⚡ Vista previa instantánea", value=True, key="usar_editor_vivo", disabled=inputs_disabled,
+                     help="Edita y dibuja el sello en tu navegador, sin esperar al servidor")
+    st.toggle("🪄 Ajuste automático", value=False, key="autoajuste", disabled=inputs_disabled,
+              help="Achica las líneas lo justo para que entren en el sello, a lo ancho y a lo alto")
+    st.write("")
+
+    if vivo: editor_en_vivo(cant, inputs_disabled)
+    else:
+        st.session_state.lineas_editor = [valores_linea(i) for i in range(cant)]
+        for i in range(cant): st.fragment(tarjeta_linea, key=f"linea_{i}")(i, inputs_disabled)
+
+# --- COLUMNA DERECHA: VISTA PREVIA Y PEDIDO ---
+with col_der:
+    if "pago_sin_pedido" in st.session_state:
+        st.error(f"Recibimos tu pago (ID {st.session_state.pago_sin_pedido}) pero se perdió el pedido. "
+                 "Confirmá el diseño otra vez y se envía con ese mismo pago.")
+    vista_previa(cant, vivo, inputs_disabled)
+
+    datos = datos_diseno(cant)
+    if entra_en_alto(datos):
+        if st.session_state.step == 'datos':
             st.info("🔒 Diseño confirmado.Completá los datos y realizá el pago")
-            with st.form("form_datos"):
-                st.write("Tus Datos:")
-                c_nom, c_wpp = st.columns(2)
-                with c_nom: nom = st.text_input("Nombre Completo")
-                with c_wpp: wpp = st.text_input("WhatsApp")
-                ir_pago = st.form_submit_button("💳 IR A PAGAR")
-            if st.button("⬅️ Editar"): st.session_state.step = 'diseño'; st.rerun()
+            servicio_preferencias().anticipar(st.session_state.pedido_id, PRECIO_SELLO)
+            st.write("Tus Datos:")
+            c_nom, c_wpp = st.columns(2)
+            with c_nom: nom = st.text_input("Nombre Completo", value=st.session_state.get("cliente_nombre", ""))
+            with c_wpp: wpp = st.text_input("WhatsApp", value=st.session_state.get("cliente_wpp", ""))
+            ir_pago = st.button("💳 IR A PAGAR", use_container_width=True)
+            if st.button("⬅️ Editar"): ir_a('diseño'); recargar()
             if ir_pago:
-                if not nom or not wpp: st.toast("Faltan datos", icon="⚠️")
+                if not nom.strip() or not wpp.strip(): st.toast("Faltan datos", icon="⚠️")
                 else:
                     st.session_state.cliente_nombre = nom; st.session_state.cliente_wpp = wpp
-                    link = crear_preferencia_pago(nom, st.session_state.pedido_id)
-                    if link: st.session_state.link_pago = link; st.session_state.step = 'pago'; st.rerun()
+                    with st.spinner("Preparando el pago..."): link = link_de_pago(nom)
+                    if link:
+                        servicio_almacen().datos_cliente(st.session_state.pedido_id, nom, wpp)
+                        st.session_state.link_pago = link; st.session_state.step = 'pago'; recargar()
 
         elif st.session_state.step == 'pago':
             st.success(f"Hola {st.session_state.cliente_nombre}!")
-            st.link_button("👉 PAGAR EN MERCADO PAGO", st.session_state.link_pago, type="primary", use_container_width=True)
+            # Tras una recarga el link se vuelve a pedir (la preferencia es idempotente por pedido).
+            if "link_pago" not in st.session_state: st.session_state.link_pago = link_de_pago(st.session_state.cliente_nombre)
+            if st.session_state.link_pago: st.link_button("👉 PAGAR EN MERCADO PAGO", st.session_state.link_pago, type="primary", use_container_width=True)
             st.write(""); st.caption("Una vez realizado el pago:")
+            esperar_pago()
             if st.button("🔄 VERIFICAR PAGO", use_container_width=True):
                 with st.spinner("Verificando..."):
                     pid = verificar_pago_mp(st.session_state.pedido_id)
-                    if pid:
-                        st.success("✅ Pago Confirmado")
-                        pdf, fname = generar_pdf_hibrido(datos, st.session_state.cliente_nombre, incluir_guias_hd=mostrar_guias)
-                        if enviar_email(pdf, fname, st.session_state.cliente_nombre, st.session_state.cliente_wpp, pid):
-                            st.balloons(); st.success("📩 ¡Enviado!")
-                            if st.button("Nuevo"): st.session_state.step = 'diseño'; st.session_state.pedido_id = str(uuid.uuid4()); st.rerun()
+                    if pid: confirmar_pago(pid); recargar()
                     else: st.error("Pago no encontrado")
-            if st.button("⬅️ Atrás"): st.session_state.step = 'datos'; st.rerun()
\ No newline at end of file
+            if st.button("⬅️ Atrás"): ir_a('datos'); recargar()
+
+        elif st.session_state.step == 'envio':
+            st.success("✅ Pago Confirmado")
+            estado_envio()
+
+        elif st.session_state.step == 'enviado':
+            if st.session_state.pop('festejar', False): st.balloons()
+            st.success("✅ Pago Confirmado")
+            # En modo digesto el pedido sale al taller junto con otros en el próximo email.
+            from sellos.cola import EN_DIGESTO
+            trabajo = servicio_pedidos()[0].estado(st.session_state.pedido_id)
+            if trabajo and trabajo["estado"] == EN_DIGESTO: st.info("📬 ¡Pedido recibido! Sale al taller con el próximo envío.")
+            else: st.success("📩 ¡Enviado!")
+            if st.button("Nuevo"): nuevo_pedido(); recargar()
+
+# --- FIN DEL RERUN ---
+if perfil: st.toast(f"Perfil guardado en {perfil.guardar(ruta_perfil)}")
+terminar_rerun(inicio_rerun)
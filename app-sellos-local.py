@@ -1,10 +1,18 @@
 import streamlit as st
-from fpdf import FPDF
-from PIL import Image, ImageDraw, ImageFont
-import os
-from datetime import datetime
 import base64
 import io
+import uuid
+from datetime import datetime
+from sellos.motor import (ANCHO_REAL_MM, SIZE_MIN, SIZE_MAX, ajustar_tamano, autoajustar,
+                          altura_total_mm, entra_en_alto, renderizar_imagen,
+                          generar_pdf_hibrido, generar_svg, nombre_pdf)
+from sellos.vista_previa import obtener_preview, escala_preview, hash_diseno
+from sellos.bandas import DPI_MASTER, master_pdf
+from sellos.pdf_diferido import obtener_pdf, programar_precalculo
+from sellos.datos import ruta_datos
+from sellos.activos import RUTA_LOGO, existe, texto
+from sellos.telemetria import (config_telemetria, configurar_log, iniciar_exportador, iniciar_rerun, terminar_rerun,
+                              perfil_pedido, PerfilMuestreo, resumen, estadisticas_caches)
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(
@@ -14,6 +22,26 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# --- TELEMETRÍA ---
+# Tiempos por etapa y por rerun (histogramas en /metrics y/o log JSON) y perfil por
+# muestreo de un rerun con ?perfil=<clave_perfil>. Todo opcional, en st.secrets["telemetria"].
+try: TELEMETRIA = config_telemetria(dict(st.secrets["telemetria"]))
+except Exception: TELEMETRIA = config_telemetria({})
+
+@st.cache_resource
+def servicio_telemetria():
+    if TELEMETRIA["log"]: configurar_log(TELEMETRIA["log"])
+    if TELEMETRIA["puerto_metricas"]:
+        try: iniciar_exportador(TELEMETRIA["puerto_metricas"])
+        except OSError: pass
+    return True
+
+servicio_telemetria()
+inicio_rerun = iniciar_rerun("interno")
+perfil = None
+if perfil_pedido(st.query_params.get("perfil"), TELEMETRIA["clave_perfil"]):
+    del st.query_params["perfil"]; perfil = PerfilMuestreo().iniciar()
+
 # --- 1. CONFIGURACIÓN ---
 FUENTES_DISPONIBLES = {
     "Aleo Regular": "assets/fonts/Aleo-Regular.ttf",
@@ -30,13 +58,6 @@ FUENTES_DISPONIBLES = {
     "Arial (Sistema)": "Arial"
 }
 
-# --- CONSTANTES ---
-FACTOR_PT_A_MM = 0.3527
-ANCHO_REAL_MM = 36
-ALTO_REAL_MM = 15
-SCALE_PREVIEW = 20
-SCALE_HD = 80
-
 # --- DATOS DE EJEMPLO ---
 EJEMPLO_INICIAL = [
     {"texto": "Juan Pérez", "font_idx": 2, "size": 16, "offset": -1.5},
@@ -113,144 +134,19 @@ def pil_to_base64(img):
 # --- HEADER ---
 c_logo, c_title = st.columns([0.15, 0.85])
 with c_logo:
-    if os.path.exists("assets/logo.svg"): st.image("assets/logo.svg", width=90)
-    elif os.path.exists("assets/logo.png"): st.image("assets/logo.png", width=90)
+    # El SVG sale del almacén de activos (mapeado al arrancar), sin tocar el disco por rerun.
+    logo = texto(RUTA_LOGO)
+    if logo: st.image(logo, width=90)
+    elif existe("assets/logo.png"): st.image("assets/logo.png", width=90)
 with c_title:
     st.title("Editor de Sellos (Uso Interno)")
     st.markdown("Generación directa del archivo **Vector/HD**.")
 st.write("---")
 
-# --- HELPERS ---
-def calcular_ancho_texto_mm(texto, ruta_fuente, size_pt):
-    if not texto: return 0
-    scale_measure = 10
-    size_px = int(size_pt * FACTOR_PT_A_MM * scale_measure)
-    try:
-        if ruta_fuente == "Arial": raise Exception
-        font = ImageFont.truetype(ruta_fuente, size_px)
-    except: font = ImageFont.load_default()
-    width_px = font.getlength(texto)
-    return width_px / scale_measure
-
-def get_font_metrics_mm(ruta_fuente, size_pt):
-    try:
-        scale = 100
-        size_px = int(size_pt * FACTOR_PT_A_MM * scale)
-        if ruta_fuente == "Arial" or not os.path.exists(ruta_fuente):
-            ascent = size_px * 0.8
-        else:
-            font = ImageFont.truetype(ruta_fuente, size_px)
-            ascent, descent = font.getmetrics()
-        return ascent / scale
-    except:
-        return (size_pt * FACTOR_PT_A_MM) * 0.78
-
 # --- CALLBACKS (Persistencia de estado manual) ---
 def mover_arriba(key): st.session_state[key] = max(-10.0, st.session_state[key] - 0.1)
 def mover_abajo(key): st.session_state[key] = min(10.0, st.session_state[key] + 0.1)
 
-# --- MOTOR GRÁFICO ---
-def renderizar_imagen(datos_lineas, scale, dibujar_borde=True, color_borde="black", mostrar_guias=False):
-    w_px = int(ANCHO_REAL_MM * scale)
-    h_px = int(ALTO_REAL_MM * scale)
-    img = Image.new('RGB', (w_px, h_px), "white")
-    draw = ImageDraw.Draw(img)
-
-    if dibujar_borde:
-        grosor = 4 if color_borde == "red" else max(2, int(scale/5))
-        draw.rectangle([(0,0), (w_px-1, h_px-1)], outline=color_borde, width=grosor)
-
-    total_h_px = 0
-    for linea in datos_lineas:
-        size_pt = linea['size']
-        size_px = size_pt * FACTOR_PT_A_MM * scale
-        total_h_px += size_px
-
-    y_cursor_base = (h_px - total_h_px) / 2
-
-    for i, linea in enumerate(datos_lineas):
-        txt = linea['texto']
-        f_path = linea['fuente']
-        sz_pt = linea['size']
-        offset_mm = linea['offset_y']
-        sz_px = int(sz_pt * FACTOR_PT_A_MM * scale)
-        offset_px = int(offset_mm * scale)
-
-        try:
-            if f_path == "Arial": raise Exception
-            font = ImageFont.truetype(f_path, sz_px)
-        except: font = ImageFont.load_default()
-
-        bbox = draw.textbbox((0, 0), txt, font=font)
-        text_w = bbox[2] - bbox[0]
-        x_pos = (w_px - text_w) / 2
-        y_visual_px = y_cursor_base + offset_px
-
-        draw.text((x_pos, y_visual_px), txt, font=font, fill="black")
-
-        # Guías (para HD)
-        if mostrar_guias:
-            color_guia = (0, 150, 255)
-            grosor_guia = max(1, int(scale / 20))
-            tamano_fuente_cota = int(8 * scale / 6)
-            try: ascent, descent = font.getmetrics()
-            except: ascent = sz_px * 0.8
-            y_base_guia = y_visual_px + ascent
-            draw.line([(0, y_base_guia), (w_px, y_base_guia)], fill=color_guia, width=grosor_guia)
-
-            try: font_small = ImageFont.truetype("assets/fonts/Roboto-Regular.ttf", tamano_fuente_cota)
-            except: font_small = font
-            pos_mm_real = y_base_guia / scale
-            label = f"{pos_mm_real:.1f}"
-
-            draw.text((scale * 0.5, y_base_guia - tamano_fuente_cota), label, font=font_small, fill=color_guia)
-            draw.rectangle([x_pos, y_visual_px, x_pos + text_w, y_visual_px + sz_px], outline=(200,200,200), width=0)
-
-        y_cursor_base += sz_px
-    return img
-
-# --- GENERADOR PDF ---
-def generar_pdf_hibrido(datos_lineas, cliente, incluir_guias_hd=False):
-    pdf = FPDF(orientation='P', unit='mm', format=(ANCHO_REAL_MM, ALTO_REAL_MM))
-
-    # PÁG 1: Vectorial (Editable)
-    pdf.add_page(); pdf.set_margins(0,0,0); pdf.set_auto_page_break(False, margin=0)
-    font_map = {}; font_counter = 1
-    for ruta in FUENTES_DISPONIBLES.values():
-        if ruta != "Arial" and os.path.exists(ruta):
-            family_name = f"F{font_counter}"
-            try: pdf.add_font(family_name, "", ruta); font_map[ruta] = family_name; font_counter += 1
-            except: pass
-
-    h_total_mm = sum([l['size'] * FACTOR_PT_A_MM for l in datos_lineas])
-    y_base = (ALTO_REAL_MM - h_total_mm) / 2
-
-    for l in datos_lineas:
-        ruta = l['fuente']
-        fam = font_map.get(ruta, "Arial")
-        pdf.set_font(fam, size=l['size'])
-        try: txt = l['texto'].encode('latin-1', 'replace').decode('latin-1')
-        except: txt = l['texto']
-        txt_width = pdf.get_string_width(txt)
-        x_centered = (ANCHO_REAL_MM - txt_width) / 2
-
-        ascent_mm = get_font_metrics_mm(ruta, l['size'])
-        y_final_baseline = y_base + l['offset_y'] + ascent_mm
-
-        pdf.text(x_centered, y_final_baseline, txt)
-        y_base += (l['size'] * FACTOR_PT_A_MM)
-
-    # PÁG 2: Imagen HD
-    pdf.add_page()
-    img_hd = renderizar_imagen(datos_lineas, scale=SCALE_HD, dibujar_borde=False, mostrar_guias=incluir_guias_hd)
-    temp_path = f"temp_{datetime.now().strftime('%f')}.jpg"
-    img_hd.save(temp_path, quality=100, subsampling=0)
-    pdf.image(temp_path, x=0, y=0, w=ANCHO_REAL_MM, h=ALTO_REAL_MM)
-    if os.path.exists(temp_path): os.remove(temp_path)
-
-    fname = f"{cliente.replace(' ', '_')}_{datetime.now().strftime('%H%M%S')}.pdf"
-    return bytes(pdf.output()), fname
-
 # --- INTERFAZ PRINCIPAL ---
 
 # Definición de variables globales para el uso interno
@@ -263,6 +159,9 @@ STEPPER_PREFIX = "internal_pos_"
 # La aplicación de uso interno no usa el estado de pasos (diseño/pago)
 # Pero sí necesita persistir los valores de los botones de flecha (Posición Y)
 
+# Identificador de sesión (debounce del precálculo del PDF)
+if 'sesion_id' not in st.session_state: st.session_state.sesion_id = str(uuid.uuid4())
+
 # Inicialización de estado para los 4 posibles offsets (L0 a L3)
 for i in range(4):
     key_offset = f"{STEPPER_PREFIX}{i}"
@@ -279,9 +178,10 @@ with col_izq:
     st.subheader("🛠️ Configuración")
 
     cant = st.selectbox("Cantidad de líneas", [1,2,3,4], index=2)
+    autoajuste = st.toggle("🪄 Ajuste automático", value=False, help="Resuelve tamaños y offsets para que el diseño entre en el sello")
     st.write("")
 
-    datos = []
+    datos, pedidas = [], []
 
     for i in range(cant):
         key_offset = f"{STEPPER_PREFIX}{i}"
@@ -291,7 +191,7 @@ with col_izq:
         if i < len(EJEMPLO_INICIAL):
             def_txt = EJEMPLO_INICIAL[i]["texto"]
             def_idx = EJEMPLO_INICIAL[i]["font_idx"]
-            def_sz = max(8, EJEMPLO_INICIAL[i]["size"])
+            def_sz = max(SIZE_MIN, EJEMPLO_INICIAL[i]["size"])
 
         # CARD
         with st.container(border=True):
@@ -309,7 +209,7 @@ with col_izq:
             with c_icon1: st.markdown('<div class="icon-label">Aᴀ</div>', unsafe_allow_html=True)
             with c_stepper1:
                 # LÍMITE MÍNIMO 8
-                slider_val = st.number_input(f"s{i}", min_value=8, max_value=26, value=def_sz, key=f"si{i}", label_visibility="collapsed")
+                slider_val = st.number_input(f"s{i}", min_value=SIZE_MIN, max_value=SIZE_MAX, value=def_sz, key=f"si{i}", label_visibility="collapsed")
 
             with c_icon2: st.markdown('<div class="icon-label">↕</div>', unsafe_allow_html=True)
 
@@ -324,18 +224,18 @@ with col_izq:
 
             # Validación Ancho
             ruta_fuente = FUENTES_DISPONIBLES[f_key]
-            ancho_mm = calcular_ancho_texto_mm(t, ruta_fuente, slider_val)
-            size_final = slider_val
-            if ancho_mm > ANCHO_REAL_MM:
-                size_final = int((slider_val * (ANCHO_REAL_MM / ancho_mm)) - 0.5)
-                if size_final < 8: size_final = 8
-                st.caption(f"⚠️ Ajustado a {size_final}pt")
+            size_final, ajustado = ajustar_tamano(t, ruta_fuente, slider_val)
+            if ajustado and not autoajuste: st.caption(f"⚠️ Ajustado a {size_final}pt")
 
             datos.append({"texto": t, "fuente": ruta_fuente, "size": size_final, "offset_y": offset_actual})
+            pedidas.append({"texto": t, "fuente": ruta_fuente, "size": slider_val, "offset_y": offset_actual})
+
+    # Ajuste automático: tamaños y offsets resueltos juntos a partir de lo pedido.
+    if autoajuste: datos = autoajustar(pedidas)
 
 # --- CÁLCULO VERTICAL ---
-altura_total_usada_mm = sum([d['size'] * FACTOR_PT_A_MM for d in datos])
-es_valido_vertical = (ALTO_REAL_MM - altura_total_usada_mm) >= -1.0
+altura_total_usada_mm = altura_total_mm(datos)
+es_valido_vertical = entra_en_alto(datos)
 
 # --- COLUMNA DERECHA ---
 with col_der:
@@ -349,12 +249,31 @@ with col_der:
 
     if not es_valido_vertical: st.error("⛔ EXCESO DE ALTURA")
 
-    # Imagen Preview
-    st.image(renderizar_imagen(datos, scale=SCALE_PREVIEW, color_borde="red" if not es_valido_vertical else "black", mostrar_guias=mostrar_guias), use_column_width=True)
+    # Imagen Preview (resolución según el dispositivo, fija por sesión)
+    if "escala_preview" not in st.session_state: st.session_state.escala_preview = escala_preview(st.context.headers, ANCHO_REAL_MM)
+    st.image(obtener_preview(renderizar_imagen, datos, st.session_state.escala_preview, color_borde="red" if not es_valido_vertical else "black", mostrar_guias=mostrar_guias).datos, use_column_width=True)
 
     st.write("---")
 
     if es_valido_vertical:
-        # Botón de descarga
-        pdf_bytes, f_name = generar_pdf_hibrido(datos, CLIENTE_NOMBRE_INTERNO, incluir_guias_hd=mostrar_guias)
-        st.download_button("📥 Descargar PDF Híbrido", pdf_bytes, f_name, "application/pdf", use_container_width=True)
\ No newline at end of file
+        # Botón de descarga: el PDF se arma recién al hacer click (o en segundo plano si el
+        # diseño queda quieto unos segundos) y se cachea por hash del diseño.
+        clave_pdf = hash_diseno(datos, pdf=CLIENTE_NOMBRE_INTERNO, guias_hd=bool(mostrar_guias))
+        generar = lambda datos=datos, guias=mostrar_guias: generar_pdf_hibrido(datos, CLIENTE_NOMBRE_INTERNO, incluir_guias_hd=guias)[0]
+        programar_precalculo(st.session_state.sesion_id, clave_pdf, generar)
+        st.download_button("📥 Descargar PDF Híbrido", lambda: obtener_pdf(clave_pdf, generar), nombre_pdf(CLIENTE_NOMBRE_INTERNO),
+                           "application/pdf", on_click="ignore", use_container_width=True)
+        # SVG de contornos para el software del grabador (sin fuentes)
+        st.download_button("✏️ Descargar SVG", lambda datos=datos: generar_svg(datos), nombre_pdf(CLIENTE_NOMBRE_INTERNO, "svg"),
+                           "image/svg+xml", on_click="ignore", use_container_width=True)
+        # Master 1 bit para el grabador, rasterizado por franjas (no arma el lienzo entero)
+        st.download_button(f"🖨️ Descargar master {DPI_MASTER} dpi", lambda datos=datos: master_pdf(datos),
+                           nombre_pdf(f"{CLIENTE_NOMBRE_INTERNO}_master"), "application/pdf", on_click="ignore", use_container_width=True)
+    # Contadores de las cachés y tiempos por etapa (compartidos por todas las sesiones del proceso)
+    with st.expander("⚙️ Cachés y tiempos"):
+        st.json(estadisticas_caches())
+        st.json(resumen())
+
+# --- FIN DEL RERUN ---
+if perfil: st.toast(f"Perfil guardado en {perfil.guardar(ruta_datos('perfiles', f'{datetime.now():%Y%m%d_%H%M%S}_interno.txt'))}")
+terminar_rerun(inicio_rerun)
@@ -0,0 +1 @@
+# Benchmarks de los caminos calientes del motor: `python -m benchmarks correr|comparar`.
@@ -0,0 +1,120 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# --- CORRIDA Y COMPARACIÓN ---
+# `correr` mide cada caso (calentamiento + rondas de ~TIEMPO_RONDA_S) y guarda
+# el tiempo por llamada en JSON. `comparar` usa el mínimo entre rondas (el menos
+# afectado por ruido de la máquina) contra una línea base y sale
+# con código 1 si algún caso empeoró más que el umbral. Todo offline, sin dependencias
+# fuera de las del repo. Desde la raíz: python -m benchmarks correr -o actual.json
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base.json")
+RONDAS = 7
+TIEMPO_RONDA_S = 0.2
+UMBRAL = 0.25
+
+
+def calibrar(fn, preparar=None, tiempo_ronda=TIEMPO_RONDA_S):
+    if preparar: preparar()
+    fn()   # calentamiento (carga índice, fuentes, etc.)
+    if preparar: preparar()
+    t0 = time.perf_counter(); fn(); unitario = time.perf_counter() - t0
+    return max(1, min(10000, int(tiempo_ronda / max(unitario, 1e-7))))
+
+
+def ronda(fn, preparar, iteraciones):
+    # Sin GC durante la ronda, como timeit: una recolección no cae al azar en un caso.
+    total = 0.0
+    gc.collect(); gc.disable()
+    try:
+        for _ in range(iteraciones):
+            if preparar: preparar()
+            t0 = time.perf_counter(); fn(); total += time.perf_counter() - t0
+    finally: gc.enable()
+    return total / iteraciones
+
+
+def maquina():
+    return {"python": platform.python_version(), "plataforma": platform.platform(), "cpu": platform.processor() or platform.machine(),
+            "nucleos": os.cpu_count()}
+
+
+def correr(filtro=None, rondas=RONDAS, tiempo_ronda=TIEMPO_RONDA_S):
+    # Las rondas se intercalan entre casos: si la máquina se pone lenta un rato, afecta
+    # a todos los casos por igual en vez de arruinar a los que tocaban justo ahí.
+    from benchmarks.casos import casos
+    lista = [(nombre, fn, preparar) for nombre, fn, preparar in casos() if not filtro or filtro in nombre]
+    iteraciones = {nombre: calibrar(fn, preparar, tiempo_ronda) for nombre, fn, preparar in lista}
+    tiempos = {nombre: [] for nombre, _, _ in lista}
+    for _ in range(rondas):
+        for nombre, fn, preparar in lista: tiempos[nombre].append(ronda(fn, preparar, iteraciones[nombre]))
+    resultados = {}
+    for nombre, _, _ in lista:
+        resultados[nombre] = r = {"mediana_s": statistics.median(tiempos[nombre]), "min_s": min(tiempos[nombre]),
+                                  "iteraciones": iteraciones[nombre], "rondas": rondas}
+        print(f"{nombre:<40} {r['min_s'] * 1000:10.3f} ms  (mediana {r['mediana_s'] * 1000:.3f}, x{r['iteraciones']})", flush=True)
+    return {"maquina": maquina(), "fecha": time.strftime("%Y-%m-%d %H:%M:%S"), "casos": resultados}
+
+
+def comparar(base, actual, umbral=UMBRAL, estricto=False):
+    # Devuelve [(caso, base_s, actual_s, cambio)] de los casos que empeoraron más que el umbral.
+    # Con `estricto`, un caso sin línea base también cuenta (base_s y cambio en None): si no,
+    # un caso nuevo o renombrado pasa el chequeo sin haberse comparado nunca.
+    if base.get("maquina") != actual.get("maquina"):
+        print("⚠️  línea base tomada en otra máquina: las diferencias pueden no ser regresiones", file=sys.stderr)
+    regresiones = []
+    for nombre, r in sorted(actual["casos"].items()):
+        b = base["casos"].get(nombre)
+        if b is None:
+            print(f"{'❌' if estricto else '  '} {nombre:<40} (sin línea base)")
+            if estricto: regresiones.append((nombre, None, r["min_s"], None))
+            continue
+        cambio = r["min_s"] / b["min_s"] - 1
+        marca = "❌" if cambio > umbral else ("✅" if cambio < -umbral else "  ")
+        print(f"{marca} {nombre:<40} {b['min_s'] * 1000:10.3f} -> {r['min_s'] * 1000:10.3f} ms  {cambio:+.1%}")
+        if cambio > umbral: regresiones.append((nombre, b["min_s"], r["min_s"], cambio))
+    return regresiones
+
+
+def _leer(ruta):
+    with open(ruta, encoding="utf-8") as f: return json.load(f)
+
+
+def _escribir(ruta, datos):
+    with open(ruta, "w", encoding="utf-8") as f: json.dump(datos, f, indent=1, ensure_ascii=False); f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("correr", help="mide los casos y guarda el resultado")
+    p.add_argument("-o", "--salida", default=None, help=f"JSON de salida (--base: {os.path.relpath(LINEA_BASE)})")
+    p.add_argument("--base", action="store_true", help="guardar como nueva línea base")
+    p.add_argument("-k", "--filtro", default=None, help="sólo casos cuyo nombre contenga este texto")
+    p.add_argument("--rondas", type=int, default=RONDAS)
+    p.add_argument("--rapido", action="store_true", help="rondas cortas (chequeo de humo, no para comparar)")
+    p = sub.add_parser("comparar", help="compara contra la línea base; sale con 1 si hay regresiones")
+    p.add_argument("actual", nargs="?", default=None, help="JSON de `correr` (si falta, corre ahora)")
+    p.add_argument("--contra", default=LINEA_BASE, help="JSON de línea base")
+    p.add_argument("--umbral", type=float, default=UMBRAL, help="empeoramiento tolerado (0.25 = 25%%)")
+    p.add_argument("-k", "--filtro", default=None)
+    p.add_argument("--estricto", action="store_true", help="un caso sin línea base también hace fallar")
+    args = parser.parse_args()
+
+    if args.comando == "correr":
+        resultado = correr(args.filtro, args.rondas, 0.02 if args.rapido else TIEMPO_RONDA_S)
+        salida = LINEA_BASE if args.base else args.salida
+        if args.base and args.filtro and os.path.exists(LINEA_BASE):
+            # Con -k sólo se reemplazan esos casos; el resto de la línea base queda como estaba.
+            resultado["casos"] = {**_leer(LINEA_BASE)["casos"], **resultado["casos"]}
+        if salida: _escribir(salida, resultado); print(f"-> {salida}")
+    else:
+        actual = _leer(args.actual) if args.actual else correr(args.filtro)
+        regresiones = comparar(_leer(args.contra), actual, args.umbral, args.estricto)
+        if regresiones: print(f"{len(regresiones)} caso(s) más lentos que la línea base (+{args.umbral:.0%}) o sin línea base"); sys.exit(1)
+        print("sin regresiones")
@@ -0,0 +1,109 @@
+import importlib.util
+import os
+import subprocess
+import sys
+from sellos import motor
+from sellos.bandas import DPI_MASTER, master_pdf
+from sellos.capas import CACHE_CAPAS
+from sellos.contornos import CACHE_FUENTES_CONTORNO, CACHE_GLIFOS
+from sellos.fuentes import CACHE_FUENTES
+from sellos.medidas import CACHE_TABLAS
+from sellos.pdf_fuentes import CACHE_FUENTES_PDF
+from sellos.vista_previa import CACHE_PREVIEWS, _codificar
+
+# --- FIXTURES ---
+# Los EJEMPLO_INICIAL de los dos editores, más una cuarta línea para cubrir 1 a 4 líneas.
+EJEMPLO_CLIENTE = [("Juan Pérez Pardo", "Aleo Italic", 13, -1.0), ("MÉDICO CLÍNICO", "Mukta Mahee SemiBold", 9, -1.9),
+                   ("Matrícula N° 20408978", "Roboto Medium", 9, -0.9), ("Tel. 11 4567-8901", "Roboto Regular", 8, 0.0)]
+EJEMPLO_INTERNO = [("Juan Pérez", "Great Vibes", 16, -1.5), ("DISEÑADOR GRÁFICO", "Mukta Mahee", 8, 0.0),
+                   ("Matrícula N° 2040", "Montserrat SemiBold", 7, 0.0), ("Estudio Creativo", "Playwrite", 8, 0.0)]
+TEXTOS = {"corto": "Ana", "medio": "Matrícula N° 20408978", "largo": "Estudio Jurídico Pérez & Asociados · Abogados"}
+
+
+def diseno(ejemplo, n_lineas):
+    return [{"texto": t, "fuente": motor.resolver_fuente(f), "size": s, "offset_y": o} for t, f, s, o in ejemplo[:n_lineas]]
+
+
+def limpiar_caches():
+    for cache in (CACHE_CAPAS, CACHE_FUENTES, CACHE_TABLAS, CACHE_FUENTES_PDF, CACHE_PREVIEWS, CACHE_GLIFOS, CACHE_FUENTES_CONTORNO): cache.limpiar()
+
+
+# --- CASOS ---
+# Cada caso es (nombre, fn, preparar): sólo se cronometra fn(); preparar() corre antes
+# de cada llamada, fuera del tiempo (p. ej. vaciar cachés para medir en frío).
+FUENTES_TTF = [r for r in motor.CATALOGO_FUENTES.values() if r != "Arial"]
+
+
+def _barrido_anchos(texto):
+    def fn():
+        for ruta in FUENTES_TTF:
+            for pt in range(motor.SIZE_MIN, motor.SIZE_MAX + 1): motor.calcular_ancho_texto_mm(texto, ruta, pt)
+    return fn
+
+
+def _barrido_ascent():
+    for ruta in FUENTES_TTF:
+        for pt in range(motor.SIZE_MIN, motor.SIZE_MAX + 1): motor.get_font_metrics_mm(ruta, pt)
+
+
+# --- ARRANQUE ---
+# Importación en un intérprete nuevo, como al arrancar un contenedor o una réplica: se
+# cronometra el proceso completo (import/python es la referencia de un intérprete vacío).
+# Los módulos de cada app son los que importa al cargar, antes del primer rerun.
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTACIONES = {
+    "python": "pass",
+    "motor": "import sellos.motor",
+    "app_cliente": "import streamlit, sellos.motor, sellos.vista_previa, sellos.editor_vivo, sellos.activos, sellos.arranque, sellos.datos, sellos.telemetria",
+    "app_interno": "import streamlit, sellos.motor, sellos.vista_previa, sellos.bandas, sellos.pdf_diferido, sellos.datos, sellos.activos, sellos.telemetria",
+    "pdf": "import fpdf, sellos.contornos",
+    "correo": "import sellos.correo, sellos.cola",
+    "pago": "import sellos.mp, sellos.pagos, mercadopago",
+}
+
+
+def _importar(codigo):
+    comando = [sys.executable, "-c", codigo]
+    return lambda: subprocess.run(comando, cwd=RAIZ, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _disponible(codigo):
+    # Sólo los casos con sus dependencias instaladas (mercadopago es opcional fuera de producción).
+    if not codigo.startswith("import "): return True
+    return all(importlib.util.find_spec(m.strip().split(".")[0]) for m in codigo[len("import "):].split(","))
+
+
+def casos():
+    lista = [(f"ancho_mm/{nombre}/todas_las_fuentes", _barrido_anchos(txt), None) for nombre, txt in TEXTOS.items()]
+    lista.append(("ascent_mm/todas_las_fuentes", _barrido_ascent, None))
+    # Auto-ajuste de un diseño que no entra ni a lo ancho ni a lo alto; "frio" sin los topes cacheados.
+    d = [{**l, "size": 20} for l in diseno(EJEMPLO_CLIENTE, 4)]
+    lista.append(("layout/autoajuste/4l", lambda d=d: motor.autoajustar(d), None))
+    lista.append(("layout/autoajuste_frio/4l", lambda d=d: motor.autoajustar(d), motor.CACHE_TOPES.limpiar))
+    for n in (1, 2, 3, 4):
+        d = diseno(EJEMPLO_CLIENTE, n)
+        lista.append((f"render/preview/{n}l", lambda d=d: motor.renderizar_imagen(d, motor.SCALE_PREVIEW), None))
+        lista.append((f"render/preview_frio/{n}l", lambda d=d: motor.renderizar_imagen(d, motor.SCALE_PREVIEW), limpiar_caches))
+    for guias in (False, True):
+        sufijo = "guias" if guias else "sin_guias"
+        d = diseno(EJEMPLO_CLIENTE, 3)
+        lista.append((f"render/preview/3l_{sufijo}", lambda d=d, g=guias: motor.renderizar_imagen(d, motor.SCALE_PREVIEW, mostrar_guias=g), None))
+        lista.append((f"render/hd/3l_{sufijo}", lambda d=d, g=guias: motor.renderizar_imagen(d, motor.SCALE_HD, dibujar_borde=False, mostrar_guias=g, modo="L" if g else "1"), None))
+    img = motor.renderizar_imagen(diseno(EJEMPLO_CLIENTE, 3), motor.SCALE_PREVIEW, modo="L")
+    # Sucesor de pil_to_base64: PNG de paleta + base64 de la vista previa (y la variante WebP).
+    lista.append(("preview/png_base64", lambda: _codificar("bench", img), None))
+    lista.append(("preview/webp_base64", lambda: _codificar("bench", img, "webp"), None))
+    for ejemplo, nombre in ((EJEMPLO_CLIENTE, "cliente"), (EJEMPLO_INTERNO, "interno")):
+        for n in (1, 4):
+            d = diseno(ejemplo, n)
+            lista.append((f"pdf/{nombre}/{n}l", lambda d=d: motor.generar_pdf_hibrido(d, "Bench"), None))
+    for ejemplo, nombre in ((EJEMPLO_CLIENTE, "cliente"), (EJEMPLO_INTERNO, "interno")):
+        d = diseno(ejemplo, 4)
+        lista.append((f"svg/{nombre}/4l", lambda d=d: motor.generar_svg(d), None))
+    d = diseno(EJEMPLO_CLIENTE, 4)
+    lista.append((f"master/{DPI_MASTER}dpi/4l", lambda d=d: master_pdf(d), None))
+    d = diseno(EJEMPLO_CLIENTE, 3)
+    lista.append(("pdf/cliente/3l_guias", lambda: motor.generar_pdf_hibrido(d, "Bench", incluir_guias_hd=True), None))
+    lista.append(("pdf/cliente/3l_frio", lambda: motor.generar_pdf_hibrido(d, "Bench"), limpiar_caches))
+    lista += [(f"import/{nombre}", _importar(codigo), None) for nombre, codigo in IMPORTACIONES.items() if _disponible(codigo)]
+    return lista
@@ -0,0 +1 @@
+# Núcleo compartido de los editores de sellos (app-pdf.py y app-sellos-local.py).
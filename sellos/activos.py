@@ -0,0 +1,81 @@
+import mmap
+import os
+import threading
+
+# --- ALMACÉN DE ACTIVOS ---
+# Fuentes y logo mapeados en memoria una vez por proceso (mmap de sólo lectura): todas
+# las sesiones leen del mismo mapa, y los procesos hijos de un fork (el pool de
+# `sellos.lote`) lo heredan sin volver a abrir nada. Las páginas son las de la page
+# cache del sistema, así que varios procesos con los mismos archivos no duplican
+# memoria. Los faltantes también quedan registrados (None): después de precargar no
+# hay más os.path.exists ni lecturas de disco en el camino de cada rerun.
+RUTA_LOGO = "assets/logo.svg"
+
+_mapas = {}
+_lock = threading.Lock()
+
+
+def _mapear(ruta):
+    try:
+        with open(ruta, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0: return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError): return None
+
+
+def mapa(ruta):
+    # mmap del archivo o None si no existe ("Arial" es la fuente del sistema, no un archivo).
+    if ruta == "Arial": return None
+    try: return _mapas[ruta]
+    except KeyError: pass
+    with _lock:
+        if ruta not in _mapas: _mapas[ruta] = _mapear(ruta)
+        return _mapas[ruta]
+
+
+def existe(ruta):
+    return mapa(ruta) is not None
+
+
+def precargar(rutas):
+    for ruta in rutas: mapa(ruta)
+    return estadisticas_activos()
+
+
+class _Lector:
+    # Archivo de sólo lectura sobre el mapa compartido, con posición propia: el mmap
+    # tiene una sola posición y lo leen varios hilos (Pillow, fontTools) a la vez.
+    def __init__(self, ruta, datos):
+        self.name, self._datos, self._pos = ruta, datos, 0
+
+    def read(self, n=-1):
+        fin = len(self._datos) if n is None or n < 0 else min(len(self._datos), self._pos + n)
+        trozo = self._datos[self._pos:fin]
+        self._pos = max(self._pos, fin)
+        return trozo
+
+    def seek(self, pos, desde=0):
+        self._pos = max(0, pos if desde == 0 else (self._pos + pos if desde == 1 else len(self._datos) + pos))
+        return self._pos
+
+    def tell(self): return self._pos
+    def seekable(self): return True
+    def readable(self): return True
+    def close(self): pass
+
+
+def lector(ruta):
+    # Objeto tipo archivo para ImageFont.truetype / TTFont, o None si el activo no existe.
+    datos = mapa(ruta)
+    return None if datos is None else _Lector(ruta, datos)
+
+
+def estadisticas_activos():
+    with _lock: presentes = [m for m in _mapas.values() if m is not None]
+    return {"archivos": len(presentes), "faltantes": len(_mapas) - len(presentes), "bytes": sum(len(m) for m in presentes)}
+
+
+def texto(ruta, codificacion="utf-8"):
+    # Contenido del activo como texto (p. ej. el SVG del logo para st.image), o None.
+    datos = mapa(ruta)
+    return None if datos is None else datos[:].decode(codificacion)
@@ -0,0 +1,68 @@
+import threading
+import time
+from contextlib import contextmanager
+from sellos.activos import RUTA_LOGO, existe, precargar
+from sellos.fuentes import cargar_fuente
+from sellos.motor import (CATALOGO_FUENTES, FACTOR_PT_A_MM, SCALE_PREVIEW, SIZE_MAX, SIZE_MIN,
+                          calcular_ancho_texto_mm, entra_en_alto, generar_pdf_hibrido, get_font_metrics_mm, renderizar_imagen)
+from sellos.pdf_fuentes import archivo_reducido
+from sellos.telemetria import tramo
+from sellos.vista_previa import obtener_preview
+
+# --- PRECALENTADO DE ARRANQUE ---
+# Lo que el primer visitante pagaría en frío, hecho una vez por proceso: mapear fuentes
+# y logo, las tablas del índice de medidas y los FreeTypeFont de cada (fuente, tamaño)
+# de SIZE_MIN a SIZE_MAX a las escalas de vista previa, las fuentes reducidas del PDF
+# y el render (vista previa y PDF) del diseño de ejemplo. Todo va a las caches compartidas del proceso.
+# Diagnóstico: python -m sellos.arranque (tiempos en frío de cada etapa).
+SIZES_PRECALENTADO = range(SIZE_MIN, SIZE_MAX + 1)
+
+
+@contextmanager
+def _etapa(nombre, tiempos):
+    t0 = time.perf_counter()
+    try:
+        with tramo(f"arranque.{nombre}"): yield
+    finally: tiempos[nombre] = time.perf_counter() - t0
+
+
+def precalentar(rutas, ejemplos=(), escalas=(SCALE_PREVIEW,), sizes=SIZES_PRECALENTADO, extras=()):
+    # `ejemplos`: diseños (listas de líneas con ruta) para dejar su vista previa hecha.
+    # `extras`: funciones sin argumentos que corren al final (p. ej. las fuentes web del editor).
+    tiempos = {}
+    etapa = lambda nombre: _etapa(nombre, tiempos)
+    with etapa("activos"): precargar(list(rutas) + [RUTA_LOGO])
+    rutas = [r for r in dict.fromkeys(rutas) if existe(r)]
+    with etapa("medidas"):
+        for ruta in rutas:
+            for size in sizes: calcular_ancho_texto_mm("M", ruta, size); get_font_metrics_mm(ruta, size)
+    with etapa("fuentes"):
+        for ruta in rutas:
+            for escala in escalas:
+                for size in sizes: cargar_fuente(ruta, int(size * FACTOR_PT_A_MM * escala))
+    with etapa("pdf"):
+        for ruta in rutas: archivo_reducido(ruta)
+    with etapa("ejemplo"):
+        for datos in ejemplos:
+            color_borde = "black" if entra_en_alto(datos) else "red"
+            for escala in escalas: obtener_preview(renderizar_imagen, datos, escala, color_borde=color_borde, mostrar_guias=False)
+        # Un PDF del ejemplo: deja abiertos los contornos y las fuentes HD del primer pedido.
+        if ejemplos: generar_pdf_hibrido(ejemplos[0], "precalentado")
+    with etapa("extras"):
+        for extra in extras: extra()
+    return tiempos
+
+
+def iniciar_precalentado(*args, **kwargs):
+    # En segundo plano: la sesión que lo dispara no espera; las siguientes lo encuentran hecho.
+    hilo = threading.Thread(target=precalentar, args=args, kwargs=kwargs, name="precalentado", daemon=True)
+    hilo.start()
+    return hilo
+
+
+if __name__ == "__main__":
+    ejemplo = [{"texto": "Juan Pérez Pardo", "fuente": CATALOGO_FUENTES["Aleo Italic"], "size": 13, "offset_y": -1.0}]
+    t0 = time.perf_counter()
+    tiempos = precalentar(CATALOGO_FUENTES.values(), [ejemplo])
+    for nombre, segundos in tiempos.items(): print(f"{nombre:<10} {segundos * 1000:8.1f} ms")
+    print(f"{'total':<10} {(time.perf_counter() - t0) * 1000:8.1f} ms  ({len(CATALOGO_FUENTES)} fuentes, {len(SIZES_PRECALENTADO)} tamaños)")
@@ -0,0 +1,145 @@
+import io
+import math
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageDraw
+from sellos.motor import ANCHO_REAL_MM, ALTO_REAL_MM, disponer_px
+from sellos.telemetria import medido
+
+# --- RENDER POR BANDAS ---
+# Para masters de alta resolución (2400 dpi y más) sin armar el lienzo completo: el
+# sello se rasteriza en franjas horizontales de ALTO_BANDA_PX, en paralelo en un pool
+# de hilos, y cada franja terminada va directo al codificador (PNG o PDF escritos a
+# mano con zlib). Cada franja dibuja glifo por glifo sólo los que la tocan, así que
+# la memoria pico es del orden de unas pocas franjas más un glifo, no del sello entero.
+# Hilos y no procesos: las franjas tienen que llegar en orden al codificador, y Pillow
+# suelta el GIL al rellenar, pegar y convertir.
+DPI_MASTER = 2400
+ALTO_BANDA_PX = 256
+HILOS = min(4, os.cpu_count() or 1)
+NIVEL_COMPRESION = 6
+
+
+def escala_dpi(dpi):
+    return dpi / 25.4
+
+
+def _glifos(linea, font, x_pos, y_px):
+    # (x, y, caracter, arriba, abajo) por glifo. La x se acumula par a par: getlength(par) -
+    # getlength(segundo) es el avance del primero más el kerning entre los dos, lo mismo que
+    # getlength(txt[:i]) (layout básico, en 1/64 px: la suma es exacta) sin volver a medir el prefijo.
+    txt, glifos, x = linea['texto'], [], 0
+    for i, ch in enumerate(txt):
+        if i: x += font.getlength(txt[i - 1:i + 1]) - font.getlength(ch)
+        if ch.isspace(): continue
+        _, arriba, _, abajo = font.getbbox(ch)
+        glifos.append((x_pos + x, y_px, ch, y_px + arriba, y_px + abajo))
+    return font, glifos
+
+
+def _pegar_glifo(draw, ch, font, x, y, y0):
+    # Lo mismo que draw.text((x, y)) en el lienzo completo, corrido a la franja. Dibujar en
+    # (x, y - y0) no sirve: Pillow separa la posición con modf y trunca hacia cero, así que
+    # un glifo que empieza arriba de la franja (y - y0 negativo) se rasterizaría con otra
+    # fase subpíxel. Fase y base salen de la posición absoluta, como en el lienzo completo.
+    mascara, (dx, dy) = font.getmask2(ch, draw.fontmode, start=(math.modf(x)[0], math.modf(y)[0]))
+    draw.draw.draw_bitmap((int(x) + dx, int(y) + dy - y0), mascara, 0)
+
+
+@medido("render.banda")
+def _banda(lineas, w_px, y0, alto, modo):
+    banda = Image.new("L", (w_px, alto), 255)
+    draw = ImageDraw.Draw(banda)
+    for font, glifos in lineas:
+        for x, y, ch, arriba, abajo in glifos:
+            if abajo < y0 or arriba >= y0 + alto: continue
+            _pegar_glifo(draw, ch, font, x, y, y0)
+    return banda.convert("1", dither=Image.Dither.NONE) if modo == "1" else banda
+
+
+def bandas(datos_lineas, scale, modo="1", alto_banda=ALTO_BANDA_PX, hilos=HILOS):
+    # Generador de franjas en orden; como mucho 2 * hilos franjas vivas a la vez.
+    w_px, h_px = int(ANCHO_REAL_MM * scale), int(ALTO_REAL_MM * scale)
+    lineas = [_glifos(linea, font, x, y) for linea, font, _, x, y, _, _ in disponer_px(datos_lineas, scale)]
+    with ThreadPoolExecutor(hilos, thread_name_prefix="banda") as pool:
+        pendientes = deque()
+        for y0 in range(0, h_px, alto_banda):
+            pendientes.append(pool.submit(_banda, lineas, w_px, y0, min(alto_banda, h_px - y0), modo))
+            if len(pendientes) >= 2 * hilos: yield pendientes.popleft().result()
+        while pendientes: yield pendientes.popleft().result()
+
+
+def _filas(banda):
+    crudo = banda.tobytes()
+    ancho = len(crudo) // banda.height
+    return ancho, crudo
+
+
+# --- CODIFICADORES EN STREAMING ---
+def escribir_png(f, datos_lineas, scale, modo="1", **opciones):
+    # PNG en escala de grises (1 u 8 bits) con pHYs, un IDAT por franja comprimida.
+    def chunk(tipo, datos): f.write(struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos)))
+    w_px, h_px = int(ANCHO_REAL_MM * scale), int(ALTO_REAL_MM * scale)
+    ppm = round(scale * 1000)
+    f.write(b"\x89PNG\r\n\x1a\n")
+    chunk(b"IHDR", struct.pack(">IIBBBBB", w_px, h_px, 1 if modo == "1" else 8, 0, 0, 0, 0))
+    chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+    z = zlib.compressobj(NIVEL_COMPRESION)
+    for banda in bandas(datos_lineas, scale, modo, **opciones):
+        ancho, crudo = _filas(banda)
+        # Filtro 0 (None) al principio de cada fila.
+        comprimido = z.compress(b"".join(b"\x00" + crudo[i:i + ancho] for i in range(0, len(crudo), ancho)))
+        if comprimido: chunk(b"IDAT", comprimido)
+    chunk(b"IDAT", z.flush())
+    chunk(b"IEND", b"")
+
+
+def escribir_pdf(f, datos_lineas, scale, modo="1", **opciones):
+    # PDF mínimo de una página del tamaño del sello con la imagen en FlateDecode. El largo
+    # del stream se conoce al final, así que va como objeto indirecto después del stream.
+    w_px, h_px = int(ANCHO_REAL_MM * scale), int(ALTO_REAL_MM * scale)
+    w_pt, h_pt = ANCHO_REAL_MM * 72 / 25.4, ALTO_REAL_MM * 72 / 25.4
+    offsets, escrito = [], [0]
+
+    def salida(datos):
+        f.write(datos); escrito[0] += len(datos)
+
+    def objeto(cuerpo):
+        offsets.append(escrito[0])
+        salida(f"{len(offsets)} 0 obj\n".encode() + cuerpo + b"\nendobj\n")
+
+    contenido = f"q {w_pt:.4f} 0 0 {h_pt:.4f} 0 0 cm /Im0 Do Q".encode()
+    salida(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    objeto(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objeto(b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
+    objeto(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w_pt:.4f} {h_pt:.4f}] "
+           f"/Resources << /XObject << /Im0 5 0 R >> >> /Contents 4 0 R >>".encode())
+    objeto(f"<< /Length {len(contenido)} >>\nstream\n".encode() + contenido + b"\nendstream")
+    offsets.append(escrito[0])
+    salida(f"5 0 obj\n<< /Type /XObject /Subtype /Image /Width {w_px} /Height {h_px} /ColorSpace /DeviceGray "
+           f"/BitsPerComponent {1 if modo == '1' else 8} /Filter /FlateDecode /Length 6 0 R >>\nstream\n".encode())
+    inicio, z = escrito[0], zlib.compressobj(NIVEL_COMPRESION)
+    for banda in bandas(datos_lineas, scale, modo, **opciones): salida(z.compress(_filas(banda)[1]))
+    salida(z.flush())
+    largo = escrito[0] - inicio
+    salida(b"\nendstream\nendobj\n")
+    objeto(str(largo).encode())
+    xref = escrito[0]
+    salida(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode() + b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets))
+    salida(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def master_pdf(datos_lineas, dpi=DPI_MASTER, **opciones):
+    buffer = io.BytesIO()
+    escribir_pdf(buffer, datos_lineas, escala_dpi(dpi), "1", **opciones)
+    return buffer.getvalue()
+
+
+def master(datos_lineas, ruta, dpi=DPI_MASTER, modo="1", **opciones):
+    # Escribe el master en ruta (.png o .pdf según la extensión).
+    escribir = escribir_pdf if ruta.lower().endswith(".pdf") else escribir_png
+    with open(ruta, "wb") as f: escribir(f, datos_lineas, escala_dpi(dpi), modo, **opciones)
+    return ruta
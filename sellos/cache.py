@@ -0,0 +1,77 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+
+# --- CACHE LRU COMPARTIDA ---
+# Acotada por cantidad de entradas y por bytes estimados. Segura entre hilos:
+# Streamlit atiende cada sesión en su propio hilo dentro del mismo proceso.
+# Todas las instancias quedan en CACHES (para exportar sus contadores).
+CACHES = weakref.WeakSet()
+
+
+class CacheLRU:
+    def __init__(self, max_entradas=128, max_bytes=None, nombre="cache"):
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.desalojos = 0
+        CACHES.add(self)
+
+    def get(self, clave, default=None):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                return self._datos[clave][0]
+            self.misses += 1
+            return default
+
+    def put(self, clave, valor, peso=0):
+        with self._lock:
+            if clave in self._datos:
+                self._bytes -= self._datos.pop(clave)[1]
+            self._datos[clave] = (valor, peso)
+            self._bytes += peso
+            self._recortar()
+
+    def obtener_o_crear(self, clave, crear, peso=None):
+        # `crear` corre fuera del lock: dos hilos pueden construir el mismo valor
+        # a la vez, pero nunca se bloquea a todo el proceso por un archivo lento.
+        centinela = object()
+        valor = self.get(clave, centinela)
+        if valor is not centinela: return valor
+        valor = crear()
+        self.put(clave, valor, peso(valor) if callable(peso) else (peso or 0))
+        return valor
+
+    def _recortar(self):
+        while self._datos and (len(self._datos) > self.max_entradas or
+                               (self.max_bytes is not None and self._bytes > self.max_bytes and len(self._datos) > 1)):
+            _, (_, peso) = self._datos.popitem(last=False)
+            self._bytes -= peso
+            self.desalojos += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear(); self._bytes = 0
+
+    def __contains__(self, clave):
+        with self._lock: return clave in self._datos
+
+    def __len__(self):
+        with self._lock: return len(self._datos)
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "nombre": self.nombre, "entradas": len(self._datos), "bytes": self._bytes,
+                "hits": self.hits, "misses": self.misses, "desalojos": self.desalojos,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
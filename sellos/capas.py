@@ -0,0 +1,45 @@
+import math
+from PIL import Image, ImageDraw
+from sellos.cache import CacheLRU
+from sellos.telemetria import medido
+
+# --- CAPAS POR LÍNEA ---
+# Cada línea se rasteriza una vez a una máscara "L" y se reutiliza entre reruns:
+# cambiar el offset de una línea sólo mueve dónde se pega su capa, y editar una
+# línea sólo re-rasteriza esa línea. La clave incluye la fracción de px de la
+# posición (FreeType rasteriza con ese desplazamiento), así el resultado es
+# idéntico a dibujar con draw.text directo.
+CACHE_CAPAS = CacheLRU(max_entradas=512, max_bytes=96 * 1024 * 1024, nombre="capas")
+
+
+def ancho_texto_px(txt, font, clave_fuente):
+    # Igual que draw.textbbox((0, 0), txt, font=font) -> ancho, sin tocar FreeType si ya se midió.
+    def medir():
+        bbox = font.getbbox(txt)
+        return bbox[2] - bbox[0]
+    return CACHE_CAPAS.obtener_o_crear(("ancho", txt, clave_fuente), medir)
+
+
+@medido("capa.rasterizado")
+def _rasterizar(txt, font, sx, sy):
+    l, t, r, b = font.getbbox(txt)
+    pad = int(max(0, -l, -t)) + 2
+    capa = Image.new("L", (int(pad + max(r, 1)) + 2, int(pad + max(b, 1)) + 2), 0)
+    ImageDraw.Draw(capa).text((pad + sx, pad + sy), txt, font=font, fill=255)
+    return capa, pad
+
+
+def pegar_texto(img, txt, font, clave_fuente, xy, fill="black"):
+    x, y = xy
+    if x < 0 or y < 0:
+        # Con coordenadas negativas Pillow trunca hacia cero: se dibuja directo para no desalinear.
+        ImageDraw.Draw(img).text(xy, txt, font=font, fill=fill)
+        return
+    sx, sy = math.modf(x)[0], math.modf(y)[0]
+    clave = ("capa", txt, clave_fuente, round(sx, 6), round(sy, 6))
+    capa, pad = CACHE_CAPAS.obtener_o_crear(clave, lambda: _rasterizar(txt, font, sx, sy), peso=lambda c: c[0].width * c[0].height)
+    img.paste(fill, (int(x) - pad, int(y) - pad), capa)
+
+
+def estadisticas_capas():
+    return CACHE_CAPAS.estadisticas()
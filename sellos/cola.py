@@ -0,0 +1,156 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# --- COLA DURABLE DE PEDIDOS ---
+# SQLite local: un trabajo por pedido_id (encolar dos veces el mismo pedido no lo
+# duplica). Los trabajadores toman trabajos con un "lease"; si el proceso muere a
+# mitad de uno, al vencer el lease vuelve a quedar disponible.
+# EN_DIGESTO: el PDF quedó en el spool del digesto; pasa a ENVIADO cuando sale ese email.
+PENDIENTE, PROCESANDO, EN_DIGESTO, ENVIADO, FALLIDO = "pendiente", "procesando", "en_digesto", "enviado", "fallido"
+MAX_INTENTOS = 5
+BACKOFF_BASE_S = 10
+BACKOFF_MAX_S = 600
+LEASE_S = 300
+_log = logging.getLogger("sellos.cola")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    pedido_id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento REAL NOT NULL,
+    lease_hasta REAL,
+    error TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trabajos_listos ON trabajos (estado, proximo_intento);
+"""
+
+
+def backoff(intentos):
+    return min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** max(0, intentos - 1))
+
+
+class ColaPedidos:
+    def __init__(self, ruta_db, max_intentos=MAX_INTENTOS):
+        self.ruta_db = ruta_db
+        self.max_intentos = max_intentos
+        with self._con() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(ESQUEMA)
+
+    @contextmanager
+    def _con(self):
+        # Una conexión por operación: sqlite3 no comparte conexiones entre hilos.
+        con = sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        try: yield con
+        finally: con.close()
+
+    def encolar(self, pedido_id, payload):
+        ahora = time.time()
+        with self._con() as con:
+            con.execute(
+                "INSERT INTO trabajos (pedido_id, estado, payload, proximo_intento, creado, actualizado) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(pedido_id) DO NOTHING",
+                (pedido_id, PENDIENTE, json.dumps(payload, ensure_ascii=False), ahora, ahora, ahora))
+        return self.estado(pedido_id)
+
+    def reencolar(self, pedido_id):
+        # Reintento manual de un pedido FALLIDO: arranca de cero.
+        ahora = time.time()
+        with self._con() as con:
+            con.execute("UPDATE trabajos SET estado=?, intentos=0, proximo_intento=?, error=NULL, actualizado=? "
+                        "WHERE pedido_id=? AND estado=?", (PENDIENTE, ahora, ahora, pedido_id, FALLIDO))
+
+    def tomar(self):
+        ahora = time.time()
+        with self._con() as con:
+            con.execute("BEGIN IMMEDIATE")
+            fila = con.execute(
+                "SELECT * FROM trabajos WHERE (estado=? AND proximo_intento<=?) OR (estado=? AND lease_hasta<?) "
+                "ORDER BY proximo_intento LIMIT 1", (PENDIENTE, ahora, PROCESANDO, ahora)).fetchone()
+            if fila is None:
+                con.execute("COMMIT"); return None
+            con.execute("UPDATE trabajos SET estado=?, lease_hasta=?, actualizado=? WHERE pedido_id=?",
+                        (PROCESANDO, ahora + LEASE_S, ahora, fila["pedido_id"]))
+            con.execute("COMMIT")
+        return {"pedido_id": fila["pedido_id"], "payload": json.loads(fila["payload"]), "intentos": fila["intentos"]}
+
+    def completar(self, pedido_id, estado=ENVIADO):
+        with self._con() as con:
+            con.execute("UPDATE trabajos SET estado=?, lease_hasta=NULL, error=NULL, actualizado=? WHERE pedido_id=?",
+                        (estado, time.time(), pedido_id))
+
+    def digesto_enviado(self, pedido_ids):
+        if not pedido_ids: return
+        with self._con() as con:
+            con.execute(f"UPDATE trabajos SET estado=?, actualizado=? WHERE estado=? AND pedido_id IN ({','.join('?' * len(pedido_ids))})",
+                        (ENVIADO, time.time(), EN_DIGESTO, *pedido_ids))
+
+    def fallar(self, pedido_id, error):
+        ahora = time.time()
+        with self._con() as con:
+            intentos = con.execute("SELECT intentos FROM trabajos WHERE pedido_id=?", (pedido_id,)).fetchone()[0] + 1
+            estado = FALLIDO if intentos >= self.max_intentos else PENDIENTE
+            con.execute("UPDATE trabajos SET estado=?, intentos=?, proximo_intento=?, lease_hasta=NULL, error=?, actualizado=? "
+                        "WHERE pedido_id=?", (estado, intentos, ahora + backoff(intentos), str(error)[:500], ahora, pedido_id))
+
+    def estado(self, pedido_id):
+        with self._con() as con:
+            fila = con.execute("SELECT estado, intentos, error, proximo_intento FROM trabajos WHERE pedido_id=?", (pedido_id,)).fetchone()
+        return dict(fila) if fila else None
+
+
+# --- TRABAJADORES ---
+class PoolTrabajadores:
+    def __init__(self, cola, procesar, n_hilos=2, espera_s=2.0):
+        # procesar(payload) hace el trabajo completo y lanza excepción si falla. Puede
+        # devolver el estado en que queda el trabajo (EN_DIGESTO); si no, queda ENVIADO.
+        self.cola = cola
+        self.procesar = procesar
+        self.n_hilos = n_hilos
+        self.espera_s = espera_s
+        self._aviso = threading.Event()
+        self._parar = threading.Event()
+        self._hilos = []
+
+    def iniciar(self):
+        for i in range(self.n_hilos):
+            hilo = threading.Thread(target=self._bucle, name=f"pedidos-{i}", daemon=True)
+            hilo.start(); self._hilos.append(hilo)
+        return self
+
+    def avisar(self):
+        self._aviso.set()
+
+    def detener(self, timeout=None):
+        self._parar.set(); self._aviso.set()
+        for hilo in self._hilos: hilo.join(timeout)
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            try: self._vuelta()
+            except Exception:
+                # Un error de la cola misma (p. ej. sqlite "database is locked") no mata al
+                # trabajador: el trabajo queda PROCESANDO y se retoma al vencer el lease.
+                _log.exception("error de la cola de pedidos; el trabajador sigue")
+                self._parar.wait(self.espera_s)
+
+    def _vuelta(self):
+        trabajo = self.cola.tomar()
+        if trabajo is None:
+            self._aviso.wait(self.espera_s); self._aviso.clear()
+            return
+        try:
+            estado = self.procesar(trabajo["payload"])
+        except Exception as e:
+            self.cola.fallar(trabajo["pedido_id"], f"{type(e).__name__}: {e}")
+        else:
+            self.cola.completar(trabajo["pedido_id"], estado or ENVIADO)
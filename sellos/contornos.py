@@ -0,0 +1,120 @@
+import threading
+from collections import namedtuple
+from fontTools.pens.basePen import BasePen
+from fontTools.ttLib import TTFont
+from sellos.activos import existe, lector
+from sellos.cache import CacheLRU
+from sellos.telemetria import medido, tramo
+
+# --- CONTORNOS DE GLIFOS ---
+# Cada glifo se convierte una vez por proceso a un trazo (unidades de la fuente,
+# cuadráticas de TrueType pasadas a cúbicas) y se cachea por (fuente, glifo). Con eso
+# el texto se dibuja como relleno: el PDF no lleva fuentes embebidas, el SVG no depende
+# de que el software del grabador tenga la fuente, y no hay que pasar por latin-1.
+# Las fuentes se abren en modo lazy: sólo se leen las tablas y glifos que se usan, así
+# que el costo no depende del tamaño del TTF.
+Fuente = namedtuple("Fuente", ["glifos", "cmap", "hmtx", "upm"])
+Glifo = namedtuple("Glifo", ["ops", "trazo", "avance"])   # trazo: PaintedPath de fpdf2, en em
+Linea = namedtuple("Linea", ["glifos", "avance", "upm"])   # glifos: [(x en unidades, Glifo)]
+
+CACHE_FUENTES_CONTORNO = CacheLRU(max_entradas=32, nombre="fuentes_contorno")
+CACHE_GLIFOS = CacheLRU(max_entradas=8192, max_bytes=32 * 1024 * 1024, nombre="glifos")
+_lock_ttf = threading.Lock()   # TTFont lazy no es seguro entre hilos
+
+
+class _Pluma(BasePen):
+    def __init__(self, glifos):
+        super().__init__(glifos)
+        self.ops = []
+
+    def _moveTo(self, p): self.ops.append(("M", p))
+    def _lineTo(self, p): self.ops.append(("L", p))
+    def _curveToOne(self, p1, p2, p3): self.ops.append(("C", p1, p2, p3))
+    def _closePath(self): self.ops.append(("Z",))
+
+
+def _trazo(ops, upm):
+    # PaintedPath de fpdf2 en em (no en unidades: fpdf2 escribe los números con 4 decimales y la
+    # escala unidades -> mm se redondeaba ~1 %). Se arma una vez por glifo y cada PDF lo reutiliza.
+    from fpdf.drawing import PaintedPath, PathPaintRule
+    trazo = PaintedPath()
+    trazo.style.paint_rule = PathPaintRule.FILL_NONZERO; trazo.style.fill_color = "#000000"
+    for op in ops:
+        em = [c / upm for p in op[1:] for c in p]
+        if op[0] == "M": trazo.move_to(*em)
+        elif op[0] == "L": trazo.line_to(*em)
+        elif op[0] == "C": trazo.curve_to(*em)
+        else: trazo.close()
+    if ops and ops[-1][0] != "Z": trazo.close()   # cerrado acá: al dibujarlo no se toca el objeto compartido
+    return trazo
+
+
+def _abrir(ruta):
+    try:
+        with tramo("contorno.fuente"):
+            ttf = TTFont(lector(ruta), lazy=True)
+            return Fuente(ttf.getGlyphSet(), ttf.getBestCmap() or {}, ttf["hmtx"], ttf["head"].unitsPerEm)
+    except Exception: return False
+
+
+def fuente_contorno(ruta):
+    # Fuente o False ("Arial" del sistema, archivo faltante o ilegible): el llamador dibuja texto.
+    if not existe(ruta): return False
+    return CACHE_FUENTES_CONTORNO.obtener_o_crear(ruta, lambda: _abrir(ruta))
+
+
+@medido("contorno.glifo")
+def _extraer(fuente, nombre):
+    with _lock_ttf:
+        pluma = _Pluma(fuente.glifos)
+        fuente.glifos[nombre].draw(pluma)
+        avance = fuente.hmtx[nombre][0]
+    ops = tuple(pluma.ops)
+    return Glifo(ops, _trazo(ops, fuente.upm), avance)
+
+
+def glifo(ruta, fuente, nombre):
+    return CACHE_GLIFOS.obtener_o_crear((ruta, nombre), lambda: _extraer(fuente, nombre), peso=lambda g: 64 + len(g.ops) * 160)
+
+
+def linea_contorno(ruta, texto):
+    # Glifos posicionados de una línea (sin kerning, como el texto de fpdf2), o None.
+    fuente = fuente_contorno(ruta)
+    if not fuente: return None
+    x, colocados = 0, []
+    for ch in texto:
+        nombre = fuente.cmap.get(ord(ch))
+        if nombre is None or nombre not in fuente.glifos: nombre = ".notdef"
+        g = glifo(ruta, fuente, nombre)
+        if g.ops: colocados.append((x, g))
+        x += g.avance
+    return Linea(colocados, x, fuente.upm)
+
+
+# --- SALIDAS ---
+def dibujar_pdf(pdf, linea, x_mm, baseline_mm, escala_mm):
+    # Con la API de dibujo de fpdf2: cada glifo es su trazo cacheado dentro de un
+    # GraphicsContext con su matriz (em -> mm de la página, y hacia abajo).
+    from fpdf.drawing import GraphicsContext, Transform
+    em_mm = escala_mm * linea.upm
+    with pdf.drawing_context() as contexto:
+        for x, g in linea.glifos:
+            colocado = GraphicsContext()
+            colocado.transform = Transform.scaling(em_mm, -em_mm).translate(x_mm + x * escala_mm, baseline_mm)
+            colocado.add_item(g.trazo, clone=False)
+            contexto.add_item(colocado, clone=False)
+
+
+def trazo_svg(linea, x_mm, y_mm, escala_mm):
+    # Atributo d de un <path> en mm con coordenadas absolutas: sin transform ni <use>,
+    # que algunos programas de grabado no interpretan.
+    partes = []
+    for x, g in linea.glifos:
+        for op in g.ops:
+            puntos = " ".join(f"{x_mm + (x + px) * escala_mm:.3f} {y_mm - py * escala_mm:.3f}" for px, py in op[1:])
+            partes.append(op[0] + puntos)
+    return "".join(partes)
+
+
+def estadisticas_glifos():
+    return CACHE_GLIFOS.estadisticas()
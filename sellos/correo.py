@@ -0,0 +1,214 @@
+import glob
+import json
+import logging
+import os
+import queue
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from sellos.telemetria import medido, tramo
+
+# --- EMAIL DE PEDIDOS ---
+# Sin Streamlit: corre en los trabajadores de la cola. La configuración sale de
+# st.secrets["email"] y puede apuntar a un SMTP local (p. ej. aiosmtpd) para pruebas:
+#   servidor="localhost", puerto=8025, starttls=False, usuario/password vacíos.
+SERVIDOR_DEFAULT = "smtp.gmail.com"
+PUERTO_DEFAULT = 587
+TIMEOUT_SMTP = 30
+MAX_CONEXIONES = 2
+CHEQUEO_OCIOSA_S = 30     # conexión sin uso por más de esto: NOOP antes de reutilizarla
+MAX_OCIOSA_S = 240        # Gmail corta conexiones ociosas: más que esto se descarta directo
+
+_log = logging.getLogger("sellos.correo")
+
+
+def config_email(secretos):
+    return {
+        "servidor": secretos.get("servidor", SERVIDOR_DEFAULT),
+        "puerto": int(secretos.get("puerto", PUERTO_DEFAULT)),
+        "starttls": bool(secretos.get("starttls", True)),
+        "usuario": secretos.get("usuario", ""),
+        "password": secretos.get("password", ""),
+        "remitente": secretos.get("remitente", secretos.get("usuario", "")),
+        "destinatario": secretos["destinatario"],
+        # Modo digesto: >0 junta los pedidos de esa ventana en un solo email al taller.
+        "digesto_minutos": float(secretos.get("digesto_minutos", 0)),
+    }
+
+
+def armar_mensaje(config, pdf_bytes, nombre_pdf, cliente, wpp_cliente, id_pago):
+    msg = MIMEMultipart()
+    msg['From'] = config["remitente"]; msg['To'] = config["destinatario"]; msg['Subject'] = f"Pedido PAGADO: {cliente}"
+    cuerpo = f"""
+    NUEVO PEDIDO CONFIRMADO
+    -----------------------
+    Cliente: {cliente}
+    WhatsApp: {wpp_cliente}
+    ID Pago MP: {id_pago}
+    Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M')}
+    """
+    msg.attach(MIMEText(cuerpo, 'plain'))
+    part = MIMEBase('application', "octet-stream")
+    part.set_payload(pdf_bytes)
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', f'attachment; filename="{nombre_pdf}"')
+    msg.attach(part)
+    return msg
+
+
+@medido("smtp.conexion")
+def conectar(config):
+    server = smtplib.SMTP(config["servidor"], config["puerto"], timeout=TIMEOUT_SMTP)
+    if config["starttls"]: server.starttls()
+    if config["usuario"]: server.login(config["usuario"], config["password"])
+    return server
+
+
+# --- ENVIADOR SMTP CON POOL ---
+# Mantiene conexiones autenticadas abiertas entre envíos. Antes de reutilizar una
+# conexión ociosa se verifica con NOOP; si el servidor la cortó, se reconecta y se
+# reintenta una vez.
+class EnviadorSMTP:
+    def __init__(self, config, max_conexiones=MAX_CONEXIONES):
+        self.config = config
+        self._libres = queue.LifoQueue()
+        self._cupo = threading.BoundedSemaphore(max_conexiones)
+        self.conexiones_abiertas = 0
+        self.envios = 0
+
+    def _sana(self, server, ociosa_s):
+        if ociosa_s > MAX_OCIOSA_S: return False
+        if ociosa_s < CHEQUEO_OCIOSA_S: return True
+        try: return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError): return False
+
+    def _descartar(self, server):
+        try: server.quit()
+        except (smtplib.SMTPException, OSError): pass
+
+    @contextmanager
+    def conexion(self):
+        with self._cupo:
+            server = None
+            while server is None:
+                try: candidato, desde = self._libres.get_nowait()
+                except queue.Empty:
+                    server = conectar(self.config); self.conexiones_abiertas += 1
+                    break
+                if self._sana(candidato, time.monotonic() - desde): server = candidato
+                else: self._descartar(candidato)
+            try:
+                yield server
+            except BaseException:
+                # Ante cualquier error la conexión no vuelve al pool: su estado es dudoso.
+                self._descartar(server)
+                raise
+            self._libres.put((server, time.monotonic()))
+
+    def enviar(self, msg):
+        texto = msg.as_string()
+        for intento in range(2):
+            try:
+                with self.conexion() as server, tramo("smtp.envio"):
+                    server.sendmail(self.config["remitente"], self.config["destinatario"], texto)
+                self.envios += 1
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+                # Sólo si se cortó la conexión: SMTPException hereda de OSError, y un rechazo
+                # del servidor (destinatario, tamaño, auth) se repetiría igual.
+                if intento: raise
+
+    def cerrar(self):
+        while True:
+            try: server, _ = self._libres.get_nowait()
+            except queue.Empty: return
+            self._descartar(server)
+
+
+def enviar_email(enviador, pdf_bytes, nombre_pdf, cliente, wpp_cliente, id_pago):
+    # Lanza la excepción de smtplib si falla: la cola decide si reintentar.
+    enviador.enviar(armar_mensaje(enviador.config, pdf_bytes, nombre_pdf, cliente, wpp_cliente, id_pago))
+
+
+# --- MODO DIGESTO ---
+# Los pedidos de una ventana de N minutos viajan juntos en un solo email al taller.
+# Se acumulan en un directorio spool (PDF + .json), así un reinicio no pierde pedidos
+# que la cola ya sacó de la fila (quedan EN_DIGESTO): lo pendiente sale en el próximo envío.
+class DigestoPedidos:
+    def __init__(self, enviador, dir_spool, ventana_s, al_enviar=None):
+        # al_enviar(pedido_ids): se llama con los pedidos de cada digesto que salió.
+        self.enviador = enviador
+        self.dir_spool = dir_spool
+        self.ventana_s = ventana_s
+        self.al_enviar = al_enviar
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        os.makedirs(dir_spool, exist_ok=True)
+        self._hilo = threading.Thread(target=self._bucle, name="digesto", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def agregar(self, pdf_bytes, nombre_pdf, cliente, wpp_cliente, id_pago, pedido_id=None):
+        base = os.path.join(self.dir_spool, f"{time.time():.6f}_{uuid.uuid4().hex}")
+        with open(base + ".pdf", "wb") as f: f.write(pdf_bytes)
+        meta = {"nombre_pdf": nombre_pdf, "cliente": cliente, "wpp": wpp_cliente, "id_pago": id_pago, "pedido_id": pedido_id,
+                "fecha": datetime.now().strftime('%d/%m/%Y %H:%M')}
+        # El .json se escribe último y por rename: su presencia marca la entrada como completa.
+        with open(base + ".tmp", "w", encoding="utf-8") as f: json.dump(meta, f, ensure_ascii=False)
+        os.replace(base + ".tmp", base + ".json")
+
+    def pendientes(self):
+        return sorted(glob.glob(os.path.join(self.dir_spool, "*.json")))
+
+    def enviar_pendientes(self):
+        with self._lock:
+            entradas = self.pendientes()
+            if not entradas: return 0
+            pedidos = []
+            for ruta in entradas:
+                with open(ruta, encoding="utf-8") as f: meta = json.load(f)
+                with open(ruta[:-5] + ".pdf", "rb") as f: pedidos.append((meta, f.read()))
+            self.enviador.enviar(armar_digesto(self.enviador.config, pedidos))
+            for ruta in entradas:
+                os.remove(ruta[:-5] + ".pdf"); os.remove(ruta)
+            if self.al_enviar: self.al_enviar([meta["pedido_id"] for meta, _ in pedidos if meta.get("pedido_id")])
+            return len(entradas)
+
+    def detener(self):
+        self._parar.set(); self._hilo.join()
+
+    def _bucle(self):
+        while True:
+            # Si falla queda en el spool y se reintenta en la próxima ventana.
+            try: self.enviar_pendientes()
+            except Exception: _log.exception("no salió el digesto; se reintenta en la próxima ventana")
+            if self._parar.wait(self.ventana_s): break
+        try: self.enviar_pendientes()
+        except Exception: _log.exception("no salió el digesto al detener; queda en el spool")
+
+
+def armar_digesto(config, pedidos):
+    msg = MIMEMultipart()
+    msg['From'] = config["remitente"]; msg['To'] = config["destinatario"]
+    msg['Subject'] = f"Pedidos PAGADOS ({len(pedidos)}) - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+    lineas = [f"{len(pedidos)} PEDIDOS CONFIRMADOS", "-----------------------"]
+    for meta, _ in pedidos:
+        lineas.append(f"{meta['fecha']}  {meta['cliente']}  WhatsApp: {meta['wpp']}  ID Pago MP: {meta['id_pago']}  ({meta['nombre_pdf']})")
+    msg.attach(MIMEText("\n".join(lineas), 'plain'))
+    for meta, pdf_bytes in pedidos:
+        part = MIMEBase('application', "octet-stream")
+        part.set_payload(pdf_bytes)
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f'attachment; filename="{meta["nombre_pdf"]}"')
+        msg.attach(part)
+    return msg
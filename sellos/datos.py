@@ -0,0 +1,12 @@
+import os
+
+# --- DIRECTORIO DE DATOS ---
+# Todo lo persistente (cola de pedidos, pagos, artefactos) vive acá. En contenedores
+# con FS de sólo lectura, apuntar SELLOS_DATOS_DIR a un volumen escribible.
+DIR_DATOS = os.environ.get("SELLOS_DATOS_DIR", "datos")
+
+
+def ruta_datos(*partes):
+    ruta = os.path.join(DIR_DATOS, *partes)
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    return ruta
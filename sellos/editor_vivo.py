@@ -0,0 +1,85 @@
+import base64
+import os
+import streamlit as st
+import streamlit.components.v1 as components
+from sellos.activos import existe
+from sellos.cache import CacheLRU
+from sellos.motor import (ALTO_REAL_MM, ANCHO_REAL_MM, FACTOR_PT_A_MM, SIZE_MAX, SIZE_MIN, TOLERANCIA_ALTO_MM,
+                          ajustar_tamano, autoajustar, get_font_metrics_mm)
+from sellos.pdf_fuentes import fuente_reducida
+
+# --- EDITOR EN VIVO (COMPONENTE) ---
+# Componente propio (HTML + JS sin build, en sellos/web/editor_vivo): las líneas se
+# editan y se dibujan en un canvas del navegador, sin ida y vuelta por tecla. El
+# servidor recibe el diseño con debounce y sólo mide/valida (ajustar_tamano); la
+# imagen definitiva se renderiza recién al confirmar. Cada fuente viaja una vez por
+# iframe (el TTF reducido de pdf_fuentes): el navegador informa en `tengo`
+# cuáles ya cargó y sólo se mandan las que faltan.
+_componente = components.declare_component("editor_vivo", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "web", "editor_vivo"))
+
+MAX_TEXTO = 60
+OFFSET_MAX = 10.0
+PASO_OFFSET = 0.5
+
+CACHE_FUENTES_WEB = CacheLRU(max_entradas=32, max_bytes=8 * 1024 * 1024, nombre="fuentes_web")
+CACHE_METRICAS = CacheLRU(max_entradas=8, nombre="metricas_web")
+
+
+def fuente_web(ruta):
+    return CACHE_FUENTES_WEB.obtener_o_crear(ruta, lambda: base64.b64encode(fuente_reducida(ruta)).decode(), peso=len)
+
+
+def metricas(catalogo):
+    # Por fuente: si hay archivo para mandar y el ascent en em (el mismo que usa el motor).
+    return CACHE_METRICAS.obtener_o_crear(tuple(catalogo.items()), lambda: _metricas(catalogo))
+
+
+def _metricas(catalogo):
+    size_ref = 20
+    return {nombre: {"indice": i, "archivo": existe(ruta),
+                     "ascent": round(get_font_metrics_mm(ruta, size_ref) / (size_ref * FACTOR_PT_A_MM), 4)}
+            for i, (nombre, ruta) in enumerate(catalogo.items())}
+
+
+def validar_lineas(valor, catalogo, cant):
+    # Lo que manda el navegador no es confiable: tipos, catálogo y rangos. None si no sirve.
+    try:
+        lineas = []
+        for l in list(valor["lineas"])[:cant]:
+            fuente = l["fuente"] if l["fuente"] in catalogo else next(iter(catalogo))
+            lineas.append({"texto": str(l["texto"])[:MAX_TEXTO], "fuente": fuente,
+                           "size": min(SIZE_MAX, max(SIZE_MIN, int(l["size"]))),
+                           "offset": min(OFFSET_MAX, max(-OFFSET_MAX, round(float(l["offset"]) / PASO_OFFSET) * PASO_OFFSET))})
+        return lineas if len(lineas) == cant else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def a_datos(lineas, catalogo, autoajuste=False):
+    # Validación autoritativa: mismo ajuste de ancho que el editor clásico, o el
+    # auto-ajuste conjunto (tamaños y offsets) si está activo.
+    if autoajuste:
+        datos = autoajustar([{"texto": l["texto"], "fuente": catalogo[l["fuente"]], "size": l["size"], "offset_y": l["offset"]} for l in lineas])
+        validado = [{**{k: l[k] for k in ("texto", "fuente", "size", "offset")}, "size_final": d["size"], "ajustado": d["size"] != l["size"],
+                     "offset_final": d["offset_y"]} for l, d in zip(lineas, datos)]
+        return datos, validado
+    datos, validado = [], []
+    for l in lineas:
+        ruta = catalogo[l["fuente"]]
+        size_final, ajustado = ajustar_tamano(l["texto"], ruta, l["size"])
+        datos.append({"texto": l["texto"], "fuente": ruta, "size": size_final, "offset_y": l["offset"]})
+        validado.append({**{k: l[k] for k in ("texto", "fuente", "size")}, "size_final": size_final, "ajustado": ajustado})
+    return datos, validado
+
+
+def editor_vivo(lineas, catalogo, key, validado=None, mostrar_guias=False, deshabilitado=False, on_change=None, args=None):
+    # `lineas`: [{texto, fuente (nombre del catálogo), size, offset}] para iniciar el iframe.
+    previo = st.session_state.get(key) or {}
+    tengo = set(previo.get("tengo") or [])
+    faltan = {l["fuente"] for l in lineas} - tengo
+    fuentes = {n: fuente_web(catalogo[n]) for n in sorted(faltan) if existe(catalogo[n])}
+    medidas = {"ancho_mm": ANCHO_REAL_MM, "alto_mm": ALTO_REAL_MM, "factor": FACTOR_PT_A_MM, "tolerancia_mm": TOLERANCIA_ALTO_MM,
+               "size_min": SIZE_MIN, "size_max": SIZE_MAX, "offset_max": OFFSET_MAX, "paso_offset": PASO_OFFSET, "max_texto": MAX_TEXTO}
+    return _componente(lineas=lineas, catalogo=list(catalogo), metricas=metricas(catalogo), medidas=medidas, fuentes=fuentes,
+                       validado=validado or [], mostrar_guias=bool(mostrar_guias), deshabilitado=bool(deshabilitado), key=key, default=None,
+                       on_change=on_change, args=args)
@@ -0,0 +1,51 @@
+from PIL import ImageFont
+from sellos.activos import lector, mapa
+from sellos.cache import CacheLRU
+from sellos.telemetria import tramo
+
+# --- CACHE DE FUENTES ---
+# Un FreeTypeFont por (ruta, tamaño en px), compartido por todas las sesiones del
+# proceso. Evita releer y reparsear el TTF en cada rerun y en cada línea.
+# Pillow usa los objetos FreeType bajo el GIL, así que compartirlos entre hilos es seguro.
+# Los TTF salen del almacén de activos (mmap compartido), no del disco.
+RUTA_FUENTE_COTA = "assets/fonts/Roboto-Regular.ttf"
+CLAVE_DEFAULT = ("__default__", 0)
+
+CACHE_FUENTES = CacheLRU(max_entradas=256, max_bytes=64 * 1024 * 1024, nombre="fuentes")
+
+
+def _peso_fuente(ruta):
+    # Estimación: FreeType mantiene en memoria tablas del orden del tamaño del archivo.
+    datos = mapa(ruta)
+    return len(datos) if datos is not None else 0
+
+
+def fuente_default():
+    return CACHE_FUENTES.obtener_o_crear(CLAVE_DEFAULT, ImageFont.load_default)
+
+
+def _cargar_truetype(ruta, size_px):
+    clave = (ruta, int(size_px))
+    fuente = CACHE_FUENTES.get(clave)
+    if fuente is not None: return fuente
+    # Los fallos también se cachean (False) para no reintentar el archivo en cada rerun.
+    try:
+        with tramo("fuente.carga"): fuente = ImageFont.truetype(lector(ruta) or ruta, int(size_px))
+    except Exception: fuente = False
+    CACHE_FUENTES.put(clave, fuente, _peso_fuente(ruta) if fuente else 0)
+    return fuente
+
+
+def cargar_fuente(ruta, size_px):
+    # Misma semántica que antes: "Arial" o cualquier error -> load_default().
+    if ruta == "Arial": return fuente_default()
+    return _cargar_truetype(ruta, size_px) or fuente_default()
+
+
+def cargar_fuente_cota(size_px, respaldo):
+    # Fuente de las etiquetas de las guías técnicas; si falta, se usa la de la línea.
+    return _cargar_truetype(RUTA_FUENTE_COTA, size_px) or respaldo
+
+
+def estadisticas_fuentes():
+    return CACHE_FUENTES.estadisticas()
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import time
+from fpdf import FPDF
+from sellos.motor import ANCHO_REAL_MM, ALTO_REAL_MM, dibujar_vectorial, entra_en_alto, fuentes_sin_contorno
+from sellos.pdf_fuentes import registrar_fuentes_pdf
+
+# --- PLIEGOS DE PRODUCCIÓN ---
+# Muchos sellos por hoja (A4 o la cama del grabador) en grilla, con marcas de corte
+# y el id de cada sello debajo. Usa el mismo layout vectorial que la pág. 1 del PDF
+# híbrido: contornos sin fuentes embebidas, o con contornos=False (--texto) texto con
+# cada fuente registrada una sola vez por archivo, bastante más liviano cuando el lote
+# es grande y el texto entra en latin-1. Cada archivo se escribe a disco al completar
+# `hojas_por_archivo` hojas: la memoria no crece con el tamaño del lote.
+FORMATOS_HOJA = {"a4": (210, 297), "a4-apaisada": (297, 210)}
+MARGEN_MM = 10
+SEPARACION_MM = 6
+HOJAS_POR_ARCHIVO = 20
+MARCA_DIST_MM = 1         # distancia de la marca de corte al borde del sello
+GROSOR_MARCA_MM = 0.1
+SIZE_ETIQUETA_PT = 4
+
+
+def medidas_hoja(hoja):
+    # "a4", "a4-apaisada" o "<ancho>x<alto>" en mm (p. ej. la cama del grabador: "300x200").
+    if hoja in FORMATOS_HOJA: return FORMATOS_HOJA[hoja]
+    ancho, alto = hoja.lower().split("x")
+    return float(ancho), float(alto)
+
+
+def grilla(ancho_hoja, alto_hoja, margen=MARGEN_MM, separacion=SEPARACION_MM):
+    # Esquinas superiores izquierdas de cada sello, grilla centrada en la hoja.
+    paso_x, paso_y = ANCHO_REAL_MM + separacion, ALTO_REAL_MM + separacion
+    cols = int((ancho_hoja - 2 * margen + separacion) // paso_x)
+    filas = int((alto_hoja - 2 * margen + separacion) // paso_y)
+    if cols < 1 or filas < 1: raise ValueError(f"no entra ningún sello en una hoja de {ancho_hoja}x{alto_hoja} mm")
+    x0 = (ancho_hoja - (cols * paso_x - separacion)) / 2
+    y0 = (alto_hoja - (filas * paso_y - separacion)) / 2
+    return [(x0 + c * paso_x, y0 + f * paso_y) for f in range(filas) for c in range(cols)]
+
+
+def marcas_de_corte(pdf, x, y, separacion):
+    largo = max(0.5, separacion / 2 - MARCA_DIST_MM - 0.5)
+    d = MARCA_DIST_MM
+    for cx in (x, x + ANCHO_REAL_MM):
+        pdf.line(cx, y - d - largo, cx, y - d); pdf.line(cx, y + ALTO_REAL_MM + d, cx, y + ALTO_REAL_MM + d + largo)
+    for cy in (y, y + ALTO_REAL_MM):
+        pdf.line(x - d - largo, cy, x - d, cy); pdf.line(x + ANCHO_REAL_MM + d, cy, x + ANCHO_REAL_MM + d + largo, cy)
+
+
+class Pliegos:
+    def __init__(self, dir_salida, hoja="a4", margen=MARGEN_MM, separacion=SEPARACION_MM,
+                 hojas_por_archivo=HOJAS_POR_ARCHIVO, prefijo="pliego", contornos=True):
+        self.dir_salida = dir_salida
+        self.formato = medidas_hoja(hoja)
+        self.separacion = separacion
+        self.posiciones = grilla(*self.formato, margen, separacion)
+        self.hojas_por_archivo = hojas_por_archivo
+        self.prefijo = prefijo
+        self.contornos = contornos
+        self.archivos = []    # [(ruta, sellos)]
+        self._pdf = None
+        self._font_map = {}
+        self._lugar = 0       # próxima posición libre en la hoja actual
+        self._sellos = 0
+        os.makedirs(dir_salida, exist_ok=True)
+
+    def _nueva_hoja(self):
+        if self._pdf is not None and self._pdf.page >= self.hojas_por_archivo: self._cerrar_archivo()
+        if self._pdf is None:
+            self._pdf = FPDF(orientation='P', unit='mm', format=self.formato)
+            self._pdf.set_margins(0, 0, 0); self._pdf.set_auto_page_break(False, margin=0)
+            self._pdf.set_compression(True)
+            self._font_map = {}; self._sellos = 0
+        self._pdf.add_page()
+        self._pdf.set_line_width(GROSOR_MARCA_MM)
+        self._lugar = 0
+
+    def _cerrar_archivo(self):
+        ruta = os.path.join(self.dir_salida, f"{self.prefijo}_{len(self.archivos) + 1:03d}.pdf")
+        self._pdf.output(ruta)
+        self.archivos.append((ruta, self._sellos))
+        self._pdf = None
+
+    def agregar(self, datos_lineas, etiqueta=""):
+        if self._pdf is None or self._lugar >= len(self.posiciones): self._nueva_hoja()
+        pdf = self._pdf
+        x, y = self.posiciones[self._lugar]
+        registrar_fuentes_pdf(pdf, fuentes_sin_contorno(datos_lineas, self.contornos), self._font_map)
+        dibujar_vectorial(pdf, datos_lineas, self._font_map, x, y, self.contornos)
+        marcas_de_corte(pdf, x, y, self.separacion)
+        if etiqueta and self.separacion >= 4:
+            pdf.set_font("Helvetica", size=SIZE_ETIQUETA_PT)
+            txt = etiqueta.encode('latin-1', 'replace').decode('latin-1')
+            while txt and pdf.get_string_width(txt) > ANCHO_REAL_MM - 2 * MARCA_DIST_MM: txt = txt[:-1]
+            pdf.text(x + (ANCHO_REAL_MM - pdf.get_string_width(txt)) / 2, y + ALTO_REAL_MM + self.separacion / 2 + 0.6, txt)
+        self._lugar += 1; self._sellos += 1
+
+    def cerrar(self):
+        if self._pdf is not None: self._cerrar_archivo()
+        return self.archivos
+
+
+def imponer(disenos, dir_salida, **opciones):
+    # disenos: iterable de (etiqueta, datos_lineas); se consume de a uno.
+    pliegos = Pliegos(dir_salida, **opciones)
+    for etiqueta, datos in disenos: pliegos.agregar(datos, etiqueta)
+    return pliegos.cerrar()
+
+
+if __name__ == "__main__":
+    import argparse
+    from sellos.lote import RAIZ, leer_specs, diseno_desde_spec
+    parser = argparse.ArgumentParser(prog="python -m sellos.imposicion", description="Pliegos de sellos desde JSONL (formato de sellos.lote)")
+    parser.add_argument("specs", help="archivo JSONL, un diseño por línea")
+    parser.add_argument("-o", "--salida", default="pliegos", help="carpeta de salida")
+    parser.add_argument("--hoja", default="a4", help="a4, a4-apaisada o <ancho>x<alto> en mm")
+    parser.add_argument("--margen", type=float, default=MARGEN_MM)
+    parser.add_argument("--separacion", type=float, default=SEPARACION_MM)
+    parser.add_argument("--hojas-por-archivo", type=int, default=HOJAS_POR_ARCHIVO)
+    parser.add_argument("--texto", action="store_true", help="texto con fuentes embebidas en vez de contornos (archivos más chicos)")
+    args = parser.parse_args()
+    ruta_specs, dir_salida = os.path.abspath(args.specs), os.path.abspath(args.salida)
+    os.chdir(RAIZ)
+    fallidos = []
+
+    def disenos():
+        for n, linea in leer_specs(ruta_specs):
+            try:
+                spec = json.loads(linea)
+                datos = diseno_desde_spec(spec)
+                if not entra_en_alto(datos): raise ValueError("excede la altura del sello")
+            except Exception as e:
+                fallidos.append(n); print(f"línea {n}: {type(e).__name__}: {e}", file=sys.stderr); continue
+            yield str(spec.get("id") or f"sello-{n:06d}"), datos
+
+    t0 = time.perf_counter()
+    archivos = imponer(disenos(), dir_salida, hoja=args.hoja, margen=args.margen, separacion=args.separacion,
+                       hojas_por_archivo=args.hojas_por_archivo, contornos=not args.texto)
+    segundos = time.perf_counter() - t0
+    total = sum(n for _, n in archivos)
+    for ruta, n in archivos: print(f"{ruta}: {n} sellos")
+    print(f"{total} sellos en {len(archivos)} archivos, {segundos:.2f} s ({total / segundos if segundos else 0:.0f} sellos/s)")
+    sys.exit(1 if fallidos else 0)
@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# --- RENDER POR LOTES ---
+# Genera PDFs/PNGs/SVGs desde un JSONL de diseños, sin Streamlit, repartiendo los sellos
+# entre procesos (uno por núcleo). Una línea por sello:
+#   {"id": "acme-001", "cliente": "ACME", "guias": false,
+#    "lineas": [{"texto": "Juan Pérez", "fuente": "Aleo Regular", "size": 13, "offset": -1.0}, ...]}
+# "fuente" es un nombre del catálogo o una ruta; el tamaño se ajusta al ancho igual
+# que en el editor. Uso: python -m sellos.lote pedidos.jsonl -o salida/ [--formato pdf,png,svg,master]
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def leer_specs(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        for n, linea in enumerate(f, 1):
+            if linea.strip(): yield n, linea
+
+
+def diseno_desde_spec(spec):
+    from sellos.motor import resolver_fuente, ajustar_tamano
+    datos = []
+    for l in spec["lineas"]:
+        ruta = resolver_fuente(l.get("fuente", "Arial"))
+        size, _ = ajustar_tamano(l["texto"], ruta, l.get("size", 9))
+        datos.append({"texto": l["texto"], "fuente": ruta, "size": size, "offset_y": float(l.get("offset", l.get("offset_y", 0.0)))})
+    return datos
+
+
+def _nombre_archivo(spec, n):
+    return re.sub(r"[^\w.-]+", "_", str(spec.get("id") or f"sello-{n:06d}"))
+
+
+def _iniciar_trabajador():
+    # Las rutas de fuentes e índice son relativas a la raíz del repo.
+    os.chdir(RAIZ)
+
+
+def renderizar_spec(args):
+    n, linea, dir_salida, formatos, scale_png, dpi = args
+    from sellos.bandas import escala_dpi, escribir_pdf, escribir_png
+    from sellos.motor import entra_en_alto, generar_pdf_hibrido, generar_svg
+    try:
+        spec = json.loads(linea)
+        datos = diseno_desde_spec(spec)
+        if not entra_en_alto(datos): raise ValueError("excede la altura del sello")
+        base = os.path.join(dir_salida, _nombre_archivo(spec, n))
+        if "pdf" in formatos:
+            pdf, _ = generar_pdf_hibrido(datos, spec.get("cliente", "Lote"), incluir_guias_hd=bool(spec.get("guias")))
+            with open(base + ".pdf", "wb") as f: f.write(pdf)
+        # PNG y master por franjas: la memoria no depende de la resolución. Un hilo por
+        # proceso, el paralelismo ya lo da el pool de procesos.
+        if "png" in formatos:
+            with open(base + ".png", "wb") as f: escribir_png(f, datos, scale_png, "L", hilos=1)
+        if "master" in formatos:
+            with open(base + ".master.pdf", "wb") as f: escribir_pdf(f, datos, escala_dpi(dpi), "1", hilos=1)
+        if "svg" in formatos:
+            with open(base + ".svg", "w", encoding="utf-8") as f: f.write(generar_svg(datos))
+        return n, None
+    except Exception as e:
+        return n, f"{type(e).__name__}: {e}"
+
+
+def procesar_lote(ruta_specs, dir_salida, formatos=("pdf",), procesos=None, scale_png=None, dpi=None):
+    from sellos.activos import precargar
+    from sellos.bandas import DPI_MASTER
+    from sellos.motor import CATALOGO_FUENTES, SCALE_HD
+    ruta_specs, dir_salida = os.path.abspath(ruta_specs), os.path.abspath(dir_salida)
+    os.makedirs(dir_salida, exist_ok=True)
+    procesos = procesos or os.cpu_count() or 1
+    trabajos = [(n, linea, dir_salida, tuple(formatos), scale_png or SCALE_HD, dpi or DPI_MASTER) for n, linea in leer_specs(ruta_specs)]
+    fallidos = []
+    # Fuentes mapeadas antes del fork: los procesos del pool heredan los mapas. Sólo desde
+    # la raíz, que es donde las rutas relativas del catálogo resuelven en los trabajadores.
+    if os.path.realpath(os.getcwd()) == os.path.realpath(RAIZ): precargar(CATALOGO_FUENTES.values())
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador) as ejecutor:
+        # Bloques grandes: menos ida y vuelta entre procesos; las cachés de cada proceso se reutilizan.
+        bloque = max(1, len(trabajos) // (procesos * 8))
+        for n, error in ejecutor.map(renderizar_spec, trabajos, chunksize=bloque):
+            if error: fallidos.append((n, error))
+    segundos = time.perf_counter() - t0
+    return {"sellos": len(trabajos), "fallidos": fallidos, "segundos": segundos, "procesos": procesos,
+            "sellos_por_s": (len(trabajos) - len(fallidos)) / segundos if segundos else 0.0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m sellos.lote", description="Render de sellos por lotes desde JSONL")
+    parser.add_argument("specs", help="archivo JSONL, un diseño por línea")
+    parser.add_argument("-o", "--salida", default="salida_lote", help="carpeta de salida")
+    parser.add_argument("--formato", default="pdf", help="pdf, png, svg y/o master (PDF 1 bit a --dpi) separados por coma")
+    parser.add_argument("-j", "--procesos", type=int, default=None, help="procesos (por defecto, uno por núcleo)")
+    parser.add_argument("--scale-png", type=int, default=None, help="px por mm del PNG (por defecto, SCALE_HD)")
+    parser.add_argument("--dpi", type=int, default=None, help="resolución del master (por defecto, DPI_MASTER)")
+    args = parser.parse_args()
+    formatos = [f.strip() for f in args.formato.split(",") if f.strip()]
+    if not formatos or set(formatos) - {"pdf", "png", "svg", "master"}: parser.error("--formato admite pdf, png, svg y/o master")
+    r = procesar_lote(args.specs, args.salida, formatos, args.procesos, args.scale_png, args.dpi)
+    for n, error in r["fallidos"]: print(f"línea {n}: {error}", file=sys.stderr)
+    print(f"{r['sellos'] - len(r['fallidos'])}/{r['sellos']} sellos en {r['segundos']:.2f} s  "
+          f"({r['sellos_por_s']:.1f} sellos/s, {r['procesos']} procesos)")
+    sys.exit(1 if r["fallidos"] else 0)
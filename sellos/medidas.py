@@ -0,0 +1,279 @@
+import array
+import glob
+import json
+import os
+import sys
+import threading
+from sellos.cache import CacheLRU
+
+# --- ÍNDICE DE MEDIDAS DE FUENTES ---
+# Tablas precalculadas (offline, con fontTools) de avances por codepoint en unidades
+# de fuente, pares de kerning, ascent/descent y bbox de tinta. Medir un texto pasa a
+# ser una búsqueda en tabla + suma, sin FreeType en el camino de cada tecla.
+#
+# Regenerar:  python -m sellos.medidas construir
+# Verificar:  python -m sellos.medidas verificar   (compara contra Pillow)
+RUTA_INDICE = "assets/medidas_fuentes.json"
+LIMITE_TABLA = 0x250  # Latin-1 + Latin Extended-A/B: tabla densa; el resto va a un dict
+LIMITE_KERNING = 0x100  # pares de kerning sólo dentro de Latin-1 (el alfabeto de los sellos)
+TOLERANCIA_MM = 0.05
+
+# Tamaños en px con los que se valida el ancho (8..26 pt a escala 10, FACTOR_PT_A_MM=0.3527).
+# Para fuentes sin hinting propio FreeType usa el autohinter, que mueve los avances:
+# ahí guardamos los avances ya hinteados tal como los devuelve Pillow.
+TAMANOS_PX_MEDICION = sorted({int(pt * 0.3527 * 10) for pt in range(8, 27)})
+
+# Pillow sólo aplica kerning GPOS con el layout RAQM; con BASIC no hay kerning.
+try:
+    from PIL import features as _features
+    KERNING_PILLOW = bool(_features.check("raqm"))
+except Exception:
+    KERNING_PILLOW = False
+
+_indice = None
+_lock_indice = threading.Lock()
+CACHE_TABLAS = CacheLRU(max_entradas=512, max_bytes=32 * 1024 * 1024, nombre="tablas_avance")
+
+
+class MedidasFuente:
+    def __init__(self, ruta, datos):
+        self.ruta = ruta
+        self.upem = datos["upem"]
+        self.ascender = datos["ascender"]
+        self.descender = datos["descender"]
+        self.bbox = tuple(datos["bbox"])
+        self.notdef = datos["notdef"]
+        self.avances = dict(zip(datos["codepoints"], datos["avances"]))
+        self.kerning = {(a, b): v for a, b, v in datos.get("kerning", [])}
+        # Sólo en fuentes autohinteadas: avances en px ya hinteados, por tamaño.
+        self.avances_px = {int(px): dict(zip(datos["codepoints"], avs)) for px, avs in datos.get("avances_px", {}).items()}
+        self.notdef_px = {int(px): v for px, v in datos.get("notdef_px", {}).items()}
+
+    # Aritmética 26.6 de FreeType (FT_DivFix / FT_MulFix / FT_PIX_ROUND) para que el
+    # resultado coincida con lo que devuelve Pillow al pixel.
+    def _escala_x(self, size_px):
+        return ((size_px * 64 << 16) + self.upem // 2) // self.upem
+
+    def _a_26_6(self, unidades, escala):
+        return (unidades * escala + 0x8000) >> 16
+
+    def tabla(self, size_px):
+        clave = (self.ruta, size_px)
+        tabla = CACHE_TABLAS.get(clave)
+        if tabla is None:
+            tabla = self._construir_tabla(size_px)
+            CACHE_TABLAS.put(clave, tabla, tabla[0].itemsize * len(tabla[0]) + 64 * len(tabla[1]))
+        return tabla
+
+    def cubre(self, size_px):
+        # Autohinteada fuera de los tamaños guardados: la cuenta 26.6 sin hinting se va
+        # hasta ~0,5 mm de lo que mide Pillow, así que ese tamaño lo mide Pillow.
+        return not self.avances_px or size_px in self.avances_px
+
+    def _construir_tabla(self, size_px):
+        hinteados = self.avances_px.get(size_px)
+        if hinteados is not None:
+            avances = {cp: v * 64 for cp, v in hinteados.items()}
+            notdef = self.notdef_px.get(size_px, 0) * 64
+        else:
+            escala = self._escala_x(size_px)
+            a_px = lambda u: (self._a_26_6(u, escala) + 32) & ~63
+            avances = {cp: a_px(u) for cp, u in self.avances.items()}
+            notdef = a_px(self.notdef)
+        densa = array.array("l", [notdef]) * LIMITE_TABLA
+        resto = {}
+        for cp, v in avances.items():
+            if cp < LIMITE_TABLA: densa[cp] = v
+            else: resto[cp] = v
+        return densa, resto, notdef
+
+    def ancho_px(self, texto, size_px, kerning=KERNING_PILLOW):
+        densa, resto, notdef = self.tabla(size_px)
+        cps = [ord(c) for c in texto]
+        if max(cps, default=0) < LIMITE_TABLA:
+            total = sum(map(densa.__getitem__, cps))
+        else:
+            total = sum(densa[cp] if cp < LIMITE_TABLA else resto.get(cp, notdef) for cp in cps)
+        if kerning and self.kerning:
+            escala = self._escala_x(size_px)
+            total += sum(self._a_26_6(self.kerning.get(par, 0), escala) for par in zip(cps, cps[1:]))
+        return total / 64
+
+    def ascent_px(self, size_px):
+        escala_y = ((size_px * 64 << 16) + self.upem // 2) // self.upem
+        return (self._a_26_6(self.ascender, escala_y) + 63) >> 6
+
+    def descent_px(self, size_px):
+        escala_y = ((size_px * 64 << 16) + self.upem // 2) // self.upem
+        return (self._a_26_6(-self.descender, escala_y) + 63) >> 6
+
+
+def _cargar_indice(ruta_indice):
+    try:
+        with open(ruta_indice, encoding="utf-8") as f: crudo = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    fuentes = {}
+    for ruta, datos in crudo.get("fuentes", {}).items():
+        # Si el TTF cambió desde que se construyó el índice, se ignora su entrada.
+        try:
+            if os.path.getsize(ruta) != datos["bytes"]: continue
+        except OSError:
+            continue
+        fuentes[ruta] = MedidasFuente(ruta, datos)
+    return fuentes
+
+
+def indice():
+    global _indice
+    if _indice is None:
+        with _lock_indice:
+            if _indice is None: _indice = _cargar_indice(RUTA_INDICE)
+    return _indice
+
+
+def medidas_de(ruta):
+    return indice().get(ruta)
+
+
+# --- API DE MEDICIÓN (None = fuente fuera del índice, usar Pillow) ---
+def medir_ancho_px(texto, ruta, size_px):
+    medidas, size_px = medidas_de(ruta), int(size_px)
+    return None if medidas is None or not medidas.cubre(size_px) else medidas.ancho_px(texto, size_px)
+
+
+def medir_ascent_px(ruta, size_px):
+    medidas = medidas_de(ruta)
+    return None if medidas is None else medidas.ascent_px(int(size_px))
+
+
+# --- CONSTRUCCIÓN OFFLINE (requiere fontTools, que ya trae fpdf2) ---
+def _ascender_freetype(ttf):
+    # Mismo orden que FreeType: hhea, y si está vacío OS/2 typo y luego win.
+    hhea = ttf["hhea"]
+    if hhea.ascent or hhea.descent: return hhea.ascent, hhea.descent
+    os2 = ttf["OS/2"] if "OS/2" in ttf else None
+    if os2 is not None and (os2.sTypoAscender or os2.sTypoDescender): return os2.sTypoAscender, os2.sTypoDescender
+    if os2 is not None: return os2.usWinAscent, -os2.usWinDescent
+    return ttf["head"].yMax, ttf["head"].yMin
+
+
+def _pares_kerning(ttf, glifo_a_cps):
+    pares = {}
+    if "GPOS" not in ttf or ttf["GPOS"].table.LookupList is None: return pares
+    gpos = ttf["GPOS"].table
+    indices = set()
+    for rec in gpos.FeatureList.FeatureRecord if gpos.FeatureList else []:
+        if rec.FeatureTag == "kern": indices.update(rec.Feature.LookupListIndex)
+    for idx in sorted(indices):
+        lookup = gpos.LookupList.Lookup[idx]
+        vistos = set()  # dentro de un lookup gana el primer subtable que matchea
+        for sub in lookup.SubTable:
+            if lookup.LookupType == 9: sub = sub.ExtSubTable
+            if getattr(sub, "LookupType", 2) != 2: continue
+            for g1, g2, valor in _iterar_pairpos(sub, glifo_a_cps):
+                if (g1, g2) in vistos: continue
+                vistos.add((g1, g2))
+                if not valor: continue
+                for a in glifo_a_cps[g1]:
+                    for b in glifo_a_cps[g2]:
+                        pares[(a, b)] = pares.get((a, b), 0) + valor
+    return pares
+
+
+def _iterar_pairpos(sub, glifo_a_cps):
+    primeros = [g for g in sub.Coverage.glyphs if g in glifo_a_cps]
+    if sub.Format == 1:
+        for g1, pset in zip(sub.Coverage.glyphs, sub.PairSet):
+            if g1 not in glifo_a_cps: continue
+            for rec in pset.PairValueRecord:
+                if rec.SecondGlyph in glifo_a_cps:
+                    yield g1, rec.SecondGlyph, getattr(rec.Value1, "XAdvance", 0) if rec.Value1 else 0
+    elif sub.Format == 2:
+        clases1 = sub.ClassDef1.classDefs if sub.ClassDef1 else {}
+        clases2 = sub.ClassDef2.classDefs if sub.ClassDef2 else {}
+        segundos = [g for g in glifo_a_cps]
+        for g1 in primeros:
+            c1 = clases1.get(g1, 0)
+            fila = sub.Class1Record[c1].Class2Record
+            for g2 in segundos:
+                rec = fila[clases2.get(g2, 0)]
+                yield g1, g2, getattr(rec.Value1, "XAdvance", 0) if rec.Value1 else 0
+
+
+def _avances_hinteados(ruta, cps):
+    from PIL import ImageFont
+    avances_px, notdef_px = {}, {}
+    for px in TAMANOS_PX_MEDICION:
+        fuente = ImageFont.truetype(ruta, px)
+        avances_px[str(px)] = [round(fuente.getlength(chr(cp))) for cp in cps]
+        notdef_px[str(px)] = round(fuente.getlength("\uffff"))  # U+FFFF nunca está mapeado
+    return avances_px, notdef_px
+
+
+def construir_entrada(ruta):
+    from fontTools.ttLib import TTFont
+    ttf = TTFont(ruta, lazy=True)
+    cmap = ttf.getBestCmap()
+    hmtx = ttf["hmtx"].metrics
+    cps = sorted(cmap)
+    glifo_a_cps = {}
+    for cp in cps:
+        if cp < LIMITE_KERNING: glifo_a_cps.setdefault(cmap[cp], []).append(cp)
+    ascender, descender = _ascender_freetype(ttf)
+    head = ttf["head"]
+    entrada = {
+        "bytes": os.path.getsize(ruta),
+        "upem": head.unitsPerEm,
+        "ascender": ascender, "descender": descender,
+        "bbox": [head.xMin, head.yMin, head.xMax, head.yMax],
+        "notdef": hmtx[ttf.getGlyphOrder()[0]][0],
+        "codepoints": cps,
+        "avances": [hmtx[cmap[cp]][0] for cp in cps],
+        "kerning": sorted([a, b, v] for (a, b), v in _pares_kerning(ttf, glifo_a_cps).items() if v),
+    }
+    if "glyf" in ttf and "fpgm" not in ttf:
+        entrada["avances_px"], entrada["notdef_px"] = _avances_hinteados(ruta, cps)
+    return entrada
+
+
+def construir_indice(rutas=None, salida=RUTA_INDICE):
+    rutas = rutas or sorted(glob.glob("assets/fonts/*.ttf"))
+    fuentes = {}
+    for ruta in rutas:
+        fuentes[ruta] = construir_entrada(ruta)
+        print(f"{ruta}: {len(fuentes[ruta]['codepoints'])} glifos, {len(fuentes[ruta]['kerning'])} pares de kerning")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "fuentes": fuentes}, f, separators=(",", ":"))
+    return fuentes
+
+
+# --- VERIFICACIÓN CONTRA PILLOW ---
+TEXTOS_VERIFICACION = [
+    "Juan Pérez Pardo", "MÉDICO CLÍNICO", "Matrícula N° 20408978", "DISEÑADOR GRÁFICO",
+    "Abogada · Estudio Jurídico", "¿Qué selló? ¡Listo!", "ÁÉÍÓÚ áéíóú Ññ Üü ç", "0123456789 @ # & / -",
+]
+
+
+def verificar(tolerancia_mm=TOLERANCIA_MM):
+    # Anchos a escala 10 (calcular_ancho_texto_mm) y ascent a escala 100 (get_font_metrics_mm).
+    from PIL import ImageFont
+    peor_ancho = peor_ascent = 0.0
+    for ruta, medidas in sorted(indice().items()):
+        for pt in range(8, 27):
+            px = int(pt * 0.3527 * 10)
+            fuente = ImageFont.truetype(ruta, px)
+            for txt in TEXTOS_VERIFICACION:
+                peor_ancho = max(peor_ancho, abs(medidas.ancho_px(txt, px) - fuente.getlength(txt)) / 10)
+            px = int(pt * 0.3527 * 100)
+            fuente = ImageFont.truetype(ruta, px)
+            peor_ascent = max(peor_ascent, abs(medidas.ascent_px(px) - fuente.getmetrics()[0]) / 100)
+    print(f"fuentes: {len(indice())}  error máx. ancho: {peor_ancho:.3f} mm  ascent: {peor_ascent:.3f} mm  (tolerancia {tolerancia_mm} mm)")
+    return peor_ancho <= tolerancia_mm and peor_ascent <= tolerancia_mm
+
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "verificar"
+    if comando == "construir": construir_indice(sys.argv[2:] or None)
+    elif comando == "verificar": sys.exit(0 if verificar() else 1)
+    else: sys.exit("uso: python -m sellos.medidas [construir|verificar]")
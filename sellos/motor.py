@@ -0,0 +1,277 @@
+from datetime import datetime
+from html import escape
+from PIL import Image, ImageColor, ImageDraw
+from sellos.activos import existe
+from sellos.cache import CacheLRU
+from sellos.medidas import medir_ancho_px, medir_ascent_px
+from sellos.pdf_fuentes import registrar_fuentes_pdf
+from sellos.capas import ancho_texto_px, pegar_texto
+from sellos.fuentes import cargar_fuente, cargar_fuente_cota
+from sellos.telemetria import medido, tramo
+
+# --- MOTOR DE SELLOS ---
+# Layout, medición, render y PDF sin Streamlit: lo usan los dos editores y el
+# render por lotes (`python -m sellos.lote`). Un diseño es una lista de líneas
+# {"texto", "fuente" (ruta), "size" (pt), "offset_y" (mm)}.
+# fpdf2 (que arrastra numpy) y fontTools se importan recién al generar el primer PDF
+# o SVG: la mayoría de las sesiones sólo diseña, y así el arranque no los paga.
+
+# --- CONSTANTES ---
+FACTOR_PT_A_MM = 0.3527
+ANCHO_REAL_MM = 36
+ALTO_REAL_MM = 15
+SCALE_PREVIEW = 20
+SCALE_HD = 80
+SIZE_MIN, SIZE_MAX = 8, 26
+TOLERANCIA_ALTO_MM = 1.0
+
+# Catálogo completo (nombre visible -> ruta); cada editor muestra su propio subconjunto.
+CATALOGO_FUENTES = {
+    "Aleo Regular": "assets/fonts/Aleo-Regular.ttf",
+    "Aleo Italic": "assets/fonts/Aleo-Italic.ttf",
+    "Amaze (Manuscrita)": "assets/fonts/amaze.ttf",
+    "Great Vibes": "assets/fonts/GreatVibes-Regular.ttf",
+    "Montserrat Regular": "assets/fonts/Montserrat-Regular.ttf",
+    "Montserrat SemiBold": "assets/fonts/Montserrat-SemiBold.ttf",
+    "Mukta Mahee": "assets/fonts/MuktaMahee-Regular.ttf",
+    "Mukta Mahee SemiBold": "assets/fonts/MuktaMahee-SemiBold.ttf",
+    "Playwrite": "assets/fonts/Playwrite-Regular.ttf",
+    "Roboto Regular": "assets/fonts/Roboto-Regular.ttf",
+    "Roboto Medium": "assets/fonts/Roboto-Medium.ttf",
+    "Arial (Sistema)": "Arial"
+}
+
+
+def resolver_fuente(nombre):
+    # Acepta el nombre del catálogo o directamente una ruta.
+    return CATALOGO_FUENTES.get(nombre, nombre)
+
+
+# --- MEDICIÓN ---
+def calcular_ancho_texto_mm(texto, ruta_fuente, size_pt):
+    if not texto: return 0
+    scale_measure = 10
+    size_px = int(size_pt * FACTOR_PT_A_MM * scale_measure)
+    width_px = medir_ancho_px(texto, ruta_fuente, size_px)
+    if width_px is None:
+        font = cargar_fuente(ruta_fuente, size_px)
+        width_px = font.getlength(texto)
+    return width_px / scale_measure
+
+def get_font_metrics_mm(ruta_fuente, size_pt):
+    try:
+        scale = 100
+        size_px = int(size_pt * FACTOR_PT_A_MM * scale)
+        if not existe(ruta_fuente):
+            ascent = size_px * 0.8
+        else:
+            ascent = medir_ascent_px(ruta_fuente, size_px)
+            if ascent is None:
+                font = cargar_fuente(ruta_fuente, size_px)
+                ascent, descent = font.getmetrics()
+        return ascent / scale
+    except:
+        return (size_pt * FACTOR_PT_A_MM) * 0.78
+
+
+# --- LAYOUT ---
+def ajustar_tamano(texto, ruta_fuente, size_pt):
+    # Si la línea no entra a lo ancho se achica (mínimo SIZE_MIN). Devuelve (size, ajustado).
+    ancho_mm = calcular_ancho_texto_mm(texto, ruta_fuente, size_pt)
+    if ancho_mm <= ANCHO_REAL_MM: return size_pt, False
+    return max(SIZE_MIN, int((size_pt * (ANCHO_REAL_MM / ancho_mm)) - 0.5)), True
+
+def altura_total_mm(datos_lineas):
+    return sum([d['size'] * FACTOR_PT_A_MM for d in datos_lineas])
+
+def entra_en_alto(datos_lineas):
+    return (ALTO_REAL_MM - altura_total_mm(datos_lineas)) >= -TOLERANCIA_ALTO_MM
+
+
+# --- AUTO-AJUSTE ---
+# Tamaños y offsets de todas las líneas resueltos juntos, con las medidas en tabla (sin
+# FreeType): cada línea toma el mayor tamaño entero que entra a lo ancho, después se
+# busca (bisección) el mayor factor común que hace entrar el bloque a lo alto (se
+# conserva la jerarquía entre líneas), el alto que sobra vuelve de a 1 pt a las líneas
+# más achicadas, y los offsets se acotan para que ninguna línea quede fuera del sello.
+# El tope de ancho de cada línea queda cacheado: al tipear sólo se mide la línea tocada.
+CACHE_TOPES = CacheLRU(max_entradas=4096, nombre="topes_ancho")
+
+def tope_ancho(texto, ruta_fuente, size_pt, ancho_mm=ANCHO_REAL_MM):
+    # Mayor tamaño entero <= size_pt que entra a lo ancho (SIZE_MIN si ni así entra).
+    return CACHE_TOPES.obtener_o_crear((texto, ruta_fuente, size_pt, ancho_mm), lambda: _tope_ancho(texto, ruta_fuente, size_pt, ancho_mm))
+
+def _tope_ancho(texto, ruta_fuente, size_pt, ancho_mm):
+    ancho = calcular_ancho_texto_mm(texto, ruta_fuente, size_pt)
+    if ancho <= ancho_mm: return size_pt
+    # El ancho es casi proporcional al tamaño: se arranca de la estimación y se corrige de a 1 pt.
+    size = max(SIZE_MIN, min(size_pt - 1, int(size_pt * ancho_mm / ancho)))
+    while size > SIZE_MIN and calcular_ancho_texto_mm(texto, ruta_fuente, size) > ancho_mm: size -= 1
+    while size + 1 < size_pt and calcular_ancho_texto_mm(texto, ruta_fuente, size + 1) <= ancho_mm: size += 1
+    return size
+
+@medido("layout.autoajuste")
+def autoajustar(datos_lineas, ancho_mm=ANCHO_REAL_MM, alto_mm=ALTO_REAL_MM):
+    # `datos_lineas` con los tamaños pedidos; devuelve el diseño que entra en ancho_mm x alto_mm.
+    pedidos = [min(SIZE_MAX, max(SIZE_MIN, int(l["size"]))) for l in datos_lineas]
+    topes = [tope_ancho(l["texto"], l["fuente"], s, ancho_mm) for l, s in zip(datos_lineas, pedidos)]
+    presupuesto = alto_mm / FACTOR_PT_A_MM
+    tamanos = lambda k: [max(SIZE_MIN, min(t, int(p * k))) for p, t in zip(pedidos, topes)]
+    finales = list(topes)
+    if sum(topes) > presupuesto:
+        lo, hi = 0.0, 1.0
+        for _ in range(12):   # 1/4096: más fino que el paso de 1 pt; lo que quede lo reparte el relleno
+            k = (lo + hi) / 2
+            if sum(tamanos(k)) <= presupuesto: lo = k
+            else: hi = k
+        finales = tamanos(lo)
+        holgura = presupuesto - sum(finales)
+        while holgura >= 1:
+            candidatas = [i for i, s in enumerate(finales) if s < topes[i]]
+            if not candidatas: break
+            i = min(candidatas, key=lambda i: finales[i] / pedidos[i])
+            finales[i] += 1; holgura -= 1
+    resultado, y = [], (alto_mm - sum(finales) * FACTOR_PT_A_MM) / 2
+    for linea, size in zip(datos_lineas, finales):
+        alto = size * FACTOR_PT_A_MM
+        # Una línea más alta que el sello (ya en SIZE_MIN) no entra de ninguna forma: queda
+        # pegada arriba en vez de invertir los topes y subirla por encima del borde.
+        offset = min(max(float(linea["offset_y"]), -y), max(-y, alto_mm - alto - y))
+        resultado.append({**linea, "size": size, "offset_y": offset})
+        y += alto
+    return resultado
+
+
+# --- MOTOR GRÁFICO ---
+def disponer_px(datos_lineas, scale):
+    # Layout en px de cada línea: (línea, fuente, clave_fuente, x, y, alto en px, ancho en px).
+    w_px, h_px = int(ANCHO_REAL_MM * scale), int(ALTO_REAL_MM * scale)
+    total_h_px = sum(l['size'] * FACTOR_PT_A_MM * scale for l in datos_lineas)
+    y_cursor_base = (h_px - total_h_px) / 2
+    for linea in datos_lineas:
+        sz_px = int(linea['size'] * FACTOR_PT_A_MM * scale)
+        font = cargar_fuente(linea['fuente'], sz_px)
+        clave_fuente = (linea['fuente'], sz_px, scale)
+        text_w = ancho_texto_px(linea['texto'], font, clave_fuente)
+        yield linea, font, clave_fuente, (w_px - text_w) / 2, y_cursor_base + int(linea['offset_y'] * scale), sz_px, text_w
+        y_cursor_base += sz_px
+
+def renderizar_imagen(datos_lineas, scale, dibujar_borde=True, color_borde="black", mostrar_guias=False, modo="RGB"):
+    # modo="L" (escala de grises) alcanza cuando no hay color: sin guías y borde negro.
+    # modo="1" (1 bit, para producción): se rasteriza en "L" y se umbraliza al final.
+    with tramo("render.hd" if scale >= SCALE_HD else "render.preview"):
+        return _renderizar_imagen(datos_lineas, scale, dibujar_borde, color_borde, mostrar_guias, modo)
+
+def _renderizar_imagen(datos_lineas, scale, dibujar_borde, color_borde, mostrar_guias, modo):
+    w_px = int(ANCHO_REAL_MM * scale)
+    h_px = int(ALTO_REAL_MM * scale)
+    lienzo = "L" if modo == "1" else modo
+    img = Image.new(lienzo, (w_px, h_px), "white")
+    draw = ImageDraw.Draw(img)
+
+    if dibujar_borde:
+        grosor = 4 if color_borde == "red" else max(2, int(scale/5))
+        draw.rectangle([(0,0), (w_px-1, h_px-1)], outline=color_borde, width=grosor)
+
+    for linea, font, clave_fuente, x_pos, y_visual_px, sz_px, text_w in disponer_px(datos_lineas, scale):
+        txt = linea['texto']
+
+        # Capa cacheada por línea: el offset sólo cambia dónde se pega
+        pegar_texto(img, txt, font, clave_fuente, (x_pos, y_visual_px), fill="black")
+
+        # Guías (para HD)
+        if mostrar_guias:
+            color_guia = ImageColor.getcolor("rgb(0,150,255)", lienzo)
+            grosor_guia = max(1, int(scale / 20))
+            tamano_fuente_cota = int(8 * scale / 6)
+            try: ascent, descent = font.getmetrics()
+            except: ascent = sz_px * 0.8
+            y_base_guia = y_visual_px + ascent
+            draw.line([(0, y_base_guia), (w_px, y_base_guia)], fill=color_guia, width=grosor_guia)
+
+            font_small = cargar_fuente_cota(tamano_fuente_cota, font)
+            pos_mm_real = y_base_guia / scale
+            label = f"{pos_mm_real:.1f}"
+
+            draw.text((scale * 0.5, y_base_guia - tamano_fuente_cota), label, font=font_small, fill=color_guia)
+            draw.rectangle([x_pos, y_visual_px, x_pos + text_w, y_visual_px + sz_px], outline=ImageColor.getcolor("rgb(200,200,200)", lienzo), width=0)
+    if modo == "1": img = img.convert("1", dither=Image.Dither.NONE)
+    return img
+
+
+# --- GENERADOR PDF ---
+def _colocar_lineas(datos_lineas, x0=0, y0=0):
+    # (línea, contorno o None, x en mm del contorno, baseline en mm, mm por unidad de fuente)
+    from sellos.contornos import linea_contorno
+    h_total_mm = altura_total_mm(datos_lineas)
+    y_base = y0 + (ALTO_REAL_MM - h_total_mm) / 2
+    for l in datos_lineas:
+        em_mm = l['size'] * FACTOR_PT_A_MM
+        y_final_baseline = y_base + l['offset_y'] + get_font_metrics_mm(l['fuente'], l['size'])
+        contorno = linea_contorno(l['fuente'], l['texto'])
+        escala = em_mm / contorno.upm if contorno else None
+        x = x0 + (ANCHO_REAL_MM - contorno.avance * escala) / 2 if contorno else None
+        yield l, contorno, x, y_final_baseline, escala
+        y_base += em_mm
+
+def fuentes_sin_contorno(datos_lineas, contornos=True):
+    # Las únicas que hay que registrar en el FPDF: el resto se dibuja como contornos.
+    from sellos.contornos import fuente_contorno
+    return [l['fuente'] for l in datos_lineas if not (contornos and fuente_contorno(l['fuente']))]
+
+def dibujar_vectorial(pdf, datos_lineas, font_map, x0=0, y0=0, contornos=True):
+    # Sello vectorial con su esquina superior izquierda en (x0, y0) mm. Cada línea va
+    # como contornos rellenos; si la fuente no se puede leer (o contornos=False) se
+    # escribe como texto con la fuente registrada en font_map.
+    from sellos.contornos import dibujar_pdf
+    for l, contorno, x, baseline, escala in _colocar_lineas(datos_lineas, x0, y0):
+        if contorno and contornos:
+            dibujar_pdf(pdf, contorno, x, baseline, escala)
+            continue
+        familia = font_map.get(l['fuente'])
+        pdf.set_font(familia or "Arial", size=l['size'])
+        # Las TTF registradas van en Unicode; "Arial" es la core font de fpdf2 y sólo acepta latin-1.
+        txt = l['texto'] if familia else l['texto'].encode('latin-1', 'replace').decode('latin-1')
+        pdf.text(x0 + (ANCHO_REAL_MM - pdf.get_string_width(txt)) / 2, baseline, txt)
+
+@medido("svg.generar")
+def generar_svg(datos_lineas):
+    # SVG en mm para el software del grabador: un <path> por línea, sin fuentes.
+    from sellos.contornos import trazo_svg
+    cuerpo = []
+    for l, contorno, x, baseline, escala in _colocar_lineas(datos_lineas):
+        if contorno: cuerpo.append(f'<path d="{trazo_svg(contorno, x, baseline, escala)}"/>')
+        else: cuerpo.append(f'<text x="{ANCHO_REAL_MM / 2}" y="{baseline:.3f}" font-family="Arial" font-size="{l["size"] * FACTOR_PT_A_MM:.3f}" '
+                            f'text-anchor="middle">{escape(l["texto"])}</text>')
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{ANCHO_REAL_MM}mm" height="{ALTO_REAL_MM}mm" '
+            f'viewBox="0 0 {ANCHO_REAL_MM} {ALTO_REAL_MM}">\n<g fill="#000" fill-rule="nonzero">\n' + "\n".join(cuerpo) + "\n</g>\n</svg>\n")
+
+@medido("pdf.hibrido")
+def generar_pdf_hibrido(datos_lineas, cliente, incluir_guias_hd=False):
+    from fpdf import FPDF
+    pdf = FPDF(orientation='P', unit='mm', format=(ANCHO_REAL_MM, ALTO_REAL_MM))
+    # PÁG 1: Vectorial (contornos, sin fuentes embebidas)
+    pdf.add_page(); pdf.set_margins(0,0,0); pdf.set_auto_page_break(False, margin=0)
+    font_map = registrar_fuentes_pdf(pdf, fuentes_sin_contorno(datos_lineas))
+    dibujar_vectorial(pdf, datos_lineas, font_map)
+
+    # PÁG 2: Imagen HD
+    pdf.add_page()
+    # Sin pérdida y sin color: 1 bit para grabar (fpdf2 lo comprime con CCITT G4 si Pillow
+    # tiene libtiff, si no con Flate), una imagen por franja de sellos.bandas pegadas una
+    # debajo de la otra, sin armar el lienzo entero. Con guías va el lienzo completo en
+    # grises: las cotas y cajas se dibujan sobre toda la línea y bandas no las tiene.
+    if incluir_guias_hd:
+        img_hd = renderizar_imagen(datos_lineas, scale=SCALE_HD, dibujar_borde=False, mostrar_guias=True, modo="L")
+        pdf.image(img_hd, x=0, y=0, w=ANCHO_REAL_MM, h=ALTO_REAL_MM)
+    else:
+        from sellos.bandas import bandas
+        mm_por_px, y = ALTO_REAL_MM / int(ALTO_REAL_MM * SCALE_HD), 0
+        for franja in bandas(datos_lineas, SCALE_HD, "1"):
+            pdf.image(franja, x=0, y=y * mm_por_px, w=ANCHO_REAL_MM, h=franja.height * mm_por_px)
+            y += franja.height
+
+    return bytes(pdf.output()), nombre_pdf(cliente)
+
+def nombre_pdf(cliente, extension="pdf"):
+    return f"{cliente.replace(' ', '_')}_{datetime.now().strftime('%H%M%S')}.{extension}"
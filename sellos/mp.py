@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sellos.cache import CacheLRU
+from sellos.telemetria import tramo
+
+# --- CLIENTE MERCADO PAGO ---
+# SDK oficial con la URL base configurable (secrets mercadopago.api_url), para poder
+# apuntarlo a un servidor MP falso local en pruebas.
+#
+# El HttpClient del SDK abre una requests.Session nueva por llamada (handshake TLS
+# cada vez) y espera hasta 60 s. Acá se reemplaza por una sesión compartida con pool
+# keep-alive, timeouts acotados y un circuito que corta rápido si MP está caído.
+API_MP = "https://api.mercadopago.com"
+TIMEOUT_CONEXION_S = 3.05
+TIMEOUT_LECTURA_S = 10.0
+REINTENTOS = 2
+FALLOS_PARA_ABRIR = 3     # fallos seguidos que abren el circuito
+ENFRIAMIENTO_S = 30       # tiempo abierto antes de dejar pasar una llamada de prueba
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+
+class CircuitoAbierto(Exception):
+    pass
+
+
+class Circuito:
+    def __init__(self, fallos_para_abrir=FALLOS_PARA_ABRIR, enfriamiento_s=ENFRIAMIENTO_S):
+        self.fallos_para_abrir = fallos_para_abrir
+        self.enfriamiento_s = enfriamiento_s
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        # Abierto: se rechaza sin llamar. Vencido el enfriamiento pasa una sola prueba
+        # (semi-abierto); si falla, vuelve a abrirse.
+        with self._lock:
+            if self.fallos < self.fallos_para_abrir: return True
+            ahora = time.monotonic()
+            if ahora < self.abierto_hasta: return False
+            self.abierto_hasta = ahora + self.enfriamiento_s
+            return True
+
+    def exito(self):
+        with self._lock: self.fallos = 0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.fallos >= self.fallos_para_abrir: self.abierto_hasta = time.monotonic() + self.enfriamiento_s
+
+    def estado(self):
+        with self._lock:
+            if self.fallos < self.fallos_para_abrir: return "cerrado"
+            return "abierto" if time.monotonic() < self.abierto_hasta else "semi-abierto"
+
+
+def _sesion_http():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry
+    # Todos los POST del SDK llevan x-idempotency-key: reintentarlos no duplica nada.
+    # Los timeouts de lectura no se reintentan, así la espera máxima queda acotada.
+    reintentos = Retry(total=REINTENTOS, read=0, backoff_factor=0.3, status_forcelist=ESTADOS_REINTENTABLES, allowed_methods=None)
+    adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=reintentos)
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador); sesion.mount("http://", adaptador)
+    return sesion
+
+
+def crear_sdk(access_token, api_url=None):
+    import mercadopago
+    import requests
+    from mercadopago.http import HttpClient
+
+    class ClienteHTTP(HttpClient):
+        def __init__(self):
+            self.sesion = _sesion_http()
+            self.circuito = Circuito()
+
+        def request(self, method, url, maxretries=None, retry_on=None, backoff_factor=None, **kwargs):
+            if api_url and url.startswith(API_MP): url = api_url.rstrip("/") + url[len(API_MP):]
+            if not self.circuito.permitir(): raise CircuitoAbierto("Mercado Pago no responde, reintentá en unos segundos")
+            lectura = kwargs.pop("timeout", None) or TIMEOUT_LECTURA_S
+            try:
+                with tramo(f"mp.{method.lower()}"):
+                    r = self.sesion.request(method, url, timeout=(TIMEOUT_CONEXION_S, min(lectura, TIMEOUT_LECTURA_S)), **kwargs)
+            except requests.RequestException:
+                self.circuito.fallo(); raise
+            if r.status_code in ESTADOS_REINTENTABLES: self.circuito.fallo()
+            else: self.circuito.exito()
+            respuesta = {"status": r.status_code, "response": None}
+            if r.status_code != 204 and r.content:
+                try: respuesta["response"] = r.json()
+                except ValueError: pass
+            return respuesta
+
+    return mercadopago.SDK(access_token, http_client=ClienteHTTP())
+
+
+def opciones_mp(access_token, clave=None):
+    # Misma clave -> mismo x-idempotency-key: MP no duplica una creación aunque se reintente desde
+    # otro proceso. Sin clave el SDK pone una al azar por pedido: así van los PUT, que ya son
+    # idempotentes y con clave fija repetirían la respuesta guardada (título A -> B -> A quedaba en B).
+    from mercadopago.config import RequestOptions
+    return RequestOptions(access_token=access_token, connection_timeout=TIMEOUT_LECTURA_S, max_retries=REINTENTOS,
+                          custom_headers={"x-idempotency-key": hashlib.sha1(repr(clave).encode()).hexdigest()} if clave else None)
+
+
+# --- PREFERENCIAS DE PAGO ---
+# Una preferencia por (pedido_id, precio): ir "Atrás" y volver, o corregir el nombre,
+# reutiliza el mismo link. Se anticipa en segundo plano apenas el diseño está confirmado,
+# sin el nombre (mientras el cliente lo escribe no se crea nada en MP); al tocar
+# "IR A PAGAR" sólo se actualiza el título del ítem, y sólo si el nombre cambió.
+class PreferenciasMP:
+    def __init__(self, crear, titular=None, n_hilos=2):
+        # crear(pedido_id, precio) -> (id de preferencia, init_point);
+        # titular(id, precio, nombre) pone el nombre en el ítem. Lanzan excepción si fallan.
+        self.crear = crear
+        self.titular = titular
+        self.cache = CacheLRU(max_entradas=2048, nombre="preferencias")
+        self._ejecutor = ThreadPoolExecutor(max_workers=n_hilos, thread_name_prefix="mp")
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(pedido_id, precio):
+        return (pedido_id, precio)
+
+    def _construir(self, clave):
+        try:
+            id_pref, link = self.crear(*clave)
+            preferencia = {"id": id_pref, "link": link, "nombre": None}
+            self.cache.put(clave, preferencia, 1)
+            return preferencia
+        finally:
+            with self._lock: self._en_curso.pop(clave, None)
+
+    def _lanzar(self, clave):
+        with self._lock:
+            if clave in self.cache: return None
+            futuro = self._en_curso.get(clave)
+            if futuro is None: futuro = self._en_curso[clave] = self._ejecutor.submit(self._construir, clave)
+        return futuro
+
+    def anticipar(self, pedido_id, precio):
+        self._lanzar(self.clave(pedido_id, precio))
+
+    def obtener(self, pedido_id, precio, nombre, timeout=None):
+        clave = self.clave(pedido_id, precio)
+        preferencia = self.cache.get(clave)
+        if preferencia is None:
+            futuro = self._lanzar(clave)
+            preferencia = futuro.result(timeout) if futuro is not None else self.cache.get(clave)
+        nombre = " ".join(nombre.split())
+        if self.titular and preferencia["nombre"] != nombre:
+            self.titular(preferencia["id"], precio, nombre)
+            preferencia["nombre"] = nombre
+        return preferencia["link"]
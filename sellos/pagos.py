@@ -0,0 +1,201 @@
+import hashlib
+import hmac
+import json
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# --- ESTADO DE PAGOS LOCAL ---
+# Las notificaciones (webhooks) de Mercado Pago escriben acá el estado de cada pago,
+# por external_reference (= pedido_id). Verificar un pago es una lectura local; la
+# búsqueda en la API queda como respaldo, limitada y con cache negativa corta.
+APROBADO = "approved"
+INTERVALO_API_S = 10      # mínimo entre búsquedas en la API para un mismo pedido
+MAX_BUSQUEDAS_POR_S = 5   # tope global de búsquedas a la API (todas las sesiones)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pagos (
+    payment_id TEXT PRIMARY KEY,
+    external_reference TEXT,
+    status TEXT NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pagos_ref ON pagos (external_reference, status);
+"""
+
+
+class AlmacenPagos:
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        with self._con() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(ESQUEMA)
+
+    @contextmanager
+    def _con(self):
+        con = sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+        try: yield con
+        finally: con.close()
+
+    def registrar(self, payment_id, external_reference, status):
+        with self._con() as con:
+            con.execute("INSERT INTO pagos (payment_id, external_reference, status, actualizado) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(payment_id) DO UPDATE SET external_reference=excluded.external_reference, "
+                        "status=excluded.status, actualizado=excluded.actualizado",
+                        (str(payment_id), external_reference, status, time.time()))
+
+    def pago_aprobado(self, external_reference):
+        with self._con() as con:
+            fila = con.execute("SELECT payment_id FROM pagos WHERE external_reference=? AND status=? LIMIT 1",
+                               (external_reference, APROBADO)).fetchone()
+        return fila[0] if fila else None
+
+
+# --- VERIFICACIÓN (local primero, API como respaldo limitado) ---
+class VerificadorPagos:
+    def __init__(self, almacen, buscar_api, intervalo_s=INTERVALO_API_S, max_por_s=MAX_BUSQUEDAS_POR_S):
+        # buscar_api(ref) -> (payment_id, status) del pago aprobado, o None
+        self.almacen = almacen
+        self.buscar_api = buscar_api
+        self.intervalo_s = intervalo_s
+        self.max_por_s = max_por_s
+        self._ultima_busqueda = {}   # ref -> monotonic de la última búsqueda sin resultado
+        self._fichas = float(max_por_s)
+        self._recarga = self._poda = time.monotonic()
+        self._lock = threading.Lock()
+        self.busquedas_api = 0
+
+    def _permitir_busqueda(self, ref):
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora - self._poda >= self.intervalo_s:
+                # Las entradas más viejas que el intervalo ya no frenan nada: se descartan una vez
+                # por intervalo, así el dict no pasa de ~max_por_s * intervalo_s pedidos.
+                self._ultima_busqueda = {r: t for r, t in self._ultima_busqueda.items() if ahora - t < self.intervalo_s}
+                self._poda = ahora
+            if ahora - self._ultima_busqueda.get(ref, -1e9) < self.intervalo_s: return False
+            self._fichas = min(self.max_por_s, self._fichas + (ahora - self._recarga) * self.max_por_s)
+            self._recarga = ahora
+            if self._fichas < 1: return False
+            self._fichas -= 1
+            self._ultima_busqueda[ref] = ahora
+            return True
+
+    def local(self, ref):
+        return self.almacen.pago_aprobado(ref)
+
+    def verificar(self, ref):
+        pid = self.almacen.pago_aprobado(ref)
+        if pid or not self._permitir_busqueda(ref): return pid
+        self.busquedas_api += 1
+        encontrado = self.buscar_api(ref)
+        if not encontrado: return None
+        pid, status = encontrado
+        self.almacen.registrar(pid, ref, status)
+        with self._lock: self._ultima_busqueda.pop(ref, None)
+        return pid if status == APROBADO else None
+
+
+# --- NOTIFICACIONES (WEBHOOK / IPN) ---
+def firma_valida(secreto, data_id, x_signature, x_request_id):
+    # x-signature: "ts=...,v1=..."; manifiesto según la documentación de MP.
+    partes = dict(p.strip().split("=", 1) for p in (x_signature or "").split(",") if "=" in p)
+    if "ts" not in partes or "v1" not in partes: return False
+    data_id = data_id.lower() if data_id.isalnum() else data_id
+    manifiesto = f"id:{data_id};request-id:{x_request_id or ''};ts:{partes['ts']};"
+    esperado = hmac.new(secreto.encode(), manifiesto.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperado, partes["v1"])
+
+
+def id_de_notificacion(query, cuerpo):
+    # Webhooks: {"type": "payment", "data": {"id": ...}} (+ ?type=payment&data.id=...)
+    # IPN (viejo): ?topic=payment&id=...
+    tipo = cuerpo.get("type") or cuerpo.get("topic") or query.get("type", [None])[0] or query.get("topic", [None])[0]
+    if tipo != "payment": return None
+    data_id = (cuerpo.get("data") or {}).get("id") or query.get("data.id", [None])[0] or query.get("id", [None])[0]
+    return str(data_id) if data_id else None
+
+
+class ReceptorWebhook(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, almacen, obtener_pago, secreto=None, al_aprobar=None):
+        # obtener_pago(payment_id) -> dict del pago según la API (status, external_reference)
+        self.almacen = almacen
+        self.obtener_pago = obtener_pago
+        self.secreto = secreto
+        self.al_aprobar = al_aprobar
+        self.notificaciones = 0
+        super().__init__(direccion, _ManejadorWebhook)
+
+    def procesar(self, payment_id):
+        pago = self.obtener_pago(payment_id)
+        if not pago or not pago.get("external_reference"): return
+        self.almacen.registrar(pago.get("id", payment_id), pago["external_reference"], pago.get("status", ""))
+        if pago.get("status") == APROBADO and self.al_aprobar: self.al_aprobar(pago["external_reference"], str(pago.get("id", payment_id)))
+
+
+class _ManejadorWebhook(BaseHTTPRequestHandler):
+    def _notificacion(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        largo = int(self.headers.get("Content-Length") or 0)
+        try: cuerpo = json.loads(self.rfile.read(largo) or b"{}") if largo else {}
+        except ValueError: cuerpo = {}
+        payment_id = id_de_notificacion(query, cuerpo if isinstance(cuerpo, dict) else {})
+        if payment_id and self.server.secreto and not firma_valida(
+                self.server.secreto, payment_id, self.headers.get("x-signature"), self.headers.get("x-request-id")):
+            self.send_response(401); self.send_header("Content-Length", "0"); self.end_headers(); return
+        # MP reintenta si no recibe 2xx rápido: se responde primero y se procesa después.
+        self.send_response(200); self.send_header("Content-Length", "0"); self.end_headers()
+        self.wfile.flush()
+        if payment_id:
+            self.server.notificaciones += 1
+            try: self.server.procesar(payment_id)
+            except Exception as e: self.log_error("notificación %s: %s", payment_id, e)
+
+    do_POST = _notificacion
+    do_GET = _notificacion
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def iniciar_receptor(puerto, almacen, obtener_pago, secreto=None, al_aprobar=None, host="0.0.0.0"):
+    receptor = ReceptorWebhook((host, puerto), almacen, obtener_pago, secreto, al_aprobar)
+    threading.Thread(target=receptor.serve_forever, name="webhook-mp", daemon=True).start()
+    return receptor
+
+
+# --- ADAPTADORES AL SDK ---
+def buscar_aprobado_sdk(mp_sdk):
+    def buscar(ref):
+        res = mp_sdk.payment().search({"external_reference": ref, "status": APROBADO})
+        resultados = (res.get("response") or {}).get("results") or []
+        return (str(resultados[0]["id"]), resultados[0].get("status", APROBADO)) if resultados else None
+    return buscar
+
+
+def obtener_pago_sdk(mp_sdk):
+    def obtener(payment_id):
+        res = mp_sdk.payment().get(payment_id)
+        return res.get("response") if res.get("status") == 200 else None
+    return obtener
+
+
+# Receptor independiente (p. ej. detrás del proxy, cuando el hosting de Streamlit no
+# expone otro puerto):  MP_ACCESS_TOKEN=... python -m sellos.pagos 8502
+if __name__ == "__main__":
+    import os
+    from sellos.datos import ruta_datos
+    from sellos.mp import crear_sdk
+    sdk = crear_sdk(os.environ["MP_ACCESS_TOKEN"], os.environ.get("MP_API_URL"))
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else 8502
+    receptor = ReceptorWebhook(("0.0.0.0", puerto), AlmacenPagos(ruta_datos("pagos.db")), obtener_pago_sdk(sdk),
+                               os.environ.get("MP_WEBHOOK_SECRET"))
+    print(f"Webhook Mercado Pago escuchando en :{puerto}")
+    receptor.serve_forever()
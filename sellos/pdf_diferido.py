@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sellos.cache import CacheLRU
+
+# --- PDF DIFERIDO ---
+# El PDF se arma sólo cuando alguien lo pide (o en segundo plano, cuando el diseño
+# lleva un rato quieto) y queda cacheado por hash de diseño: descargas repetidas
+# del mismo diseño, desde cualquier sesión, no vuelven a renderizar.
+DEBOUNCE_S = 1.5
+
+CACHE_PDFS = CacheLRU(max_entradas=64, max_bytes=64 * 1024 * 1024, nombre="pdfs")
+_ejecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf")
+_lock = threading.Lock()
+_en_curso = {}   # clave -> Future (un solo build por diseño aunque lo pidan varios)
+_timers = {}     # id de sesión -> Timer del precálculo pendiente
+
+
+def _construir(clave, generar):
+    try:
+        pdf = generar()
+        CACHE_PDFS.put(clave, pdf, len(pdf))
+        return pdf
+    finally:
+        with _lock: _en_curso.pop(clave, None)
+
+
+def _lanzar(clave, generar):
+    if clave in CACHE_PDFS: return None
+    with _lock:
+        futuro = _en_curso.get(clave)
+        if futuro is None:
+            futuro = _en_curso[clave] = _ejecutor.submit(_construir, clave, generar)
+    return futuro
+
+
+def obtener_pdf(clave, generar):
+    # `generar()` devuelve los bytes del PDF; sólo corre si no está en cache ni en curso.
+    pdf = CACHE_PDFS.get(clave)
+    if pdf is not None: return pdf
+    futuro = _lanzar(clave, generar)
+    if futuro is not None: return futuro.result()
+    pdf = CACHE_PDFS.get(clave)
+    return pdf if pdf is not None else generar()
+
+
+def programar_precalculo(id_sesion, clave, generar, espera=DEBOUNCE_S):
+    # Cada rerun reinicia la espera de su sesión: sólo se precalcula el diseño que quedó quieto.
+    with _lock: anterior = _timers.pop(id_sesion, None)
+    if anterior is not None: anterior.cancel()
+    if clave in CACHE_PDFS: return
+
+    def disparar():
+        with _lock:
+            if _timers.get(id_sesion) is timer: del _timers[id_sesion]
+        _lanzar(clave, generar)
+
+    timer = threading.Timer(espera, disparar)
+    timer.daemon = True
+    with _lock: _timers[id_sesion] = timer
+    timer.start()
+
+
+def estadisticas_pdfs():
+    return CACHE_PDFS.estadisticas()
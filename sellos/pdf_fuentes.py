@@ -0,0 +1,77 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from sellos.activos import existe, lector
+from sellos.cache import CacheLRU
+from sellos.datos import ruta_datos
+from sellos.telemetria import medido
+
+# --- FUENTES PARA EL PDF ---
+# Sólo se registran en el FPDF las fuentes que usa el diseño y que no van como contornos
+# (modo texto de los pliegos, fuentes que sellos.contornos no puede leer). Cada TTF se
+# reduce una vez por proceso a RANGO_PDF sin tablas de layout; esos mismos bytes son los
+# que el editor en vivo manda al navegador.
+#
+# add_font de fpdf2 sólo acepta una ruta: la fuente reducida se escribe una vez en el
+# directorio de datos (nombre por contenido) y cada PDF la registra desde ahí. fpdf2 arma
+# un TTFFont nuevo por documento porque al serializar lo subsetea en el lugar.
+
+# Latin-1 más lo que WinAnsi (cp1252) agrega en 0x80-0x9F: ’ “ ” – — … € y compañía.
+RANGO_PDF = sorted(set(range(0x20, 0x100)) | {ord(c) for c in bytes(range(0x80, 0xA0)).decode("cp1252", "ignore")})
+TABLAS_DESCARTADAS = ["GSUB", "GPOS", "GDEF", "hdmx", "FFTM", "DSIG"]
+
+CACHE_FUENTES_PDF = CacheLRU(max_entradas=32, max_bytes=16 * 1024 * 1024, nombre="fuentes_pdf")
+
+_log = logging.getLogger("sellos.pdf_fuentes")
+
+
+@medido("pdf.reducir_fuente")
+def _reducir_fuente(ruta):
+    from fontTools import subset as ftsubset
+    from fontTools.ttLib import TTFont
+    ttf = TTFont(lector(ruta), recalcTimestamp=False)
+    opciones = ftsubset.Options(notdef_outline=True, recommended_glyphs=True, layout_features=[], name_IDs=["*"])
+    opciones.drop_tables += TABLAS_DESCARTADAS
+    subsetter = ftsubset.Subsetter(opciones)
+    subsetter.populate(unicodes=RANGO_PDF)
+    subsetter.subset(ttf)
+    salida = io.BytesIO()
+    ttf.save(salida)
+    return salida.getvalue()
+
+
+def fuente_reducida(ruta):
+    return CACHE_FUENTES_PDF.obtener_o_crear(ruta, lambda: _reducir_fuente(ruta), peso=len)
+
+
+_archivos = {}
+_lock = threading.Lock()
+
+
+def archivo_reducido(ruta):
+    try: return _archivos[ruta]
+    except KeyError: pass
+    with _lock:
+        if ruta not in _archivos:
+            datos = fuente_reducida(ruta)
+            nombre = f"{os.path.splitext(os.path.basename(ruta))[0]}-{hashlib.sha1(datos).hexdigest()[:12]}.ttf"
+            destino = ruta_datos("fuentes_pdf", nombre)
+            if not os.path.exists(destino):
+                with open(f"{destino}.{os.getpid()}", "wb") as f: f.write(datos)
+                os.replace(f"{destino}.{os.getpid()}", destino)
+            _archivos[ruta] = destino
+        return _archivos[ruta]
+
+
+def registrar_fuentes_pdf(pdf, rutas, font_map=None):
+    # Devuelve {ruta: familia} sólo para las fuentes efectivamente usadas. Con un
+    # font_map previo del mismo PDF sólo registra las que faltan (pliegos).
+    font_map = {} if font_map is None else font_map
+    for ruta in dict.fromkeys(rutas):
+        if ruta in font_map or not existe(ruta): continue
+        familia = f"F{len(font_map) + 1}"
+        try: pdf.add_font(familia, "", archivo_reducido(ruta)); font_map[ruta] = familia
+        except Exception: _log.exception("no se pudo registrar %s en el PDF; la línea sale en Arial", ruta)
+    return font_map
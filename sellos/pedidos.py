@@ -0,0 +1,172 @@
+import argparse
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+# --- ALMACÉN DE PEDIDOS ---
+# SQLite local con lo que define un pedido: el diseño tal como quedó al confirmarlo
+# (foto inmutable una vez pagado), los datos del cliente, el paso en el que va y el
+# pago. Una recarga de la página lo recupera por ?pedido=<pedido_id>, y el envío, los
+# reenvíos y las reimpresiones del taller trabajan sobre esta foto, no sobre lo que
+# haya en los widgets.
+#
+# Los renders (PDF híbrido, PNG HD) se guardan como artefactos direccionados por el
+# hash del diseño: el mismo diseño, venga del pedido que venga, se renderiza una vez.
+# Reimpresión: python -m sellos.pedidos <pedido_id> [-o carpeta] [--formato pdf,png]
+PAGADO = "envio"   # paso en el que queda un pedido al registrar el pago
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pedidos (
+    pedido_id TEXT PRIMARY KEY,
+    diseno TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    guias INTEGER NOT NULL DEFAULT 0,
+    cliente TEXT,
+    wpp TEXT,
+    paso TEXT NOT NULL,
+    id_pago TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artefactos (
+    hash TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    ruta TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    creado REAL NOT NULL,
+    PRIMARY KEY (hash, tipo)
+);
+"""
+
+
+def hash_pedido(datos_lineas, guias):
+    from sellos.vista_previa import hash_diseno
+    return hash_diseno(datos_lineas, guias_hd=bool(guias))
+
+
+class AlmacenPedidos:
+    def __init__(self, ruta_db, dir_artefactos):
+        self.ruta_db = ruta_db
+        self.dir_artefactos = dir_artefactos
+        os.makedirs(dir_artefactos, exist_ok=True)
+        with self._con() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(ESQUEMA)
+
+    @contextmanager
+    def _con(self):
+        con = sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        try: yield con
+        finally: con.close()
+
+    def confirmar(self, pedido_id, datos_lineas, lineas_editor, guias, paso="datos", autoajuste=False):
+        # Foto del diseño al confirmarlo. Se puede volver a editar y confirmar hasta que
+        # entra el pago; desde ahí la foto no cambia.
+        ahora = time.time()
+        diseno = json.dumps({"datos": datos_lineas, "lineas": lineas_editor, "autoajuste": bool(autoajuste)}, ensure_ascii=False)
+        with self._con() as con:
+            con.execute("INSERT INTO pedidos (pedido_id, diseno, hash, guias, paso, creado, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(pedido_id) DO UPDATE SET diseno=excluded.diseno, hash=excluded.hash, guias=excluded.guias, "
+                        "paso=excluded.paso, actualizado=excluded.actualizado WHERE pedidos.id_pago IS NULL",
+                        (pedido_id, diseno, hash_pedido(datos_lineas, guias), int(bool(guias)), paso, ahora, ahora))
+        return self.obtener(pedido_id)
+
+    def datos_cliente(self, pedido_id, cliente, wpp, paso="pago"):
+        with self._con() as con:
+            con.execute("UPDATE pedidos SET cliente=?, wpp=?, paso=?, actualizado=? WHERE pedido_id=? AND id_pago IS NULL",
+                        (cliente, wpp, paso, time.time(), pedido_id))
+
+    def pasar(self, pedido_id, paso):
+        with self._con() as con:
+            con.execute("UPDATE pedidos SET paso=?, actualizado=? WHERE pedido_id=?", (paso, time.time(), pedido_id))
+
+    def registrar_pago(self, pedido_id, id_pago):
+        # Idempotente: el primer pago registrado queda; verificar dos veces no lo pisa.
+        with self._con() as con:
+            con.execute("UPDATE pedidos SET id_pago=?, paso=?, actualizado=? WHERE pedido_id=? AND id_pago IS NULL",
+                        (str(id_pago), PAGADO, time.time(), pedido_id))
+        return self.obtener(pedido_id)
+
+    def obtener(self, pedido_id):
+        with self._con() as con:
+            fila = con.execute("SELECT * FROM pedidos WHERE pedido_id=?", (pedido_id,)).fetchone()
+        if fila is None: return None
+        pedido = dict(fila)
+        pedido.update({"autoajuste": False, **json.loads(pedido.pop("diseno"))})
+        pedido["guias"] = bool(pedido["guias"])
+        return pedido
+
+    # --- ARTEFACTOS (por hash de diseño) ---
+    def ruta_artefacto(self, hash_, tipo):
+        return os.path.join(self.dir_artefactos, hash_[:2], f"{hash_}.{tipo}")
+
+    def artefacto(self, hash_, tipo, generar):
+        # Bytes del render guardado; `generar()` sólo corre si no está (o si el archivo se perdió).
+        ruta = self.ruta_artefacto(hash_, tipo)
+        try:
+            with open(ruta, "rb") as f: return f.read()
+        except FileNotFoundError: pass
+        datos = generar()
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura por rename: otro trabajador con el mismo diseño nunca lee un archivo a medias.
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, "wb") as f: f.write(datos)
+        os.replace(temporal, ruta)
+        with self._con() as con:
+            con.execute("INSERT INTO artefactos (hash, tipo, ruta, bytes, creado) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(hash, tipo) DO UPDATE SET ruta=excluded.ruta, bytes=excluded.bytes, creado=excluded.creado",
+                        (hash_, tipo, ruta, len(datos), time.time()))
+        return datos
+
+    def pdf(self, pedido):
+        from sellos.motor import generar_pdf_hibrido
+        return self.artefacto(pedido["hash"], "pdf",
+                              lambda: generar_pdf_hibrido(pedido["datos"], pedido["cliente"] or "Pedido", incluir_guias_hd=pedido["guias"])[0])
+
+    def png(self, pedido):
+        # PNG en gris a SCALE_HD, por franjas y sin guías: no depende de las guías del pedido.
+        from sellos.bandas import escribir_png
+        from sellos.motor import SCALE_HD
+        def generar():
+            buffer = io.BytesIO()
+            escribir_png(buffer, pedido["datos"], SCALE_HD, "L")
+            return buffer.getvalue()
+        return self.artefacto(hash_pedido(pedido["datos"], False), "png", generar)
+
+    def estadisticas(self):
+        with self._con() as con:
+            pedidos = con.execute("SELECT COUNT(*), COUNT(id_pago) FROM pedidos").fetchone()
+            artefactos = con.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM artefactos").fetchone()
+        return {"pedidos": pedidos[0], "pagados": pedidos[1], "artefactos": artefactos[0], "bytes": artefactos[1]}
+
+
+# Reimpresión en el taller, sin volver a renderizar si el artefacto ya existe:
+#   python -m sellos.pedidos <pedido_id> -o reimpresiones/ --formato pdf,png
+if __name__ == "__main__":
+    from sellos.datos import ruta_datos
+    from sellos.motor import nombre_pdf
+    parser = argparse.ArgumentParser(prog="python -m sellos.pedidos", description="Reimpresión de pedidos guardados")
+    parser.add_argument("pedidos", nargs="+", help="pedido_id (el external_reference de Mercado Pago)")
+    parser.add_argument("-o", "--salida", default="reimpresiones", help="carpeta de salida")
+    parser.add_argument("--formato", default="pdf", help="pdf y/o png separados por coma")
+    args = parser.parse_args()
+    formatos = [f.strip() for f in args.formato.split(",") if f.strip()]
+    if not formatos or set(formatos) - {"pdf", "png"}: parser.error("--formato admite pdf y/o png")
+    almacen = AlmacenPedidos(ruta_datos("pedidos.db"), ruta_datos("artefactos", ""))
+    os.makedirs(args.salida, exist_ok=True)
+    faltantes = 0
+    for pedido_id in args.pedidos:
+        pedido = almacen.obtener(pedido_id)
+        if pedido is None:
+            print(f"{pedido_id}: no existe", file=sys.stderr); faltantes += 1; continue
+        for formato in formatos:
+            ruta = os.path.join(args.salida, nombre_pdf(pedido["cliente"] or pedido_id, formato))
+            with open(ruta, "wb") as f: f.write(getattr(almacen, formato)(pedido))
+            print(f"{pedido_id}: {ruta}")
+    sys.exit(1 if faltantes else 0)
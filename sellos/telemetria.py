@@ -0,0 +1,208 @@
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sellos.cache import CACHES
+
+# --- TELEMETRÍA ---
+# Tramos cronometrados (fuentes, rasterizado, PNG/base64, PDF, MP, SMTP, rerun completo)
+# agregados en histogramas por proceso. Se exportan en formato de texto Prometheus
+# (servidor /metrics en telemetria.puerto_metricas) y/o como una línea JSON por rerun
+# en telemetria.log, junto con los contadores de todas las CacheLRU.
+LIMITES_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+INTERVALO_PERFIL_S = 0.005
+
+_log = logging.getLogger("sellos.telemetria")
+_lock = threading.Lock()
+_histogramas = {}
+_local = threading.local()   # tramos del rerun en curso (Streamlit corre cada rerun en su hilo)
+
+
+def config_telemetria(secretos):
+    return {
+        "puerto_metricas": int(secretos["puerto_metricas"]) if secretos.get("puerto_metricas") else None,
+        "log": secretos.get("log") or None,
+        # ?perfil=<clave_perfil> en la URL perfila un rerun de esa sesión; sin clave, desactivado.
+        "clave_perfil": secretos.get("clave_perfil") or None,
+    }
+
+
+class Histograma:
+    def __init__(self):
+        self.cubetas = [0] * (len(LIMITES_S) + 1)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, segundos):
+        self.cubetas[bisect.bisect_left(LIMITES_S, segundos)] += 1
+        self.suma += segundos; self.cuenta += 1
+
+
+def observar(nombre, segundos):
+    with _lock:
+        h = _histogramas.get(nombre)
+        if h is None: h = _histogramas[nombre] = Histograma()
+        h.observar(segundos)
+    tramos = getattr(_local, "tramos", None)
+    if tramos is not None: tramos[nombre] = tramos.get(nombre, 0.0) + segundos
+
+
+@contextmanager
+def tramo(nombre):
+    t0 = time.perf_counter()
+    try: yield
+    finally: observar(nombre, time.perf_counter() - t0)
+
+
+def medido(nombre):
+    def decorador(fn):
+        @wraps(fn)
+        def envuelta(*args, **kwargs):
+            with tramo(nombre): return fn(*args, **kwargs)
+        return envuelta
+    return decorador
+
+
+# --- RERUN ---
+def iniciar_rerun(app):
+    _local.tramos = {}
+    _local.abierto = inicio = (app, time.perf_counter())
+    return inicio
+
+
+def medido_fragmento(app, nombre):
+    # Como `medido`, pero si el fragmento corre solo (rerun de fragmento, run_every) cuenta
+    # además como un rerun propio: rerun.<app>.fragmento. Dentro de un rerun completo es un tramo más.
+    def decorador(fn):
+        @wraps(fn)
+        def envuelta(*args, **kwargs):
+            inicio = iniciar_rerun(f"{app}.fragmento") if getattr(_local, "tramos", None) is None else None
+            try:
+                with tramo(nombre): return fn(*args, **kwargs)
+            finally:
+                if inicio: terminar_rerun(inicio)
+        return envuelta
+    return decorador
+
+
+def terminar_rerun(inicio):
+    # Se cierra una sola vez, y sólo si es el rerun abierto en este hilo: devuelve None si no.
+    if getattr(_local, "abierto", None) is not inicio: return None
+    _local.abierto = None
+    app, t0 = inicio
+    segundos = time.perf_counter() - t0
+    tramos, _local.tramos = getattr(_local, "tramos", None) or {}, None
+    observar(f"rerun.{app}", segundos)
+    if _log.handlers:
+        _log.info(json.dumps({"ts": round(time.time(), 3), "app": app, "rerun_ms": round(segundos * 1000, 2),
+                              "tramos_ms": {k: round(v * 1000, 2) for k, v in sorted(tramos.items())},
+                              "caches": {c["nombre"]: round(c["hit_rate"], 4) for c in estadisticas_caches()}}, ensure_ascii=False))
+    return segundos
+
+
+def configurar_log(ruta):
+    if any(getattr(h, "baseFilename", None) == os.path.abspath(ruta) for h in _log.handlers): return
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    manejador = logging.FileHandler(ruta, encoding="utf-8")
+    manejador.setFormatter(logging.Formatter("%(message)s"))
+    _log.addHandler(manejador); _log.setLevel(logging.INFO); _log.propagate = False
+
+
+# --- EXPORTACIÓN ---
+def estadisticas_caches():
+    return sorted((c.estadisticas() for c in list(CACHES)), key=lambda e: e["nombre"])
+
+
+def resumen():
+    with _lock:
+        return {n: {"cuenta": h.cuenta, "promedio_ms": round(h.suma / h.cuenta * 1000, 3)} for n, h in sorted(_histogramas.items()) if h.cuenta}
+
+
+def texto_prometheus():
+    lineas = ["# HELP sellos_tramo_segundos Duración de cada etapa del editor.", "# TYPE sellos_tramo_segundos histogram"]
+    with _lock: copia = {n: (list(h.cubetas), h.suma, h.cuenta) for n, h in _histogramas.items()}
+    for nombre, (cubetas, suma, cuenta) in sorted(copia.items()):
+        acumulado = 0
+        for limite, n in zip(LIMITES_S + ("+Inf",), cubetas):
+            acumulado += n
+            lineas.append(f'sellos_tramo_segundos_bucket{{tramo="{nombre}",le="{limite}"}} {acumulado}')
+        lineas.append(f'sellos_tramo_segundos_sum{{tramo="{nombre}"}} {suma:.6f}')
+        lineas.append(f'sellos_tramo_segundos_count{{tramo="{nombre}"}} {cuenta}')
+    caches = estadisticas_caches()
+    for metrica, campo, tipo in (("hits_total", "hits", "counter"), ("misses_total", "misses", "counter"),
+                                 ("desalojos_total", "desalojos", "counter"), ("entradas", "entradas", "gauge"),
+                                 ("bytes", "bytes", "gauge"), ("hit_ratio", "hit_rate", "gauge")):
+        lineas.append(f"# TYPE sellos_cache_{metrica} {tipo}")
+        lineas += [f'sellos_cache_{metrica}{{cache="{c["nombre"]}"}} {c[campo]}' for c in caches]
+    return "\n".join(lineas) + "\n"
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_response(404); self.send_header("Content-Length", "0"); self.end_headers(); return
+        cuerpo = texto_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo))); self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_exportador(puerto, host="0.0.0.0"):
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
+
+# --- PERFIL POR MUESTREO ---
+# Muestrea la pila de un hilo (el del rerun) cada INTERVALO_PERFIL_S con
+# sys._current_frames y guarda el resultado en formato "collapsed" (una pila por
+# línea + cantidad de muestras), que leen flamegraph.pl y speedscope.
+def perfil_pedido(valor_param, clave):
+    return bool(clave) and valor_param == clave
+
+
+class PerfilMuestreo:
+    def __init__(self, hilo_id=None, intervalo_s=INTERVALO_PERFIL_S):
+        self.hilo_id = hilo_id or threading.get_ident()
+        self.intervalo_s = intervalo_s
+        self.muestras = Counter()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, name="perfil", daemon=True)
+        self._hilo.start()
+        return self
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo_s):
+            frame = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})".replace(";", ","))
+                frame = frame.f_back
+            if pila: self.muestras[";".join(reversed(pila))] += 1
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo: self._hilo.join()
+        return self.muestras
+
+    def guardar(self, ruta):
+        self.detener()
+        with open(ruta, "w", encoding="utf-8") as f:
+            for pila, n in self.muestras.most_common(): f.write(f"{pila} {n}\n")
+        return ruta
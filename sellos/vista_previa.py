@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+from collections import namedtuple
+from PIL import Image
+from sellos.cache import CacheLRU
+from sellos.telemetria import medido
+
+# --- CACHE DE VISTAS PREVIAS ---
+# Direccionada por contenido: la clave es un hash estable del diseño y de los
+# parámetros de render, así que dos sesiones con el mismo diseño (p. ej. el
+# EJEMPLO_INICIAL que ve todo visitante) comparten el mismo render ya codificado.
+VistaPrevia = namedtuple("VistaPrevia", ["clave", "imagen", "datos", "b64", "mime"])
+
+CACHE_PREVIEWS = CacheLRU(max_entradas=256, max_bytes=64 * 1024 * 1024, nombre="previews")
+
+# --- CODIFICACIÓN COMPACTA ---
+# El sello es tinta negra: sin guías ni borde rojo se renderiza en grises y se manda
+# como PNG de paleta de 2 bits (4 niveles alcanzan para el antialias a esta escala).
+# Con color (guías, borde rojo) se cuantiza a 16 colores, 4 bits. compress_level 3:
+# de ahí para arriba se gana poco tamaño y se paga mucho tiempo. WebP sin pérdida es
+# opcional (SELLOS_PREVIEW_FORMATO=webp): algo más chico, pero más lento de codificar.
+FORMATO_PREVIEW = os.environ.get("SELLOS_PREVIEW_FORMATO", "png")
+NIVELES_GRIS = 4
+COLORES_PALETA = 16
+NIVEL_COMPRESION_PNG = 3
+METODO_WEBP = 4
+
+_LUT_GRIS = [round(v * (NIVELES_GRIS - 1) / 255) for v in range(256)]
+_PALETA_GRIS = [round(i * 255 / (NIVELES_GRIS - 1)) for i in range(NIVELES_GRIS) for _ in range(3)]
+
+
+def hash_diseno(datos_lineas, **parametros):
+    lineas = [[l["texto"], l["fuente"], l["size"], round(float(l["offset_y"]), 4)] for l in datos_lineas]
+    canonico = json.dumps({"lineas": lineas, **parametros}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonico.encode("utf-8")).hexdigest()
+
+
+def a_paleta(img):
+    # Devuelve (imagen "P", bits por píxel para el PNG).
+    if img.mode == "L":
+        paleta = Image.frombytes("P", img.size, img.point(_LUT_GRIS).tobytes())
+        paleta.putpalette(_PALETA_GRIS)
+        return paleta, max(1, math.ceil(math.log2(NIVELES_GRIS)))
+    return img.quantize(COLORES_PALETA, method=Image.Quantize.FASTOCTREE), 4
+
+
+@medido("preview.png_base64")
+def _codificar(clave, img, formato=FORMATO_PREVIEW):
+    compacta, bits = a_paleta(img)
+    buffered = io.BytesIO()
+    if formato == "webp":
+        compacta.save(buffered, format="WEBP", lossless=True, method=METODO_WEBP); mime = "image/webp"
+    else:
+        compacta.save(buffered, format="PNG", bits=bits, compress_level=NIVEL_COMPRESION_PNG); mime = "image/png"
+    datos = buffered.getvalue()
+    return VistaPrevia(clave, compacta, datos, base64.b64encode(datos).decode(), mime)
+
+
+def _peso(vp):
+    return vp.imagen.width * vp.imagen.height + len(vp.datos) + len(vp.b64)
+
+
+def obtener_preview(renderizar, datos_lineas, scale, color_borde="black", mostrar_guias=False, formato=FORMATO_PREVIEW):
+    # `renderizar` es el renderizar_imagen del motor; sólo se llama si el diseño es nuevo.
+    clave = hash_diseno(datos_lineas, scale=scale, color_borde=color_borde, mostrar_guias=bool(mostrar_guias), formato=formato)
+    modo = "L" if color_borde == "black" and not mostrar_guias else "RGB"
+    return CACHE_PREVIEWS.obtener_o_crear(
+        clave,
+        lambda: _codificar(clave, renderizar(datos_lineas, scale=scale, color_borde=color_borde, mostrar_guias=mostrar_guias, modo=modo), formato),
+        peso=_peso,
+    )
+
+
+# --- RESOLUCIÓN SEGÚN EL CLIENTE ---
+# La escala (px por mm) sale del ancho en px físicos con que se va a ver la vista
+# previa: viewport y DPR de los client hints si el navegador los manda, si no valores
+# típicos de móvil o escritorio según el User-Agent. Se redondea hacia arriba a pocas
+# escalas fijas para que las sesiones sigan compartiendo cache. Save-Data o una
+# conexión lenta (ECT 2g/3g) bajan un escalón.
+ESCALAS_PREVIEW = (10, 15, 20, 25, 30)
+FRACCION_MOVIL = 0.9         # en el celular la vista previa ocupa casi todo el ancho
+FRACCION_ESCRITORIO = 0.45   # columna derecha del layout "wide"
+VIEWPORT_MOVIL, DPR_MOVIL = 390, 2.0
+VIEWPORT_ESCRITORIO, DPR_ESCRITORIO = 1366, 1.0
+DPR_MAX = 3.0
+
+
+def _numero(valor):
+    try: return float(valor)
+    except (TypeError, ValueError): return None
+
+
+def escala_preview(headers, ancho_mm):
+    h = {k.lower(): v for k, v in dict(headers or {}).items()}
+    movil = h.get("sec-ch-ua-mobile") == "?1" or "mobi" in h.get("user-agent", "").lower()
+    viewport = _numero(h.get("sec-ch-viewport-width") or h.get("viewport-width")) or (VIEWPORT_MOVIL if movil else VIEWPORT_ESCRITORIO)
+    dpr = min(_numero(h.get("sec-ch-dpr") or h.get("dpr")) or (DPR_MOVIL if movil else DPR_ESCRITORIO), DPR_MAX)
+    px = viewport * (FRACCION_MOVIL if movil else FRACCION_ESCRITORIO) * dpr
+    i = next((i for i, e in enumerate(ESCALAS_PREVIEW) if e * ancho_mm >= px), len(ESCALAS_PREVIEW) - 1)
+    if h.get("save-data") == "on" or h.get("ect") in ("slow-2g", "2g", "3g"): i = max(0, i - 1)
+    return ESCALAS_PREVIEW[i]
+
+
+def estadisticas_previews():
+    return CACHE_PREVIEWS.estadisticas()
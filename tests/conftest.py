@@ -0,0 +1,12 @@
+import os
+import sys
+import pytest
+
+# Las rutas de fuentes, logo e índice de medidas son relativas a la raíz del repo.
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path: sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture(autouse=True)
+def _en_raiz(monkeypatch):
+    monkeypatch.chdir(RAIZ)
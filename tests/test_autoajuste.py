@@ -0,0 +1,40 @@
+import pytest
+
+from sellos.motor import (ALTO_REAL_MM, ANCHO_REAL_MM, FACTOR_PT_A_MM, SIZE_MIN, altura_total_mm, autoajustar,
+                          calcular_ancho_texto_mm)
+
+ROBOTO, ALEO = "assets/fonts/Roboto-Regular.ttf", "assets/fonts/Aleo-Regular.ttf"
+
+
+def linea(texto, size, offset_y=0.0, fuente=ROBOTO):
+    return {"texto": texto, "fuente": fuente, "size": size, "offset_y": offset_y}
+
+
+def dentro_del_sello(resultado):
+    y = (ALTO_REAL_MM - altura_total_mm(resultado)) / 2
+    for l in resultado:
+        assert calcular_ancho_texto_mm(l["texto"], l["fuente"], l["size"]) <= ANCHO_REAL_MM or l["size"] == SIZE_MIN
+        assert -1e-9 <= y + l["offset_y"] and y + l["offset_y"] + l["size"] * FACTOR_PT_A_MM <= ALTO_REAL_MM + 1e-9
+        y += l["size"] * FACTOR_PT_A_MM
+
+
+def test_diseno_que_entra_no_cambia():
+    datos = [linea("Juan Pérez", 14), linea("Abogado", 10, 0.5, ALEO)]
+    assert autoajustar(datos) == datos
+
+
+def test_achica_a_lo_ancho_y_a_lo_alto():
+    datos = [linea("Estudio Jurídico Pérez & Asociados", 22), linea("Juan Pérez", 20, 3.0), linea("Abogado", 18, -2.0, ALEO),
+             linea("Matrícula N° 20408978", 16)]
+    resultado = autoajustar(datos)
+    assert altura_total_mm(resultado) <= ALTO_REAL_MM
+    assert all(r["size"] <= d["size"] for r, d in zip(resultado, datos))
+    dentro_del_sello(resultado)
+
+
+@pytest.mark.parametrize("offset_y", [-3.0, 0.0, 3.0])
+def test_linea_mas_alta_que_el_sello_queda_arriba(offset_y):
+    # En SIZE_MIN la línea mide ~2.8 mm: en un sello de 2 mm desborda igual, pero por abajo.
+    (resultado,) = autoajustar([linea("Juan", 12, offset_y)], alto_mm=2)
+    assert resultado["size"] == SIZE_MIN
+    assert abs((2 - SIZE_MIN * FACTOR_PT_A_MM) / 2 + resultado["offset_y"]) < 1e-9
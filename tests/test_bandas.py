@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from PIL import Image, ImageChops
+
+from sellos.bandas import bandas, escala_dpi, escribir_png, master_pdf
+from sellos.motor import ALTO_REAL_MM, ANCHO_REAL_MM, SCALE_HD, renderizar_imagen
+
+DISENO = [{"texto": "Juan Pérez Pardo", "fuente": "assets/fonts/Aleo-Italic.ttf", "size": 13, "offset_y": 0.35},
+          {"texto": "MÉDICO CLÍNICO", "fuente": "assets/fonts/Playwrite-Regular.ttf", "size": 12, "offset_y": -1.0}]
+
+
+# Diseños con glifos que cruzan los bordes de franja (offsets positivos y negativos,
+# líneas más anchas que el sello y líneas que salen por arriba).
+DISENOS = {
+    "costuras": [{"texto": "Matrícula N° 20408978", "fuente": "assets/fonts/MuktaMahee-SemiBold.ttf", "size": 10, "offset_y": 1.3},
+                 {"texto": "Estudio Jurídico", "fuente": "assets/fonts/Aleo-Regular.ttf", "size": 11, "offset_y": 1.3},
+                 {"texto": "MÉDICO CLÍNICO", "fuente": "assets/fonts/Playwrite-Regular.ttf", "size": 12, "offset_y": -1.0}],
+    "fuera_del_sello": [{"texto": "Estudio Jurídico Pérez & Asociados · Abogados", "fuente": "assets/fonts/GreatVibes-Regular.ttf", "size": 14, "offset_y": -3.7},
+                        {"texto": "Juan Pérez Pardo", "fuente": "assets/fonts/Aleo-Italic.ttf", "size": 13, "offset_y": 0.35},
+                        {"texto": "gjpqy ÁÉÍ", "fuente": "assets/fonts/amaze.ttf", "size": 16, "offset_y": 2.15}],
+}
+
+
+def cosida(datos, scale, alto_banda):
+    franjas = list(bandas(datos, scale, "L", alto_banda=alto_banda, hilos=2))
+    img = Image.new("L", (franjas[0].width, sum(f.height for f in franjas)))
+    y = 0
+    for franja in franjas:
+        img.paste(franja, (0, y)); y += franja.height
+    return img
+
+
+def test_una_franja_es_el_render_completo():
+    completo = renderizar_imagen(DISENO, SCALE_HD, dibujar_borde=False, modo="L")
+    assert ImageChops.difference(completo, cosida(DISENO, SCALE_HD, 10 ** 6)).getbbox() is None
+
+
+@pytest.mark.parametrize("nombre", DISENOS)
+@pytest.mark.parametrize("scale, alto_banda", [(SCALE_HD, 256), (SCALE_HD, 37), (escala_dpi(600), 256)])
+def test_franjas_identicas_al_render_completo(nombre, scale, alto_banda):
+    datos = DISENOS[nombre]
+    completo = renderizar_imagen(datos, scale, dibujar_borde=False, modo="L")
+    assert ImageChops.difference(completo, cosida(datos, scale, alto_banda)).getbbox() is None
+
+
+def test_png_en_streaming():
+    buffer, scale = io.BytesIO(), escala_dpi(600)
+    escribir_png(buffer, DISENO, scale, "1", alto_banda=100)
+    img = Image.open(io.BytesIO(buffer.getvalue())); img.load()
+    assert img.mode == "1" and img.size == (int(ANCHO_REAL_MM * scale), int(ALTO_REAL_MM * scale))
+    assert round(img.info["dpi"][0]) == 600
+
+
+def test_pdf_master():
+    scale = escala_dpi(300)
+    pdf = master_pdf(DISENO, dpi=300, alto_banda=100)
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    assert f"/Width {int(ANCHO_REAL_MM * scale)} /Height {int(ALTO_REAL_MM * scale)}".encode() in pdf
@@ -0,0 +1,169 @@
+import smtplib
+import socket
+import sqlite3
+import time
+
+import pytest
+
+from sellos.cola import EN_DIGESTO, ENVIADO, FALLIDO, PENDIENTE, PROCESANDO, ColaPedidos, PoolTrabajadores
+from sellos.correo import DigestoPedidos, EnviadorSMTP, armar_mensaje, config_email, enviar_email
+
+
+class EnviadorFalso:
+    config = {"remitente": "sellos@test", "destinatario": "taller@test"}
+
+    def __init__(self): self.mensajes = []
+    def enviar(self, msg): self.mensajes.append(msg)
+
+
+class EnviadorCaido(EnviadorFalso):
+    # Falla los primeros `fallas` envíos, como un SMTP caído.
+    def __init__(self, fallas): super().__init__(); self.fallas = fallas
+
+    def enviar(self, msg):
+        if self.fallas: self.fallas -= 1; raise smtplib.SMTPServerDisconnected("caído")
+        super().enviar(msg)
+
+
+def esperar(condicion, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite, "timeout"
+        time.sleep(0.02)
+
+
+def test_un_trabajo_por_pedido(tmp_path):
+    cola = ColaPedidos(str(tmp_path / "cola.db"))
+    cola.encolar("a", {"n": 1}); cola.encolar("a", {"n": 2})
+    assert cola.tomar()["payload"] == {"n": 1}
+    assert cola.tomar() is None   # tomado (lease) y sin duplicados
+
+
+def test_reintentos_con_backoff_hasta_fallido(tmp_path):
+    cola = ColaPedidos(str(tmp_path / "cola.db"), max_intentos=2)
+    cola.encolar("a", {})
+    cola.tomar(); cola.fallar("a", "smtp caído")
+    estado = cola.estado("a")
+    assert estado["estado"] == PENDIENTE and estado["intentos"] == 1 and estado["proximo_intento"] > time.time()
+    assert cola.tomar() is None   # todavía en backoff
+    cola.fallar("a", "smtp caído")
+    assert cola.estado("a")["estado"] == FALLIDO
+    cola.reencolar("a")
+    assert cola.estado("a")["estado"] == PENDIENTE and cola.tomar()["pedido_id"] == "a"
+
+
+def test_pool_completa_o_registra_el_error(tmp_path):
+    cola = ColaPedidos(str(tmp_path / "cola.db"))
+
+    def procesar(payload):
+        if payload["roto"]: raise RuntimeError("sin PDF")
+
+    pool = PoolTrabajadores(cola, procesar, n_hilos=2, espera_s=0.05).iniciar()
+    try:
+        cola.encolar("bien", {"roto": False}); cola.encolar("mal", {"roto": True}); pool.avisar()
+        esperar(lambda: cola.estado("bien")["estado"] == ENVIADO and cola.estado("mal")["intentos"] == 1)
+        assert cola.estado("mal")["error"] == "RuntimeError: sin PDF"
+    finally: pool.detener(5)
+
+
+def test_digesto_pasa_a_enviado_cuando_sale_el_email(tmp_path):
+    cola, enviador = ColaPedidos(str(tmp_path / "cola.db")), EnviadorFalso()
+    digesto = DigestoPedidos(enviador, str(tmp_path / "spool"), 3600, al_enviar=cola.digesto_enviado)
+
+    def procesar(payload):
+        digesto.agregar(b"%PDF", "x.pdf", payload["cliente"], "11", "1", payload["pedido_id"])
+        return EN_DIGESTO
+
+    pool = PoolTrabajadores(cola, procesar, n_hilos=1, espera_s=0.05).iniciar()
+    for pid in ("a", "b"): cola.encolar(pid, {"pedido_id": pid, "cliente": pid.upper()})
+    pool.avisar()
+    try:
+        esperar(lambda: all(cola.estado(pid)["estado"] == EN_DIGESTO for pid in ("a", "b")))
+        assert not enviador.mensajes
+        assert digesto.enviar_pendientes() == 2
+        assert len(enviador.mensajes) == 1
+        assert [cola.estado(pid)["estado"] for pid in ("a", "b")] == [ENVIADO, ENVIADO]
+    finally: pool.detener(5)
+
+
+@pytest.fixture
+def smtp_local():
+    # SMTP real en localhost (aiosmtpd), sin TLS ni login: lo que recibe queda en `recibidos`.
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.handlers import Message
+
+    class Guardar(Message):
+        def __init__(self): super().__init__(); self.recibidos = []
+        def handle_message(self, message): self.recibidos.append(message)
+
+    with socket.socket() as s: s.bind(("127.0.0.1", 0)); puerto = s.getsockname()[1]
+    manejador = Guardar()
+    servidor = Controller(manejador, hostname="127.0.0.1", port=puerto)
+    servidor.start()
+    try: yield config_email({"servidor": "127.0.0.1", "puerto": puerto, "starttls": False,
+                             "remitente": "sellos@test", "destinatario": "taller@test"}), manejador.recibidos
+    finally: servidor.stop()
+
+
+def test_trabajador_sobrevive_a_errores_de_la_cola(tmp_path, smtp_local, monkeypatch):
+    config, recibidos = smtp_local
+    cola, enviador = ColaPedidos(str(tmp_path / "cola.db")), EnviadorSMTP(config)
+    completar, fallos = cola.completar, []
+
+    def completar_bloqueada(pedido_id, estado=ENVIADO):
+        if not fallos: fallos.append(pedido_id); raise sqlite3.OperationalError("database is locked")
+        completar(pedido_id, estado)
+
+    monkeypatch.setattr(cola, "completar", completar_bloqueada)
+    pool = PoolTrabajadores(cola, lambda p: enviar_email(enviador, b"%PDF", f"{p['cliente']}.pdf", p["cliente"], "11", "1"),
+                            n_hilos=1, espera_s=0.05).iniciar()
+    try:
+        for pid in ("a", "b"): cola.encolar(pid, {"cliente": pid.upper()})
+        pool.avisar()
+        esperar(lambda: len(recibidos) == 2)
+        esperar(lambda: cola.estado("b")["estado"] == ENVIADO)
+        assert pool._hilos[0].is_alive()
+        assert fallos == ["a"] and cola.estado("a")["estado"] == PROCESANDO   # se retoma al vencer el lease
+        assert sorted(m["Subject"] for m in recibidos) == ["Pedido PAGADO: A", "Pedido PAGADO: B"]
+    finally: pool.detener(5); enviador.cerrar()
+
+
+class ConexionFalsa:
+    # sendmail levanta el siguiente error de `errores` (None: entrega).
+    def __init__(self, errores, entregados): self.errores, self.entregados = errores, entregados
+
+    def sendmail(self, remitente, destinatario, texto):
+        error = self.errores.pop(0)
+        if error: raise error
+        self.entregados.append(destinatario)
+
+    def noop(self): return 250, b"ok"
+    def quit(self): pass
+
+
+@pytest.mark.parametrize("error, reintenta", [
+    (smtplib.SMTPServerDisconnected("se cortó"), True), (ConnectionResetError(), True), (socket.timeout(), True),
+    (smtplib.SMTPRecipientsRefused({"taller@test": (550, b"no existe")}), False), (smtplib.SMTPDataError(552, b"muy grande"), False)])
+def test_enviar_reintenta_solo_si_se_corta_la_conexion(monkeypatch, error, reintenta):
+    errores, entregados = [error, None], []
+    monkeypatch.setattr("sellos.correo.conectar", lambda config: ConexionFalsa(errores, entregados))
+    config = config_email({"destinatario": "taller@test"})
+    enviador = EnviadorSMTP(config)
+    if reintenta:
+        enviador.enviar(armar_mensaje(config, b"%PDF", "x.pdf", "A", "11", "1"))
+        assert entregados == ["taller@test"] and enviador.conexiones_abiertas == 2
+    else:
+        with pytest.raises(type(error)): enviador.enviar(armar_mensaje(config, b"%PDF", "x.pdf", "A", "11", "1"))
+        assert errores == [None] and enviador.conexiones_abiertas == 1
+
+
+def test_digesto_que_falla_se_registra_y_sale_en_la_proxima_ventana(tmp_path, caplog):
+    enviador = EnviadorCaido(fallas=1)
+    digesto = DigestoPedidos(enviador, str(tmp_path / "spool"), 0.05)
+    digesto.agregar(b"%PDF", "x.pdf", "A", "11", "1", "a")
+    with caplog.at_level("ERROR", logger="sellos.correo"):
+        digesto.iniciar()
+        esperar(lambda: enviador.mensajes)
+        digesto.detener()
+    assert len(enviador.mensajes) == 1 and not digesto.pendientes()
+    assert [r.exc_info[0] for r in caplog.records] == [smtplib.SMTPServerDisconnected]
@@ -0,0 +1,27 @@
+import pytest
+from PIL import ImageFont
+
+from sellos.medidas import TAMANOS_PX_MEDICION, TEXTOS_VERIFICACION, TOLERANCIA_MM, indice, medir_ancho_px, verificar
+from sellos.motor import FACTOR_PT_A_MM, calcular_ancho_texto_mm
+
+PLAYWRITE = "assets/fonts/Playwrite-Regular.ttf"
+
+
+def test_indice_contra_pillow():
+    # Lo mismo que `python -m sellos.medidas verificar`, sobre todo el catálogo.
+    assert indice(), "no se cargó assets/medidas_fuentes.json"
+    assert verificar(TOLERANCIA_MM)
+
+
+@pytest.mark.parametrize("size_pt", [9.5, 12.25, 17.5, 24.3])
+def test_autohinteada_fuera_de_los_tamanos_medidos(size_pt):
+    # Playwrite usa el autohinter: fuera de TAMANOS_PX_MEDICION no hay avances guardados.
+    size_px = int(size_pt * FACTOR_PT_A_MM * 10)
+    assert indice()[PLAYWRITE].avances_px and size_px not in TAMANOS_PX_MEDICION
+    fuente = ImageFont.truetype(PLAYWRITE, size_px)
+    for txt in TEXTOS_VERIFICACION:
+        assert abs(calcular_ancho_texto_mm(txt, PLAYWRITE, size_pt) - fuente.getlength(txt) / 10) <= TOLERANCIA_MM
+
+
+def test_tamanos_medidos_no_pasan_por_pillow():
+    assert all(medir_ancho_px("Juan Pérez", PLAYWRITE, px) is not None for px in TAMANOS_PX_MEDICION)
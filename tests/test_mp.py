@@ -0,0 +1,36 @@
+import time
+
+from sellos.mp import Circuito, PreferenciasMP, opciones_mp
+
+
+def test_circuito_abre_y_deja_pasar_una_prueba():
+    circuito = Circuito(fallos_para_abrir=2, enfriamiento_s=0.05)
+    circuito.fallo(); assert circuito.permitir()
+    circuito.fallo(); assert not circuito.permitir() and circuito.estado() == "abierto"
+    time.sleep(0.06)
+    assert circuito.permitir() and not circuito.permitir()   # una sola llamada de prueba
+    circuito.exito(); assert circuito.estado() == "cerrado" and circuito.permitir()
+
+
+def test_una_preferencia_por_pedido_aunque_cambie_el_nombre():
+    creadas, titulos = [], []
+    prefs = PreferenciasMP(lambda pedido_id, precio: (creadas.append(pedido_id) or f"pref-{len(creadas)}", f"https://mp/{pedido_id}"),
+                           lambda id_pref, precio, nombre: titulos.append((id_pref, nombre)))
+    for _ in range(4): prefs.anticipar("p1", 100)   # un rerun por cada edición del formulario
+    assert prefs.obtener("p1", 100, "Juan  Pérez", timeout=5) == "https://mp/p1"
+    assert prefs.obtener("p1", 100, "Juan Pérez", timeout=5) == "https://mp/p1"   # mismo nombre normalizado
+    assert prefs.obtener("p1", 100, "Juana", timeout=5) == "https://mp/p1"
+    assert creadas == ["p1"]
+    assert titulos == [("pref-1", "Juan Pérez"), ("pref-1", "Juana")]
+
+
+def test_volver_al_primer_nombre_vuelve_a_titular():
+    titulos = []
+    prefs = PreferenciasMP(lambda pedido_id, precio: ("pref-1", f"https://mp/{pedido_id}"),
+                           lambda id_pref, precio, nombre: titulos.append(nombre))
+    for nombre in ("Juan", "Juana", "Juan"): prefs.obtener("p1", 100, nombre, timeout=5)
+    assert titulos == ["Juan", "Juana", "Juan"]
+    # El PUT de cada título va sin clave propia: con (id, precio, nombre) el tercero repetía el primero y MP lo ignoraba.
+    claves = [opciones_mp("TEST-token").get_headers()["x-idempotency-key"] for _ in range(2)]
+    assert claves[0] != claves[1]
+    assert len({opciones_mp("TEST-token", ("p1", 100)).get_headers()["x-idempotency-key"] for _ in range(2)}) == 1
@@ -0,0 +1,101 @@
+import hashlib
+import hmac
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from sellos.mp import crear_sdk
+from sellos.pagos import APROBADO, AlmacenPagos, VerificadorPagos, buscar_aprobado_sdk, iniciar_receptor
+
+
+def test_verificacion_local_primero_y_api_limitada(tmp_path):
+    almacen, consultas = AlmacenPagos(str(tmp_path / "pagos.db")), []
+    verificador = VerificadorPagos(almacen, lambda ref: consultas.append(ref), intervalo_s=60)
+    assert verificador.verificar("p1") is None and verificador.verificar("p1") is None
+    assert consultas == ["p1"]   # la segunda cae dentro del intervalo del pedido
+    almacen.registrar(77, "p1", APROBADO)
+    assert verificador.verificar("p1") == "77" and consultas == ["p1"]
+
+
+def esperar(condicion, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite, "timeout"
+        time.sleep(0.02)
+
+
+def _notificar(receptor, cuerpo, headers=None):
+    url = f"http://127.0.0.1:{receptor.server_address[1]}/?type=payment"
+    pedido = urllib.request.Request(url, json.dumps(cuerpo).encode(), {"Content-Type": "application/json", **(headers or {})})
+    try: return urllib.request.urlopen(pedido, timeout=5).status
+    except urllib.error.HTTPError as e: return e.code
+
+
+def test_webhook_firmado_registra_el_pago(tmp_path):
+    almacen, aprobados = AlmacenPagos(str(tmp_path / "pagos.db")), []
+    receptor = iniciar_receptor(0, almacen, lambda pid: {"id": int(pid), "status": APROBADO, "external_reference": "p1"},
+                                secreto="s3creto", al_aprobar=lambda ref, pid: aprobados.append((ref, pid)), host="127.0.0.1")
+    try:
+        cuerpo = {"type": "payment", "data": {"id": "123"}}
+        assert _notificar(receptor, cuerpo, {"x-signature": "ts=1,v1=00", "x-request-id": "r1"}) == 401
+        firma = hmac.new(b"s3creto", b"id:123;request-id:r1;ts:1;", hashlib.sha256).hexdigest()
+        assert _notificar(receptor, cuerpo, {"x-signature": f"ts=1,v1={firma}", "x-request-id": "r1"}) == 200
+        # Se responde 200 antes de procesar: el registro llega un momento después.
+        esperar(lambda: aprobados)
+    finally: receptor.shutdown(); receptor.server_close()
+    assert almacen.pago_aprobado("p1") == "123" and aprobados == [("p1", "123")] and receptor.notificaciones == 1
+
+
+@pytest.mark.parametrize("cuerpo", [{}, {"type": "merchant_order", "data": {"id": "9"}}])
+def test_webhook_ignora_lo_que_no_es_un_pago(tmp_path, cuerpo):
+    almacen = AlmacenPagos(str(tmp_path / "pagos.db"))
+    receptor = iniciar_receptor(0, almacen, lambda pid: pytest.fail("no debería consultar"), host="127.0.0.1")
+    try: assert _notificar(receptor, cuerpo) == 200 and receptor.notificaciones == 0
+    finally: receptor.shutdown(); receptor.server_close()
+
+
+class _MPFalso(BaseHTTPRequestHandler):
+    # GET /v1/payments/search?external_reference=...: aprobado sólo si el pedido está en `pagados`.
+    def do_GET(self):
+        url = urlparse(self.path)
+        ref = parse_qs(url.query).get("external_reference", [""])[0]
+        self.server.busquedas.append(ref)
+        resultados = [{"id": 9000 + len(self.server.busquedas), "status": APROBADO}] if ref in self.server.pagados else []
+        cuerpo = json.dumps({"results": resultados} if url.path == "/v1/payments/search" else {}).encode()
+        self.send_response(200 if url.path == "/v1/payments/search" else 404)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(cuerpo))); self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+@pytest.fixture
+def mp_falso():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _MPFalso)
+    servidor.busquedas, servidor.pagados = [], set()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try: yield servidor, crear_sdk("TEST-token", api_url=f"http://127.0.0.1:{servidor.server_address[1]}")
+    finally: servidor.shutdown(); servidor.server_close()
+
+
+def test_busquedas_sin_pago_no_se_acumulan(tmp_path, mp_falso):
+    servidor, sdk = mp_falso
+    verificador = VerificadorPagos(AlmacenPagos(str(tmp_path / "pagos.db")), buscar_aprobado_sdk(sdk), intervalo_s=60, max_por_s=1000)
+    for i in range(50): assert verificador.verificar(f"sin-pagar-{i}") is None
+    assert len(servidor.busquedas) == 50 and len(verificador._ultima_busqueda) == 50
+    assert verificador.verificar("sin-pagar-0") is None and len(servidor.busquedas) == 50   # dentro del intervalo: no va a la API
+    # Pasa el intervalo sin esperarlo: se atrasan las marcas del verificador (con un sleep corto,
+    # una máquina lenta podaba antes de terminar las 50 búsquedas).
+    verificador._poda -= 60
+    verificador._ultima_busqueda = {ref: t - 60 for ref, t in verificador._ultima_busqueda.items()}
+    servidor.pagados.add("pagado")
+    assert verificador.verificar("pagado") == "9051"
+    assert verificador.local("pagado") == "9051"
+    assert verificador._ultima_busqueda == {}
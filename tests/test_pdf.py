@@ -0,0 +1,52 @@
+import re
+import zlib
+
+from sellos.motor import ALTO_REAL_MM, SCALE_HD, _colocar_lineas, generar_pdf_hibrido
+
+# La página 1 lleva el texto como contornos: se leen los operadores del PDF ya generado.
+LINEAS = [
+    {"texto": "Juan Pérez", "fuente": "assets/fonts/Roboto-Regular.ttf", "size": 16, "offset_y": 0.0},
+    {"texto": "Matrícula 1234", "fuente": "assets/fonts/GreatVibes-Regular.ttf", "size": 12, "offset_y": -0.5},
+]
+ARIDAD = {b"m": 2, b"l": 2, b"c": 6, b"h": 0}
+# Cada glifo: su matriz (em -> mm, y hacia abajo) y el trazo relleno, dentro del drawing_context de fpdf2.
+GLIFO = re.compile(rb"q (\S+) 0 0 (\S+) (\S+) (\S+) cm q 0 g ([^Q]*?) f Q Q")
+
+
+def contenidos(pdf):
+    # Streams Flate del archivo, descomprimidos (fpdf2 comprime el contenido de las páginas).
+    for cuerpo in re.findall(rb"stream\r?\n(.*?)\r?\nendstream", pdf, re.S):
+        try: yield zlib.decompress(cuerpo)
+        except zlib.error: pass
+
+
+def test_contornos_en_el_contenido_de_la_pagina():
+    pdf, _ = generar_pdf_hibrido(LINEAS, "Test")
+    pagina = next(c for c in contenidos(pdf) if GLIFO.search(c))
+    assert b"BT" not in pagina   # todo contorno: sin texto ni fuentes
+    assert pagina.count(b"q") == pagina.count(b"Q")
+    encontrados = [tuple(float(v) for v in m[:4]) for m in GLIFO.findall(pagina)]
+    esperados = []
+    for _, contorno, x, baseline, escala in _colocar_lineas(LINEAS):
+        em = escala * contorno.upm
+        esperados += [(em, -em, x + gx * escala, baseline) for gx, _ in contorno.glifos]
+    assert len(encontrados) == len(esperados)
+    for f, e in zip(encontrados, esperados):
+        # fpdf2 escribe 4 decimales: con la escala en unidades de la fuente (~0.003) eso era un 1 % del glifo.
+        assert all(abs(a - b) <= 1e-4 * max(1, abs(b)) for a, b in zip(f, e))
+    for m in GLIFO.finditer(pagina):
+        operandos = 0
+        for tok in m.group(5).split():
+            if tok in ARIDAD: assert operandos == ARIDAD[tok], m.group(5)[:80]; operandos = 0
+            else: float(tok); operandos += 1
+        assert operandos == 0
+
+
+def test_imagen_hd_en_franjas_sin_huecos():
+    pdf, _ = generar_pdf_hibrido(LINEAS, "Test")
+    assert [int(h) for h in re.findall(rb"/Height (\d+)", pdf)] == [256] * 4 + [ALTO_REAL_MM * SCALE_HD - 4 * 256]
+    pagina = next(c for c in contenidos(pdf) if b" Do" in c)
+    franjas = [tuple(float(v) for v in m) for m in re.findall(rb"q \S+ 0 0 (\S+) \S+ (\S+) cm /I\w+ Do Q", pagina)]
+    # De arriba hacia abajo (y del PDF desde abajo): cada franja termina donde empieza la anterior.
+    assert abs(franjas[0][0] + franjas[0][1] - ALTO_REAL_MM * 72 / 25.4) < 0.01 and franjas[-1][1] == 0
+    assert all(abs(b[0] + b[1] - a[1]) < 0.01 for a, b in zip(franjas, franjas[1:]))
@@ -0,0 +1,35 @@
+import io
+import os
+
+from fontTools.ttLib import TTFont
+from fpdf import FPDF
+
+from sellos.motor import dibujar_vectorial
+from sellos.pdf_fuentes import fuente_reducida, registrar_fuentes_pdf
+
+ROBOTO = "assets/fonts/Roboto-Regular.ttf"
+ALEO = "assets/fonts/Aleo-Regular.ttf"
+
+
+def test_registra_solo_las_fuentes_del_diseno():
+    pdf = FPDF(); pdf.add_page()
+    font_map = registrar_fuentes_pdf(pdf, [ROBOTO, "Arial", ALEO, ROBOTO, "assets/fonts/no-existe.ttf"])
+    assert font_map == {ROBOTO: "F1", ALEO: "F2"}
+    for familia in font_map.values():
+        pdf.set_font(familia, size=12); pdf.text(10, 10, "Juan Pérez · Matrícula N° 123")
+    assert bytes(pdf.output()).count(b"/FontFile2") == 2
+
+
+def test_fuente_reducida_una_vez_por_proceso():
+    assert fuente_reducida(ROBOTO) is fuente_reducida(ROBOTO)
+    assert len(fuente_reducida(ROBOTO)) < os.path.getsize(ROBOTO)
+
+
+def test_comillas_y_rayas_en_modo_texto():
+    # WinAnsi además de Latin-1: con contornos=False el texto va con la TTF reducida, sin pasar por latin-1.
+    texto = "“Juan” O’Neil – 5 € …"
+    assert {ord(c) for c in texto} <= set(TTFont(io.BytesIO(fuente_reducida(ROBOTO))).getBestCmap())
+    pdf = FPDF(); pdf.add_page()
+    lineas = [{"texto": texto, "fuente": ROBOTO, "size": 12, "offset_y": 0.0}]
+    dibujar_vectorial(pdf, lineas, registrar_fuentes_pdf(pdf, [ROBOTO]), contornos=False)
+    assert bytes(pdf.output()).count(b"/FontFile2") == 1